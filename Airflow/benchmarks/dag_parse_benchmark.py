@@ -0,0 +1,151 @@
+"""Measure how long the scheduler takes to parse the f1_pipeline DAG file.
+
+Each run imports the DAG file in a fresh interpreter with outbound sockets
+disabled, then checks that none of the task-only dependencies were imported.
+It also walks the dags folder the way the scheduler's safe-mode discovery
+does, honouring ``.airflowignore``, and lists every other file it would parse.
+Exits non-zero if the DAG touches the network, loads a heavy module, the
+median parse time exceeds the budget, or a non-DAG module would be parsed.
+
+Usage:
+    python Airflow/benchmarks/dag_parse_benchmark.py --runs 5 --budget-ms 500
+"""
+import os
+import sys
+import re
+import json
+import argparse
+import statistics
+import subprocess
+
+DAGS_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dags'))
+DAG_FILE = os.path.join(DAGS_FOLDER, 'src', 'f1_regulation_pipeline_dag.py')
+
+# Modules that only the task callables may import
+FORBIDDEN_MODULES = [
+    "boto3", "botocore", "pinecone", "openai", "docling", "sentence_transformers",
+    "torch", "langchain_core", "langchain_text_splitters", "tiktoken", "pypdfium2",
+]
+
+# Executed in a child interpreter so every run starts with a cold import cache
+PROBE = r"""
+import sys, json, time, socket, importlib.util
+
+def _blocked(*args, **kwargs):
+    raise RuntimeError("DAG parsing attempted a network connection")
+socket.socket.connect = _blocked
+socket.socket.connect_ex = _blocked
+socket.create_connection = _blocked
+
+started = time.perf_counter()
+import airflow
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+airflow_seconds = time.perf_counter() - started
+
+started = time.perf_counter()
+error = None
+try:
+    spec = importlib.util.spec_from_file_location("f1_pipeline_dag", sys.argv[1])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+except Exception as e:
+    error = repr(e)
+dag_seconds = time.perf_counter() - started
+
+forbidden = json.loads(sys.argv[2])
+loaded = sorted(name for name in forbidden if name in sys.modules)
+print(json.dumps({"airflow_seconds": airflow_seconds, "dag_seconds": dag_seconds, "loaded": loaded, "error": error}))
+"""
+
+
+def _ignore_patterns(directory: str):
+    """Patterns of the ``.airflowignore`` in ``directory`` (regexp syntax, comments stripped)."""
+    path = os.path.join(directory, '.airflowignore')
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        lines = [re.sub(r"\s*#.*", "", line).strip() for line in f]
+    return [(directory, re.compile(line)) for line in lines if line]
+
+
+def discovered_files(dags_folder: str):
+    """Python files the scheduler would consider, after applying every ``.airflowignore`` above them."""
+    files = []
+    patterns_by_dir = {}
+    for root, dirs, names in os.walk(dags_folder):
+        patterns = patterns_by_dir.get(root, []) + _ignore_patterns(root)
+
+        def ignored(path):
+            return any(pattern.search(os.path.relpath(path, base)) for base, pattern in patterns)
+
+        dirs[:] = [name for name in sorted(dirs) if not ignored(os.path.join(root, name))]
+        for name in dirs:
+            patterns_by_dir[os.path.join(root, name)] = patterns
+        files.extend(os.path.join(root, name) for name in sorted(names)
+                     if name.endswith('.py') and not ignored(os.path.join(root, name)))
+    return files
+
+
+def might_contain_dag(path: str) -> bool:
+    """The safe-mode heuristic: a file is imported if it mentions both "airflow" and "dag"."""
+    with open(path, 'rb') as f:
+        content = f.read().lower()
+    return b"airflow" in content and b"dag" in content
+
+
+def run_once(dag_file: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, dag_file, json.dumps(FORBIDDEN_MODULES)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dag-file", default=DAG_FILE)
+    parser.add_argument("--dags-folder", default=DAGS_FOLDER)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="Maximum median DAG parse time, excluding the airflow import")
+    args = parser.parse_args()
+
+    discovered = discovered_files(args.dags_folder)
+    parsed = [path for path in discovered if might_contain_dag(path)]
+    stray = [path for path in parsed if os.path.abspath(path) != os.path.abspath(args.dag_file)]
+
+    runs = [run_once(args.dag_file) for _ in range(args.runs)]
+    dag_ms = [run["dag_seconds"] * 1000 for run in runs]
+    airflow_ms = [run["airflow_seconds"] * 1000 for run in runs]
+    errors = {run["error"] for run in runs if run["error"]}
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+
+    print(f"DAG file:           {args.dag_file}")
+    print(f"airflow import:     median {statistics.median(airflow_ms):.1f} ms")
+    print(f"DAG parse:          median {statistics.median(dag_ms):.1f} ms, max {max(dag_ms):.1f} ms over {args.runs} runs")
+    print(f"Heavy modules:      {', '.join(loaded) or 'none'}")
+    print(f"Discovery:          {len(discovered)} file(s) scanned, {len(parsed)} parsed as DAG files")
+    for path in stray:
+        print(f"  non-DAG module parsed by the scheduler: {os.path.relpath(path, args.dags_folder)}")
+
+    failed = False
+    if errors:
+        print(f"FAIL: DAG import raised {', '.join(errors)}")
+        failed = True
+    if loaded:
+        print("FAIL: task-only modules were imported while parsing the DAG")
+        failed = True
+    if stray:
+        print("FAIL: modules other than the DAG file would be imported during DAG discovery; add them to .airflowignore")
+        failed = True
+    if os.path.abspath(args.dag_file) not in map(os.path.abspath, parsed):
+        print("FAIL: the DAG file is ignored or would not be picked up by DAG discovery")
+        failed = True
+    if statistics.median(dag_ms) > args.budget_ms:
+        print(f"FAIL: median parse time exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Compare the HTML parser backends of the Wikipedia scrapers on saved pages.
+
+Each backend runs in its own process and parses every page ``--repeat`` times.
+The script reports the median parse time per page, the Python-heap peak of one
+parse (tracemalloc, which does not see libxml2's own allocations) and the
+process's peak RSS, which does. It also counts how many pages each backend
+parses into the same blocks, infobox and images as ``html.parser``.
+
+Pages are read from ``--pages`` (``*.html`` files) or, by default, from the HTML
+bodies in the scrapers' conditional-request cache.
+
+Usage:
+    python Airflow/benchmarks/html_parser_benchmark.py --pages saved_pages/
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import hashlib
+import resource
+import statistics
+import tracemalloc
+import multiprocessing
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+sys.path.insert(0, SRC_DIR)
+
+from http_cache import DEFAULT_CACHE_DIR
+from wiki_parser import BACKENDS
+
+PAGE_URL = "https://en.wikipedia.org/wiki/"
+
+
+def find_pages(pages_dir=None):
+    if pages_dir:
+        return sorted(glob.glob(os.path.join(pages_dir, '*.html')))
+    paths = []
+    for meta_path in sorted(glob.glob(os.path.join(DEFAULT_CACHE_DIR, '*', '*.json'))):
+        with open(meta_path, encoding='utf-8') as f:
+            if (json.load(f).get('content_type') or '').startswith('text/html'):
+                paths.append(meta_path[:-len('.json')] + '.body')
+    return paths
+
+
+def _digest(page) -> str:
+    payload = json.dumps([
+        [(block.tag, block.text.strip(), [item.strip() for item in block.items]) for block in page.blocks],
+        page.infobox, page.infobox_image, page.images,
+    ])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _run_backend(name: str, paths, repeat: int, results):
+    """Child-process entry point, so peak RSS belongs to one backend only."""
+    from wiki_parser import get_backend
+
+    backend = get_backend(name)
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    # Warm up imports so they are not charged to the first page
+    backend.parse(pages[0], PAGE_URL)
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    times, heap_peaks, digests = [], [], []
+    for html in pages:
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            page = backend.parse(html, PAGE_URL)
+            runs.append(time.perf_counter() - started)
+        times.append(statistics.median(runs))
+        digests.append(_digest(page))
+
+        tracemalloc.start()
+        backend.parse(html, PAGE_URL)
+        heap_peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    results.put({
+        'backend': name,
+        'ms_per_page': 1000 * statistics.median(times),
+        'total_seconds': sum(times),
+        'heap_peak_kb': statistics.median(heap_peaks) / 1024,
+        'rss_growth_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss_kb) / 1024,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'digests': digests,
+    })
+
+
+def run_backend(name: str, paths, repeat: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_backend, args=(name, paths, repeat, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", help="directory of saved *.html pages (default: the HTTP cache)")
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=["html.parser", "bs4-lxml", "lxml"])
+    parser.add_argument("--repeat", type=int, default=5, help="parses per page; the median is reported")
+    args = parser.parse_args()
+
+    paths = find_pages(args.pages)
+    if not paths:
+        sys.exit("No saved pages found; pass --pages or run a scraper first to fill the HTTP cache")
+    print(f"{len(paths)} pages")
+
+    rows = [run_backend(name, paths, args.repeat) for name in args.backends]
+    reference = next((row for row in rows if row['backend'] == 'html.parser'), None)
+    slowest = max(row['ms_per_page'] for row in rows)
+    for row in rows:
+        line = (
+            f"{row['backend']:>12}: {row['ms_per_page']:8.2f} ms/page ({slowest / row['ms_per_page']:.1f}x), "
+            f"python heap peak {row['heap_peak_kb']:8.0f} KiB/page, "
+            f"peak RSS {row['peak_rss_mb']:.0f} MiB (+{row['rss_growth_mb']:.0f} MiB while parsing)"
+        )
+        if reference is not None and row is not reference:
+            same = sum(a == b for a, b in zip(row['digests'], reference['digests']))
+            line += f", {same}/{len(paths)} pages identical to html.parser"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""Measure ingestion throughput offline, without S3, OpenAI or Pinecone.
+
+Both ingestion scripts run end to end against stand-ins: an in-memory S3
+bucket holding a fixed, generated corpus of regulation PDFs, a deterministic
+fake embedder and an in-memory vector store. Docling, chunking, the caches and
+the pipeline are the real code, so the numbers move when they do.
+
+Each run happens in a fresh process with empty caches, manifests and journals
+and reports docs/sec, chunks/sec, peak RSS (including Docling workers) and the
+per-stage busy/idle/blocked seconds of the staged pipeline. With --baseline, the
+script exits non-zero if throughput dropped by more than --tolerance.
+
+Usage:
+    python Airflow/benchmarks/ingestion_benchmark.py --pipeline both --docs 12 --runs 3
+    python Airflow/benchmarks/ingestion_benchmark.py --save baseline.json
+    python Airflow/benchmarks/ingestion_benchmark.py --baseline baseline.json --tolerance 0.2
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import struct
+import hashlib
+import argparse
+import resource
+import tempfile
+import threading
+import statistics
+import multiprocessing
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src'))
+BUCKET = "benchmark-bucket"
+CATEGORIES = ['sporting', 'financial', 'technical']
+
+WORDS = (
+    "competitor team driver car power unit component event race session steward document "
+    "regulation approved specified permitted homologated measured declared submitted reference "
+    "must shall may not within during before after following provided accordance article"
+).split()
+
+
+# --- Corpus ------------------------------------------------------------------
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(pages) -> bytes:
+    """Write a minimal PDF whose pages hold the given lines of Helvetica text."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 50 800 Td 12 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        stream = stream.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def regulation_pages(rng: random.Random, articles: int, lines_per_page: int = 60):
+    """Lay out numbered articles and sub-articles of filler text over pages."""
+    lines = []
+    for article in range(1, articles + 1):
+        lines.append(f"ARTICLE {article}: {' '.join(rng.choice(WORDS) for _ in range(3)).upper()}")
+        for section in range(1, rng.randint(3, 8)):
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+            text = f"{article}.{section} {sentence.capitalize()}."
+            # Wrap to roughly 95 characters per line
+            while text:
+                cut = text.rfind(' ', 0, 95) if len(text) > 95 else len(text)
+                lines.append(text[:cut])
+                text = text[cut:].lstrip()
+    return [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+
+def build_corpus(docs: int, seed: int = 2024) -> dict:
+    """Deterministic ``{s3_key: pdf bytes}``; the same arguments always give the same corpus."""
+    rng = random.Random(seed)
+    corpus = {}
+    for i in range(docs):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        corpus[f"{category}/2024_{category}_regulations_issue_{i + 1}.pdf"] = build_pdf(regulation_pages(rng, rng.randint(4, 12)))
+    return corpus
+
+
+# --- Stand-ins ---------------------------------------------------------------
+
+class _NoSuchKey(Exception):
+    pass
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def close(self):
+        self._stream.close()
+
+
+class _Paginator:
+    def __init__(self, s3):
+        self._s3 = s3
+
+    def paginate(self, Bucket, Prefix='', PaginationConfig=None):
+        page_size = (PaginationConfig or {}).get('PageSize', 1000)
+        keys = sorted(key for key in self._s3.objects if key.startswith(Prefix))
+        for start in range(0, max(len(keys), 1), page_size):
+            yield {'Contents': [self._s3.describe(key) for key in keys[start:start + page_size]]}
+
+
+class FakeS3Client:
+    """The subset of the boto3 S3 client the ingestion scripts use, backed by a dict."""
+
+    class exceptions:
+        NoSuchKey = _NoSuchKey
+
+    def __init__(self, objects: dict, latency_ms: float = 0.0):
+        self.objects = dict(objects)
+        self._latency = latency_ms / 1000
+        self._lock = threading.Lock()
+
+    def describe(self, key: str) -> dict:
+        data = self.objects[key]
+        return {'Key': key, 'Size': len(data), 'ETag': '"%s"' % hashlib.md5(data).hexdigest()}
+
+    def get_paginator(self, operation: str):
+        return _Paginator(self)
+
+    def get_object(self, Bucket, Key):
+        time.sleep(self._latency)
+        with self._lock:
+            if Key not in self.objects:
+                raise _NoSuchKey(Key)
+            return {'Body': _Body(self.objects[Key]), 'ContentLength': len(self.objects[Key])}
+
+    def head_object(self, Bucket, Key):
+        with self._lock:
+            if Key not in self.objects:
+                raise _NoSuchKey(Key)
+            return self.describe(Key)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        time.sleep(self._latency)
+        with self._lock:
+            self.objects[Key] = Body if isinstance(Body, bytes) else Body.read()
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f.read())
+
+
+def fake_vector(text: str, dimension: int):
+    """Deterministic unit-scale vector derived from the text's hash."""
+    raw = hashlib.shake_256(text.encode('utf-8')).digest(dimension * 2)
+    return [value / 32767.5 - 1.0 for value in struct.unpack(f"<{dimension}H", raw)]
+
+
+class FakeEmbedding:
+    """Stands in for ``openai.Embedding`` with the same response shape."""
+
+    def __init__(self, dimension: int = 1536, latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000
+        self.requests = 0
+
+    def create(self, input, model):
+        self.requests += 1
+        time.sleep(self.latency)
+        texts = input if isinstance(input, list) else [input]
+        return {'data': [{'index': i, 'embedding': fake_vector(text, self.dimension)} for i, text in enumerate(texts)]}
+
+
+class FakeSentenceModel:
+    """Stands in for a ``SentenceTransformer``: whitespace tokenizer, hash-derived vectors."""
+
+    class tokenizer:
+        @staticmethod
+        def tokenize(text: str):
+            return text.split()
+
+    def __init__(self, dimension: int = 384, latency_ms: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True):
+        import numpy as np
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        time.sleep(self.latency * (len(texts) / batch_size))
+        vectors = np.array([fake_vector(text, self.dimension) for text in texts], dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+class _IndexList(list):
+    def names(self):
+        return list(self)
+
+
+class FakeIndex:
+    def __init__(self, latency_ms: float = 0.0):
+        self.vectors = {}
+        self._latency = latency_ms / 1000
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors):
+        time.sleep(self._latency)
+        with self._lock:
+            for vector_id, values, metadata in vectors:
+                self.vectors[vector_id] = (values, metadata)
+
+    def delete(self, ids):
+        with self._lock:
+            for vector_id in ids:
+                self.vectors.pop(vector_id, None)
+
+    def list(self, prefix: str = ""):
+        with self._lock:
+            ids = sorted(vector_id for vector_id in self.vectors if vector_id.startswith(prefix))
+        # Pages of ids, like the serverless client
+        for start in range(0, len(ids), 100):
+            yield ids[start:start + 100]
+
+
+class FakePinecone:
+    """In-memory vector store with the Pinecone client calls the ingestion scripts make."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self._latency = latency_ms
+        self.indexes = {}
+
+    def list_indexes(self):
+        return _IndexList(self.indexes)
+
+    def create_index(self, name, **kwargs):
+        self.indexes.setdefault(name, FakeIndex(self._latency))
+
+    def Index(self, name):
+        return self.indexes.setdefault(name, FakeIndex(self._latency))
+
+    def vector_count(self) -> int:
+        return sum(len(index.vectors) for index in self.indexes.values())
+
+
+# --- Runner ------------------------------------------------------------------
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux; children covers the Docling workers
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(self_kb, children_kb) / 1024
+
+
+def _run_pipeline(pipeline: str, corpus: dict, options: dict, results):
+    """Child-process entry point: point the chosen script at the stand-ins and run it once."""
+    workdir = tempfile.mkdtemp(prefix="ingestion-benchmark-")
+    os.environ.update({
+        'AWS_BUCKET_NAME': BUCKET,
+        'EMBEDDING_CACHE_PATH': os.path.join(workdir, 'embedding_cache.sqlite3'),
+        'INGESTION_MANIFEST_DIR': os.path.join(workdir, 'manifest'),
+        'MARKDOWN_ARTIFACT_DIR': os.path.join(workdir, 'markdown'),
+        'CHUNK_STORE_DIR': os.path.join(workdir, 'chunk-store'),
+        'CHUNK_STORE_PATH': os.path.join(workdir, 'chunks.bin'),
+        'PROGRESS_JOURNAL_PATH': os.path.join(workdir, 'journal.sqlite3'),
+        'PDF_EXTRACTOR': options['extractor'],
+        'DOCLING_WORKERS': str(options['docling_workers']),
+    })
+    sys.path.insert(0, SRC_DIR)
+
+    s3 = FakeS3Client(corpus, options['s3_latency_ms'])
+    pinecone = FakePinecone(options['upsert_latency_ms'])
+    if pipeline == "openai":
+        import openai
+        import store_embeddings as module
+        openai.Embedding = FakeEmbedding(latency_ms=options['embed_latency_ms'])
+    else:
+        import scrape_sentence_tranformer as module
+        model = FakeSentenceModel(latency_ms=options['embed_latency_ms'])
+        module.get_sentence_model = lambda: model
+    module.get_s3_client = lambda: s3
+    module.get_pinecone_client = lambda: pinecone
+
+    started = time.perf_counter()
+    report = module.process_documents()
+    elapsed = time.perf_counter() - started
+
+    documents = report['upsert']['processed']
+    chunks = pinecone.vector_count()
+    results.put({
+        'pipeline': pipeline,
+        'seconds': elapsed,
+        'documents': documents,
+        'chunks': chunks,
+        'docs_per_sec': documents / elapsed,
+        'chunks_per_sec': chunks / elapsed,
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': report,
+    })
+
+
+def run_once(pipeline: str, corpus: dict, options: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_pipeline, args=(pipeline, corpus, options, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def summarize(runs) -> dict:
+    return {
+        'runs': len(runs),
+        'documents': runs[0]['documents'],
+        'chunks': runs[0]['chunks'],
+        'docs_per_sec': statistics.median(run['docs_per_sec'] for run in runs),
+        'chunks_per_sec': statistics.median(run['chunks_per_sec'] for run in runs),
+        'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+        # Stage timings of the median run by wall time
+        'stages': sorted(runs, key=lambda run: run['seconds'])[len(runs) // 2]['stages'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pipeline", choices=["openai", "sentence", "both"], default="both")
+    parser.add_argument("--docs", type=int, default=12, help="number of generated regulation PDFs")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--extractor", choices=["hybrid", "docling"], default="hybrid")
+    parser.add_argument("--docling-workers", type=int, default=2)
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated latency per embedding request/batch")
+    parser.add_argument("--upsert-latency-ms", type=float, default=0.0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative throughput drop against the baseline")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.docs, args.seed)
+    options = {
+        'extractor': args.extractor,
+        'docling_workers': args.docling_workers,
+        's3_latency_ms': args.s3_latency_ms,
+        'embed_latency_ms': args.embed_latency_ms,
+        'upsert_latency_ms': args.upsert_latency_ms,
+    }
+    pipelines = ["openai", "sentence"] if args.pipeline == "both" else [args.pipeline]
+    print(f"Corpus: {len(corpus)} PDFs, {sum(map(len, corpus.values())) / 1024:.0f} KiB (seed {args.seed})")
+
+    results = {}
+    for pipeline in pipelines:
+        summary = summarize([run_once(pipeline, corpus, options) for _ in range(args.runs)])
+        results[pipeline] = summary
+        print(f"\n{pipeline}: {summary['documents']} docs, {summary['chunks']} chunks over {summary['runs']} run(s)")
+        print(f"  docs/sec:   {summary['docs_per_sec']:.2f}")
+        print(f"  chunks/sec: {summary['chunks_per_sec']:.1f}")
+        print(f"  peak RSS:   {summary['peak_rss_mb']:.0f} MiB")
+        for stage, stats in summary['stages'].items():
+            print(f"  {stage:<9} {stats}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for pipeline, summary in results.items():
+            if pipeline not in baseline:
+                continue
+            for metric in ('docs_per_sec', 'chunks_per_sec'):
+                floor = baseline[pipeline][metric] * (1 - args.tolerance)
+                if summary[metric] < floor:
+                    print(f"FAIL: {pipeline} {metric} {summary[metric]:.2f} is below {floor:.2f} (baseline {baseline[pipeline][metric]:.2f})")
+                    failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Compare hybrid PDF extraction against converting every page with Docling.
+
+For each PDF the script times both extractors and reports how many pages the
+hybrid extractor sent to Docling, plus a fidelity score: the difflib similarity
+of the two outputs' word sequences (1.0 means the same words in the same order).
+
+Usage:
+    python Airflow/benchmarks/pdf_extraction_benchmark.py path/to/regulations/*.pdf
+"""
+import os
+import sys
+import time
+import argparse
+import difflib
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dags', 'src')))
+
+from docling.document_converter import DocumentConverter
+from hybrid_pdf_extractor import HybridPDFExtractor
+
+
+def _words(text: str):
+    return [word.strip('#*|-_`') for word in text.split() if word.strip('#*|-_`')]
+
+
+def fidelity(reference: str, candidate: str) -> float:
+    return difflib.SequenceMatcher(None, _words(reference), _words(candidate), autojunk=False).ratio()
+
+
+def benchmark(paths, min_fidelity: float) -> bool:
+    converter = DocumentConverter()
+    hybrid = HybridPDFExtractor(converter)
+    # Warm up model loading so it is not charged to the first file
+    converter.convert(paths[0])
+
+    rows = []
+    for path in paths:
+        started = time.perf_counter()
+        docling_text = converter.convert(path).document.export_to_markdown()
+        docling_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pages = hybrid.extract_pages(path)
+        hybrid_seconds = time.perf_counter() - started
+        hybrid_text = "\n\n".join(page.text for page in pages if page.text)
+
+        fallback = sum(1 for page in pages if page.method == "docling")
+        score = fidelity(docling_text, hybrid_text)
+        rows.append((docling_seconds, hybrid_seconds, score))
+        print(
+            f"{os.path.basename(path)}: docling {docling_seconds:.2f}s, hybrid {hybrid_seconds:.2f}s "
+            f"({fallback}/{len(pages)} pages via Docling), fidelity {score:.3f}"
+        )
+
+    docling_total = sum(row[0] for row in rows)
+    hybrid_total = sum(row[1] for row in rows)
+    worst = min(row[2] for row in rows)
+    print(
+        f"total: docling {docling_total:.2f}s, hybrid {hybrid_total:.2f}s "
+        f"(speedup {docling_total / max(hybrid_total, 1e-9):.1f}x), "
+        f"fidelity median {statistics.median(row[2] for row in rows):.3f}, worst {worst:.3f}"
+    )
+    return worst >= min_fidelity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+", help="PDF files to extract")
+    parser.add_argument("--min-fidelity", type=float, default=0.9, help="fail if any document scores below this")
+    args = parser.parse_args()
+    sys.exit(0 if benchmark(args.pdfs, args.min_fidelity) else 1)
+
+
+if __name__ == "__main__":
+    main()
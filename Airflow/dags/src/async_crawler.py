@@ -0,0 +1,137 @@
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from http_cache import HttpCache, header
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying after a pause; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, with bursts of up to ``capacity`` requests."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+    not_modified: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300 or self.not_modified
+
+
+def _retry_after(headers: Dict[str, str]) -> Optional[float]:
+    try:
+        return float(header(headers, 'Retry-After') or '')
+    except ValueError:
+        return None
+
+
+class AsyncCrawler:
+    """Fetches URLs concurrently over one aiohttp session, politely.
+
+    Every host gets its own token bucket, so a page host and an image host are
+    throttled independently, and at most ``concurrency`` requests are in flight
+    overall. Connection errors, timeouts, 429s and 5xx responses are retried
+    with exponential backoff, honouring ``Retry-After`` when the server sends it.
+    With a ``cache``, requests are made conditional and a 304 is returned with
+    ``not_modified`` set and the cached body.
+    """
+
+    def __init__(self, concurrency: int = 8, rate_per_host: float = 2.0, burst: int = 4,
+                 headers: Optional[Dict[str, str]] = None, timeout: float = 15, retries: int = 3,
+                 cache: Optional[HttpCache] = None):
+        self.concurrency = concurrency
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = cache
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate_per_host, self.burst)
+        return self._buckets[host]
+
+    def _backoff(self, attempt: int) -> float:
+        return min(30.0, 2 ** attempt) + random.uniform(0, 1)
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        headers = dict(headers or {})
+        if self.cache is not None:
+            headers.update(self.cache.conditional_headers(url))
+        for attempt in range(1, self.retries + 1):
+            await self._bucket(url).acquire()
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    async with self._session.get(url, headers=headers) as response:
+                        body = await response.read()
+                        result = FetchResult(url, response.status, body, dict(response.headers),
+                                             time.perf_counter() - started)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Attempt {attempt} for {url} failed ({e!r}), retrying")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if result.status in RETRY_STATUSES and attempt < self.retries:
+                delay = _retry_after(result.headers) or self._backoff(attempt)
+                logger.warning(f"{url} returned {result.status}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if result.status == 304 and self.cache is not None:
+                result.body = self.cache.body(url) or b""
+                result.not_modified = True
+            return result
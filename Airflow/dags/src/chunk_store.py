@@ -0,0 +1,130 @@
+import os
+import json
+import mmap
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# magic, format version, offset of the JSON index at the end of the file
+HEADER = struct.Struct("<8sHQ")
+MAGIC = b"F1CHUNKS"
+FORMAT_VERSION = 1
+
+
+class ChunkStoreWriter:
+    """Writes chunk records to a single file: a fixed header, the records, then an id -> (offset, length) index.
+
+    Records are the chunk text plus any extra fields, stored as UTF-8 JSON. The
+    file is written under a temporary name and moved into place by ``close()``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0))
+        self._index: Dict[str, Tuple[int, int]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+    def add(self, chunk_id: str, text: str, **fields):
+        record = json.dumps(dict(fields, text=text), ensure_ascii=False).encode('utf-8')
+        self._index[chunk_id] = (self._file.tell(), len(record))
+        self._file.write(record)
+
+    def add_record(self, chunk_id: str, record: dict):
+        fields = dict(record)
+        self.add(chunk_id, fields.pop('text', ''), **fields)
+
+    def close(self):
+        index_offset = self._file.tell()
+        self._file.write(json.dumps(self._index).encode('utf-8'))
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, index_offset))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class ChunkStore:
+    """Read-only view over a chunk store file or buffer.
+
+    ``open()`` memory-maps the file, so only the records that are looked up are
+    paged in; ``from_bytes()`` reads a store already held in memory.
+    """
+
+    def __init__(self, buffer, mapped_file=None):
+        magic, version, index_offset = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a chunk store or unsupported format version")
+        self._buffer = buffer
+        self._file = mapped_file
+        self._index: Dict[str, List[int]] = json.loads(bytes(buffer[index_offset:]))
+
+    @classmethod
+    def open(cls, path: str) -> "ChunkStore":
+        f = open(path, 'rb')
+        try:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), f)
+        except Exception:
+            f.close()
+            raise
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkStore":
+        return cls(memoryview(data))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._index
+
+    def ids(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def get(self, chunk_id: str) -> Optional[dict]:
+        entry = self._index.get(chunk_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        return json.loads(bytes(self._buffer[offset:offset + length]))
+
+    def get_text(self, chunk_id: str) -> Optional[str]:
+        record = self.get(chunk_id)
+        return record['text'] if record else None
+
+    def get_many(self, chunk_ids: Iterable[str]) -> Dict[str, dict]:
+        records = {}
+        for chunk_id in chunk_ids:
+            record = self.get(chunk_id)
+            if record is not None:
+                records[chunk_id] = record
+        return records
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def merge_chunk_stores(stores: Iterable[ChunkStore], path: str) -> int:
+    """Write every record of ``stores`` into one file; later stores win for duplicate ids."""
+    latest: Dict[str, ChunkStore] = {}
+    for store in stores:
+        for chunk_id in store.ids():
+            latest[chunk_id] = store
+    with ChunkStoreWriter(path) as writer:
+        for chunk_id, store in latest.items():
+            writer.add_record(chunk_id, store.get(chunk_id))
+    return len(latest)
@@ -0,0 +1,122 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Per-process page extraction function, created by the pool initializer
+_extract_pages = None
+
+
+def create_extractor(extractor: str = "docling"):
+    """Return a function mapping a PDF source to its ``PageText`` pages in page order.
+
+    ``"docling"`` runs Docling's full layout pipeline on every page; ``"hybrid"``
+    reads plain pages from the text layer and only sends complex ones to Docling.
+    """
+    from docling.document_converter import DocumentConverter
+    from hybrid_pdf_extractor import HybridPDFExtractor, extract_docling_pages
+    converter = DocumentConverter()
+    if extractor == "hybrid":
+        return HybridPDFExtractor(converter).extract_pages
+    if extractor != "docling":
+        raise ValueError(f"Unknown PDF extractor: {extractor}")
+    return lambda source: extract_docling_pages(converter, source)
+
+
+def _init_worker(max_memory_mb: Optional[int], threads_per_worker: int, extractor: str):
+    global _extract_pages
+    # Keep each worker's torch/OpenMP pools from oversubscribing the machine
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    if max_memory_mb:
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    _extract_pages = create_extractor(extractor)
+
+
+def _convert_pages(source):
+    return _extract_pages(source)
+
+
+def _convert(source) -> str:
+    from markdown_artifacts import join_pages
+    return join_pages(_extract_pages(source))[0]
+
+
+class DoclingProcessPool:
+    """A pool of Docling worker processes, each holding its own ``DocumentConverter``.
+
+    ``extractor`` selects the conversion strategy, see ``create_extractor``.
+
+    Workers are spawned rather than forked, may have their address space capped
+    with ``max_memory_mb`` and are recycled after ``max_tasks_per_child``
+    conversions to release memory Docling holds on to.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_memory_mb: Optional[int] = None, max_tasks_per_child: int = 10, extractor: str = "docling"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        threads_per_worker = max(1, (os.cpu_count() or 1) // self.max_workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(max_memory_mb, threads_per_worker, extractor),
+            max_tasks_per_child=max_tasks_per_child,
+        )
+        logging.info(f"Started {self.max_workers} Docling worker process(es).")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def submit(self, source):
+        return self._executor.submit(_convert, source)
+
+    def convert_pages(self, source):
+        """Convert one PDF to its ``PageText`` pages, blocking until a worker has finished it."""
+        return self._executor.submit(_convert_pages, source).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def convert_pdfs(
+    sources: Iterable[Tuple[object, object]],
+    max_workers: Optional[int] = None,
+    max_memory_mb: Optional[int] = None,
+    max_tasks_per_child: int = 10,
+    extractor: str = "docling",
+) -> Iterator[Tuple[object, Optional[str], Optional[Exception]]]:
+    """Convert PDFs to markdown in a process pool, yielding results as they finish.
+
+    ``sources`` yields ``(item, source)`` pairs where ``source`` is anything
+    Docling's ``DocumentConverter.convert`` accepts. For every pair this yields
+    ``(item, markdown, None)`` on success or ``(item, None, error)`` on failure,
+    in completion order. At most two conversions per worker are queued at a
+    time, so ``sources`` can be a lazy generator.
+    """
+    with DoclingProcessPool(max_workers, max_memory_mb, max_tasks_per_child, extractor) as pool:
+        in_flight = {}
+        sources = iter(sources)
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < 2 * pool.max_workers:
+                try:
+                    item, source = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(source)] = item
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    logging.error(f"Docling conversion failed for {item}: {e}")
+                    yield item, None, e
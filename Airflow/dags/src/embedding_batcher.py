@@ -0,0 +1,159 @@
+import time
+import logging
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+try:
+    from openai.error import AuthenticationError, InvalidRequestError, PermissionError as OpenAIPermissionError
+    # Requests that fail like this fail the same way on every retry and in every half of a batch
+    NON_RETRYABLE_ERRORS: Tuple[type, ...] = (AuthenticationError, OpenAIPermissionError)
+    # Caused by the inputs themselves: retrying is pointless, but bisecting finds the bad ones
+    INVALID_INPUT_ERRORS: Tuple[type, ...] = (InvalidRequestError,)
+except ImportError:
+    NON_RETRYABLE_ERRORS = ()
+    INVALID_INPUT_ERRORS = ()
+
+# OpenAI limits for the embeddings endpoint
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_INPUT = 8191
+DEFAULT_TOKENS_PER_REQUEST = 100_000
+
+
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def build_token_counter(model: str) -> Callable[[str], int]:
+    if tiktoken is not None:
+        encoding = _encoding(model)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    # Roughly four characters per token for English regulation text
+    return lambda text: len(text) // 4 + 1
+
+
+def build_truncator(model: str, max_tokens: int = MAX_TOKENS_PER_INPUT) -> Callable[[str], Tuple[str, int]]:
+    """Returns a function mapping a text to (text cut to ``max_tokens`` tokens, its token count)."""
+    if tiktoken is not None:
+        encoding = _encoding(model)
+
+        def truncate(text: str) -> Tuple[str, int]:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text, len(tokens)
+            return encoding.decode(tokens[:max_tokens]), max_tokens
+        return truncate
+
+    # Stay safely under the limit when tokens can only be estimated
+    max_chars = max_tokens * 3
+
+    def truncate_chars(text: str) -> Tuple[str, int]:
+        text = text[:max_chars]
+        return text, len(text) // 4 + 1
+    return truncate_chars
+
+
+class EmbeddingBatcher:
+    """Packs texts into token-bounded requests and embeds them in input order.
+
+    ``embed_fn`` receives a list of texts and must return one embedding per text,
+    in the same order. Inputs longer than the model's limit are truncated to it.
+    Failed requests are retried with exponential backoff and, if they keep
+    failing, split in half so that only the failing inputs are lost. Errors in
+    ``invalid_input`` are not retried but bisected straight away down to the
+    offending texts. Inputs that cannot be embedded come back as empty lists.
+    Errors in ``non_retryable`` are raised straight away instead.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        model: str = "text-embedding-ada-002",
+        max_tokens_per_request: int = DEFAULT_TOKENS_PER_REQUEST,
+        max_inputs_per_request: int = MAX_INPUTS_PER_REQUEST,
+        max_retries: int = 3,
+        backoff_seconds: float = 1.0,
+        token_counter: Optional[Callable[[str], int]] = None,
+        non_retryable: Tuple[type, ...] = NON_RETRYABLE_ERRORS,
+        invalid_input: Tuple[type, ...] = INVALID_INPUT_ERRORS,
+    ):
+        self._embed_fn = embed_fn
+        self._max_tokens = max_tokens_per_request
+        self._max_inputs = max_inputs_per_request
+        self._max_retries = max_retries
+        self._backoff = backoff_seconds
+        self._non_retryable = non_retryable
+        self._invalid_input = invalid_input
+        if token_counter is None:
+            self._truncate = build_truncator(model)
+        else:
+            # A custom counter cannot cut text, so inputs are only budgeted at the limit
+            self._truncate = lambda text: (text, min(token_counter(text), MAX_TOKENS_PER_INPUT))
+        self.requests_made = 0
+
+    def prepare(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+        """Texts cut to the per-input token limit, and their token counts."""
+        prepared, counts = [], []
+        for text in texts:
+            truncated, tokens = self._truncate(text)
+            if len(truncated) < len(text):
+                logging.warning(f"Input of {len(text)} characters truncated to {MAX_TOKENS_PER_INPUT} tokens.")
+            prepared.append(truncated)
+            counts.append(tokens)
+        return prepared, counts
+
+    def batches(self, token_counts: List[int]) -> List[List[int]]:
+        """Group input positions into batches that respect the request limits."""
+        batches, current, current_tokens = [], [], 0
+        for i, tokens in enumerate(token_counts):
+            if current and (current_tokens + tokens > self._max_tokens or len(current) >= self._max_inputs):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        results: List[List[float]] = [[] for _ in texts]
+        texts, token_counts = self.prepare(texts)
+        batches = self.batches(token_counts)
+        logging.info(f"Embedding {len(texts)} texts in {len(batches)} request(s)...")
+        for batch in batches:
+            self._embed_batch(texts, batch, results)
+        return results
+
+    def _embed_batch(self, texts: List[str], batch: List[int], results: List[List[float]]):
+        for attempt in range(1, self._max_retries + 1):
+            try:
+                self.requests_made += 1
+                embeddings = self._embed_fn([texts[i] for i in batch])
+                if len(embeddings) != len(batch):
+                    raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+                for i, embedding in zip(batch, embeddings):
+                    results[i] = embedding
+                return
+            except self._non_retryable:
+                raise
+            except self._invalid_input as e:
+                logging.warning(f"Embedding request for {len(batch)} text(s) was rejected: {e}")
+                break
+            except Exception as e:
+                logging.warning(f"Embedding request for {len(batch)} text(s) failed (attempt {attempt}/{self._max_retries}): {e}")
+                if attempt < self._max_retries:
+                    time.sleep(self._backoff * 2 ** (attempt - 1))
+
+        if len(batch) > 1:
+            # Isolate the failing inputs by retrying each half on its own
+            middle = len(batch) // 2
+            self._embed_batch(texts, batch[:middle], results)
+            self._embed_batch(texts, batch[middle:], results)
+        else:
+            logging.error(f"Giving up on embedding text at position {batch[0]}.")
@@ -0,0 +1,129 @@
+import os
+import time
+import struct
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+import unicodedata
+from typing import Callable, List, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "f1_embedding_cache.sqlite3")
+DTYPE_FORMATS = {"float16": "e", "float32": "f"}
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: List[float], dtype: str) -> bytes:
+    return struct.pack(f"<{len(vector)}{DTYPE_FORMATS[dtype]}", *vector)
+
+
+def unpack_vector(blob: bytes, dtype: str) -> List[float]:
+    fmt = DTYPE_FORMATS[dtype]
+    return list(struct.unpack(f"<{len(blob) // struct.calcsize(fmt)}{fmt}", blob))
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model, normalized text hash) with LRU eviction.
+
+    Backed by SQLite in WAL mode so several worker processes can share one file.
+    Vectors are stored as float32, or float16 to halve the footprint.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 512 * 1024 * 1024, dtype: str = "float32"):
+        if dtype not in DTYPE_FORMATS:
+            raise ValueError(f"Unsupported dtype {dtype}, expected one of {list(DTYPE_FORMATS)}")
+        self._dtype = dtype
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, dtype TEXT NOT NULL,"
+            " vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update({key: unpack_vector(blob, dtype) for key, dtype, blob in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            if not vector:
+                continue
+            blob = pack_vector(vector, self._dtype)
+            rows.append((cache_key(model, text), model, self._dtype, blob, len(blob), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._evict()
+
+    def put(self, model: str, text: str, vector: List[float]):
+        self.put_many(model, [text], [vector])
+
+    def get_or_compute(self, model: str, texts: List[str], embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return embeddings for ``texts``, computing and caching only the misses."""
+        results = self.get_many(model, texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            computed = embed_fn([texts[i] for i in missing])
+            self.put_many(model, [texts[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                results[i] = vector
+        logging.info(f"Embedding cache: {len(texts) - len(missing)} hit(s), {len(missing)} miss(es).")
+        return results
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        # Drop least recently used rows until we are 10% under the limit
+        excess = total - int(self._max_bytes * 0.9)
+        freed = 0
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale_keys)
+        self._conn.commit()
+        logging.info(f"Embedding cache evicted {len(stale_keys)} entries ({freed} bytes).")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
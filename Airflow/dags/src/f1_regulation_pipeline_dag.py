@@ -10,10 +10,6 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-# Import functions from the provided scripts
-from src.scrape_to_s3 import scrape_documents
-from src.store_embeddings import process_documents
-
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(project_root, '.env'))
 
@@ -37,8 +33,12 @@ dag = DAG(
     catchup=False,
 )
 
+# Task modules are imported inside the callables: they pull in boto3, Pinecone,
+# OpenAI and Docling, none of which the scheduler needs to parse this file.
+
 # Task 1: Scrape documents and upload to S3
 def scrape_and_upload_to_s3():
+    from src.scrape_to_s3 import scrape_documents
     scrape_documents(os.getenv("url"))
 
 scrape_task = PythonOperator(
@@ -47,15 +47,58 @@ scrape_task = PythonOperator(
     dag=dag,
 )
 
-# Task 2: Process documents for embeddings and store in Pinecone
-def process_documents_for_embeddings():
-    process_documents()
+# Task 2: List the regulation documents that changed since the last run
+def list_regulation_documents():
+    from src.store_embeddings import list_documents_to_process
+    return [{"document": document} for document in list_documents_to_process()]
+
+list_task = PythonOperator(
+    task_id="list_regulation_documents",
+    python_callable=list_regulation_documents,
+    dag=dag,
+)
+
+# Task 3: One mapped task per document. The regulation_embedding pool caps how many
+# documents are converted and embedded at once across the worker fleet, and every
+# document retries on its own.
+def embed_regulation_document(document):
+    from src.store_embeddings import ingest_document
+    ingest_document(document)
+
+embedding_task = PythonOperator.partial(
+    task_id="embed_regulation_document",
+    python_callable=embed_regulation_document,
+    pool=os.getenv("REGULATION_EMBEDDING_POOL", "regulation_embedding"),
+    retries=3,
+    retry_delay=timedelta(minutes=2),
+    retry_exponential_backoff=True,
+    dag=dag,
+).expand(op_kwargs=list_task.output)
+
+# Task 4: Merge the per-document chunk texts into the store the Streamlit app reads.
+# It runs even when some documents failed so the others still become searchable.
+def build_regulation_chunk_store():
+    from src.store_embeddings import build_chunk_store
+    build_chunk_store()
+
+chunk_store_task = PythonOperator(
+    task_id="build_regulation_chunk_store",
+    python_callable=build_regulation_chunk_store,
+    trigger_rule="all_done",
+    dag=dag,
+)
+
+# Task 5: With EMBEDDING_REDUCTION=pca, refit the projection on the corpus and refresh
+# the reduced indexes the Streamlit app queries. Does nothing otherwise.
+def build_reduced_regulation_indexes():
+    from src.store_embeddings import build_reduced_indexes
+    build_reduced_indexes()
 
-embedding_task = PythonOperator(
-    task_id="process_documents_for_embeddings",
-    python_callable=process_documents_for_embeddings,
+reduction_task = PythonOperator(
+    task_id="build_reduced_regulation_indexes",
+    python_callable=build_reduced_regulation_indexes,
     dag=dag,
 )
 
 # Define task dependencies
-scrape_task >> embedding_task
\ No newline at end of file
+scrape_task >> list_task >> embedding_task >> chunk_store_task >> reduction_task
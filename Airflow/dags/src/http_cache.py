@@ -0,0 +1,126 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import requests
+
+DEFAULT_CACHE_DIR = os.getenv('HTTP_CACHE_DIR', os.path.join(tempfile.gettempdir(), "f1_http_cache"))
+
+
+def header(headers: Dict[str, str], name: str) -> Optional[str]:
+    """Case-insensitive lookup, since servers and clients disagree on header casing."""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+@dataclass
+class HttpResponse:
+    url: str
+    status: int
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    not_modified: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300 or self.not_modified
+
+
+class HttpCache:
+    """On-disk store of response bodies and their ETag / Last-Modified validators, keyed by URL.
+
+    Callers add ``conditional_headers(url)`` to their request. A 304 reply means
+    the stored body is still current, so the caller can skip parsing and
+    uploading it. ``store()`` should only be called once the response has been
+    fully handled, so a failed upload is retried on the next run instead of
+    being masked by a 304.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, digest[:2], digest)
+        return f"{base}.json", f"{base}.body"
+
+    def lookup(self, url: str) -> Optional[dict]:
+        meta_path, body_path = self._paths(url)
+        if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        meta = self.lookup(url)
+        if not meta:
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def body(self, url: str) -> Optional[bytes]:
+        try:
+            with open(self._paths(url)[1], 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, url: str, headers: Dict[str, str], body, extra: Optional[dict] = None):
+        """Remember ``body`` (bytes, or a readable file object positioned at the start) and its validators.
+
+        ``extra`` is kept in the metadata returned by ``lookup``, for whatever the
+        caller derived from the body and needs again on a 304.
+        """
+        etag, last_modified = header(headers, 'ETag'), header(headers, 'Last-Modified')
+        if not (etag or last_modified):
+            # Nothing to revalidate against, so a cached copy would never be used
+            return
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_type': header(headers, 'Content-Type'),
+            **(extra or {}),
+        }
+        # Body first, so a metadata file always points at a complete body
+        for path, data in ((body_path, body), (meta_path, json.dumps(meta).encode('utf-8'))):
+            with open(f"{path}.tmp", 'wb') as f:
+                if isinstance(data, (bytes, bytearray)):
+                    f.write(data)
+                else:
+                    shutil.copyfileobj(data, f)
+            os.replace(f"{path}.tmp", path)
+
+    def invalidate(self, url: str):
+        for path in self._paths(url):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def cached_get(url: str, cache: Optional[HttpCache] = None, session=None,
+               headers: Optional[Dict[str, str]] = None, timeout: float = 15) -> HttpResponse:
+    """``GET url`` with conditional headers from ``cache``; a 304 comes back with the cached body."""
+    request_headers = dict(headers or {})
+    if cache is not None:
+        request_headers.update(cache.conditional_headers(url))
+    response = (session or requests).get(url, headers=request_headers, timeout=timeout)
+    if response.status_code == 304 and cache is not None:
+        return HttpResponse(url, 304, cache.body(url) or b"", dict(response.headers), not_modified=True)
+    return HttpResponse(url, response.status_code, response.content, dict(response.headers))
@@ -0,0 +1,107 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+# A page is routed to Docling when any of these suggest tables, figures or scanned content
+MIN_TEXT_CHARS = 200
+MAX_PATH_OBJECTS = 12
+MAX_IMAGE_OBJECTS = 0
+
+
+@dataclass
+class PageText:
+    page_no: int
+    text: str
+    method: str
+
+
+def _rewind(source):
+    """Return (name, something pdfium can open) for a file path or a Docling ``DocumentStream``.
+
+    Neither is copied: a spilled PDF is read from disk and an in-memory one from
+    its own buffer, rewound so it can be shared by every reader in turn.
+    """
+    if isinstance(source, str):
+        return source, source
+    source.stream.seek(0)
+    return source.name, source.stream
+
+
+def _is_simple_page(page, text: str) -> bool:
+    if len(text.strip()) < MIN_TEXT_CHARS:
+        return False
+    paths = images = 0
+    for obj in page.get_objects(max_depth=1):
+        if obj.type == pdfium_c.FPDF_PAGEOBJ_PATH:
+            paths += 1
+        elif obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+            images += 1
+        if paths > MAX_PATH_OBJECTS or images > MAX_IMAGE_OBJECTS:
+            return False
+    return True
+
+
+def _clean_text(text: str) -> str:
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    return '\n'.join(lines).strip()
+
+
+def _page_ranges(page_numbers: List[int]) -> List[Tuple[int, int]]:
+    """Collapse sorted 1-based page numbers into inclusive (start, end) runs."""
+    ranges = []
+    for page_no in page_numbers:
+        if ranges and ranges[-1][1] == page_no - 1:
+            ranges[-1] = (ranges[-1][0], page_no)
+        else:
+            ranges.append((page_no, page_no))
+    return ranges
+
+
+def extract_docling_pages(converter, source) -> List[PageText]:
+    """Convert every page with Docling and split the result back into pages."""
+    dl_doc = converter.convert(source).document
+    return [PageText(page_no, dl_doc.export_to_markdown(page_no=page_no).strip(), "docling") for page_no in sorted(dl_doc.pages)]
+
+
+class HybridPDFExtractor:
+    """Extracts plain-text pages from the PDF text layer and sends only complex pages to Docling.
+
+    Pages with too little text (likely scanned), ruled lines (likely tables) or
+    embedded images go through ``converter`` one contiguous page range at a
+    time; all other pages are read with pdfium. Results come back in page order.
+    """
+
+    def __init__(self, converter):
+        self._converter = converter
+
+    def extract_pages(self, source) -> List[PageText]:
+        name, pdf_input = _rewind(source)
+        pdf = pdfium.PdfDocument(pdf_input)
+        pages: List[PageText] = []
+        complex_pages: List[int] = []
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                if _is_simple_page(page, text):
+                    pages.append(PageText(index + 1, _clean_text(text), "text-layer"))
+                else:
+                    complex_pages.append(index + 1)
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+
+        for start, end in _page_ranges(complex_pages):
+            _rewind(source)
+            dl_doc = self._converter.convert(source, page_range=(start, end)).document
+            for page_no in range(start, end + 1):
+                pages.append(PageText(page_no, dl_doc.export_to_markdown(page_no=page_no).strip(), "docling"))
+
+        pages.sort(key=lambda page: page.page_no)
+        logging.info(f"Extracted {name}: {len(pages) - len(complex_pages)} page(s) from the text layer, {len(complex_pages)} with Docling.")
+        return pages
@@ -0,0 +1,251 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+import posixpath
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import requests
+from botocore.exceptions import ClientError
+
+from http_cache import HttpCache
+from image_derivatives import upload_derivatives
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '6'))
+# Bodies up to this size stay in memory while they are hashed; larger ones spill to a temp file
+SPOOL_MAX_BYTES = 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+# ".../commons/thumb/a/ab/Some_car.jpg/220px-Some_car.jpg" is a 220px rendering of ".../commons/a/ab/Some_car.jpg"
+THUMB_RE = re.compile(r'^(?P<base>.*)/thumb/(?P<file>[^/]+/[^/]+/[^/]+)/(?:[^/]*?(?P<width>\d+)px-)?[^/]+$')
+
+# Leading bytes of each format we expect on Wikipedia; checked before trusting the server's header
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/svg+xml': '.svg',
+}
+
+
+def canonical_image(url: str) -> Tuple[str, int]:
+    """The original file a (possibly thumbnail) URL renders, and the rendered width (0 if unknown)."""
+    match = THUMB_RE.match(url)
+    if not match:
+        return url, 0
+    return f"{match.group('base')}/{match.group('file')}", int(match.group('width') or 0)
+
+
+def select_images(urls: List[str]) -> List[str]:
+    """One URL per picture: the widest rendering of each original file, in first-seen order."""
+    best: Dict[str, Tuple[int, str]] = {}
+    for url in urls:
+        original, width = canonical_image(url)
+        if original not in best or width > best[original][0]:
+            best[original] = (width, url)
+    return [url for _, url in best.values()]
+
+
+def sniff_content_type(head: bytes, declared: Optional[str] = None) -> str:
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if b'<svg' in head[:512].lower():
+        return 'image/svg+xml'
+    declared = (declared or '').split(';')[0].strip().lower()
+    return declared or 'application/octet-stream'
+
+
+def image_name(url: str, content_type: str) -> str:
+    """Object name for an image: the original file name, with the extension of its actual format."""
+    name = unquote(posixpath.basename(urlsplit(canonical_image(url)[0]).path))
+    extension = EXTENSIONS.get(content_type)
+    # An SVG is served as a PNG thumbnail, so "Track.svg" becomes "Track.svg.png"
+    if extension and not name.lower().endswith(extension) and not (extension == '.jpg' and name.lower().endswith('.jpeg')):
+        name += extension
+    return name
+
+
+@dataclass
+class ImageResult:
+    url: str
+    status: str  # "uploaded", "duplicate", "unchanged" or "failed"
+    key: Optional[str] = None
+    content_type: Optional[str] = None
+    size: int = 0
+    sha256: Optional[str] = None
+    download_seconds: float = 0.0
+    upload_seconds: float = 0.0
+    error: Optional[str] = None
+    derivatives: Dict[str, str] = field(default_factory=dict)
+
+
+class ImageIngester:
+    """Downloads images concurrently and stores each distinct picture once under ``prefix``.
+
+    Bodies are hashed while they stream into a spooled temporary file, so two
+    URLs serving the same bytes are only uploaded once, and the spool is then
+    streamed to S3 with the content type detected from its leading bytes.
+    Objects carry the ``sha256`` and source URL of their picture; a different
+    picture with the same file name gets the hash appended to its key instead
+    of overwriting it. With a ``cache``, images unchanged since the last run are
+    skipped on a 304 and reported under the key recorded for them.
+    With ``derivatives``, resized copies are stored next to every upload.
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str, cache: Optional[HttpCache] = None,
+                 workers: int = IMAGE_WORKERS, timeout: float = 30, derivatives: bool = True):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/')
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.derivatives = derivatives
+        self._seen: Dict[str, str] = {}
+        self._keys: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # Sessions keep connections to the image host open but are not safe to share between threads
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _claim(self, digest: str, key: str) -> Optional[str]:
+        """Register ``digest`` for ``key``; returns the key that already holds it, if any."""
+        with self._lock:
+            existing = self._seen.get(digest)
+            if existing is None:
+                self._seen[digest] = key
+            return existing
+
+    def _release(self, digest: str):
+        with self._lock:
+            self._seen.pop(digest, None)
+
+    def _stored_metadata(self, key: str) -> Optional[Dict[str, str]]:
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket, Key=key).get('Metadata', {})
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def _resolve_key(self, key: str, digest: str, source: str) -> Tuple[str, bool]:
+        """Key for the picture with hash ``digest``, and whether S3 already holds it there."""
+        with self._lock:
+            holder = self._keys.setdefault(key, digest)
+        if holder == digest:
+            stored = self._stored_metadata(key)
+            if stored is None:
+                return key, False
+            if stored.get('sha256') == digest:
+                return key, True
+            if stored.get('source-url') == source:
+                # The same file was re-uploaded upstream, so it replaces the old version
+                return key, False
+        # Another picture already uses this file name
+        stem, extension = posixpath.splitext(key)
+        key = f"{stem}-{digest[:12]}{extension}"
+        with self._lock:
+            self._keys.setdefault(key, digest)
+        stored = self._stored_metadata(key)
+        return key, bool(stored and stored.get('sha256') == digest)
+
+    def ingest(self, urls: List[str]) -> List[ImageResult]:
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(self.ingest_one, select_images(urls)))
+
+    def ingest_one(self, url: str) -> ImageResult:
+        # Only entries that recorded where the picture went can answer a 304
+        cached = (self.cache.lookup(url) or {}) if self.cache is not None else {}
+        headers = self.cache.conditional_headers(url) if cached.get('key') else {}
+        started = time.perf_counter()
+        try:
+            with self._session().get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304:
+                    return ImageResult(url, "unchanged", cached['key'], cached.get('stored_content_type'),
+                                       cached.get('size', 0), cached.get('sha256'),
+                                       download_seconds=time.perf_counter() - started)
+                if response.status_code != 200:
+                    return ImageResult(url, "failed", error=f"HTTP {response.status_code}",
+                                       download_seconds=time.perf_counter() - started)
+
+                with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+                    digest = hashlib.sha256()
+                    head = b""
+                    for chunk in response.iter_content(READ_CHUNK_BYTES):
+                        if len(head) < 512:
+                            head += chunk[:512 - len(head)]
+                        digest.update(chunk)
+                        spool.write(chunk)
+                    download_seconds = time.perf_counter() - started
+
+                    content_type = sniff_content_type(head, response.headers.get('Content-Type'))
+                    result = ImageResult(url, "uploaded", None, content_type, spool.tell(), digest.hexdigest(),
+                                         download_seconds)
+                    source = canonical_image(url)[0]
+                    result.key, stored = self._resolve_key(f"{self.prefix}/{image_name(url, content_type)}", result.sha256, source)
+
+                    existing = self._claim(result.sha256, result.key)
+                    if existing is not None:
+                        result.status, result.key = "duplicate", existing
+                    elif stored:
+                        result.status = "unchanged"
+                    else:
+                        upload_started = time.perf_counter()
+                        spool.seek(0)
+                        try:
+                            self.s3_client.upload_fileobj(
+                                spool, self.bucket, result.key,
+                                ExtraArgs={'ContentType': content_type,
+                                           'Metadata': {'sha256': result.sha256, 'source-url': source}},
+                            )
+                        except Exception:
+                            # Let a later copy of the same picture take over the upload
+                            self._release(result.sha256)
+                            raise
+                        if self.derivatives:
+                            spool.seek(0)
+                            result.derivatives = upload_derivatives(self.s3_client, self.bucket, result.key, spool.read())
+                        result.upload_seconds = time.perf_counter() - upload_started
+                    if self.cache is not None:
+                        spool.seek(0)
+                        self.cache.store(url, dict(response.headers), spool, {
+                            'key': result.key, 'sha256': result.sha256,
+                            'stored_content_type': content_type, 'size': result.size,
+                        })
+                    return result
+        except Exception as e:
+            return ImageResult(url, "failed", error=str(e), download_seconds=time.perf_counter() - started)
+
+
+def report_timings(results: List[ImageResult]):
+    for result in results:
+        line = f"{result.status:>9} {result.download_seconds * 1000:7.0f} ms down {result.upload_seconds * 1000:7.0f} ms up"
+        if result.key:
+            line += f"  {result.size / 1024:8.1f} KiB {result.content_type:<14} {result.key}"
+        else:
+            line += f"  {result.url}"
+        if result.error:
+            line += f"  ({result.error})"
+        print(line)
+    counts = {status: sum(1 for r in results if r.status == status) for status in ("uploaded", "duplicate", "unchanged", "failed")}
+    uploaded = [r for r in results if r.status == "uploaded"]
+    print(f"Images: {counts}, {sum(r.size for r in uploaded) / 1024:.0f} KiB uploaded")
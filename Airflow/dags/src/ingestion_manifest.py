@@ -0,0 +1,163 @@
+import os
+import json
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _entry_name(s3_key: str) -> str:
+    return hashlib.sha1(s3_key.encode('utf-8')).hexdigest() + ".json"
+
+
+# One JSON object per document keeps concurrent writers from clobbering each other
+class LocalManifestStore:
+    def __init__(self, directory: str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, s3_key: str) -> Optional[dict]:
+        path = os.path.join(self._directory, _entry_name(s3_key))
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, s3_key: str, entry: dict):
+        path = os.path.join(self._directory, _entry_name(s3_key))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def delete(self, s3_key: str):
+        path = os.path.join(self._directory, _entry_name(s3_key))
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class S3ManifestStore:
+    def __init__(self, s3_client, bucket: str, prefix: str):
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._prefix = prefix.rstrip('/') + '/'
+
+    def load(self, s3_key: str) -> Optional[dict]:
+        try:
+            response = self._s3.get_object(Bucket=self._bucket, Key=self._prefix + _entry_name(s3_key))
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def save(self, s3_key: str, entry: dict):
+        self._s3.put_object(
+            Bucket=self._bucket,
+            Key=self._prefix + _entry_name(s3_key),
+            Body=json.dumps(entry).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+    def delete(self, s3_key: str):
+        self._s3.delete_object(Bucket=self._bucket, Key=self._prefix + _entry_name(s3_key))
+
+
+@dataclass
+class IngestionPlan:
+    """What needs to happen to bring the index in line with the current chunks.
+
+    ``vector_ids`` holds the id of every current chunk: the id it was stored
+    under before if its text is unchanged, a new content-derived one otherwise.
+    ``new_document`` is set when the manifest has no entry for the document, so
+    vectors an older pipeline stored for it are not listed in ``orphaned_ids``.
+    """
+    new_document: bool = False
+    vector_ids: List[str] = field(default_factory=list)
+    to_embed: List[int] = field(default_factory=list)
+    unchanged: List[int] = field(default_factory=list)
+    orphaned_ids: List[str] = field(default_factory=list)
+
+
+class IngestionManifest:
+    """Tracks the ETag, chunk hashes and vector ids produced for every ingested S3 object.
+
+    ``chunking`` identifies the chunking parameters; a document ingested with
+    different ones is not considered unchanged even if its ETag matches.
+    """
+
+    def __init__(self, store, model: str, chunking: str = ""):
+        self._store = store
+        self._model = model
+        self._chunking = chunking
+
+    def get(self, s3_key: str) -> Optional[dict]:
+        try:
+            entry = self._store.load(s3_key)
+        except Exception as e:
+            logging.warning(f"Could not read manifest entry for {s3_key}: {e}")
+            return None
+        if entry and entry.get('model') != self._model:
+            return None
+        return entry
+
+    def is_unchanged(self, s3_key: str, etag: Optional[str]) -> bool:
+        entry = self.get(s3_key)
+        return bool(
+            entry and etag
+            and entry.get('etag') == etag
+            and entry.get('chunking', '') == self._chunking
+            and all(entry.get('chunk_hashes', [None]))
+        )
+
+    def plan(self, s3_key: str, chunk_hashes: List[str], id_prefix: str) -> IngestionPlan:
+        """Match chunks to stored vectors by content hash, so inserting a chunk does not re-embed the rest."""
+        entry = self.get(s3_key) or {}
+        # Chunks recorded with a None hash never reached the index and cannot be reused
+        stored: Dict[str, List[str]] = defaultdict(list)
+        for digest, vector_id in zip(entry.get('chunk_hashes', []), entry.get('vector_ids', [])):
+            if digest:
+                stored[digest].append(vector_id)
+
+        plan = IngestionPlan(new_document=not entry)
+        new_chunks = []
+        for i, digest in enumerate(chunk_hashes):
+            if stored[digest]:
+                plan.vector_ids.append(stored[digest].pop(0))
+                plan.unchanged.append(i)
+            else:
+                plan.vector_ids.append(None)
+                new_chunks.append(i)
+
+        # New ids must not collide with any previous one, since those may be deleted as orphans
+        taken = set(entry.get('vector_ids', [])) | {vector_id for vector_id in plan.vector_ids if vector_id}
+        for i in new_chunks:
+            vector_id = base_id = f"{id_prefix}_{chunk_hashes[i][:16]}"
+            duplicate = 1
+            while vector_id in taken:
+                duplicate += 1
+                vector_id = f"{base_id}_{duplicate}"
+            taken.add(vector_id)
+            plan.vector_ids[i] = vector_id
+            plan.to_embed.append(i)
+
+        current_ids = set(plan.vector_ids)
+        plan.orphaned_ids = [vector_id for vector_id in entry.get('vector_ids', []) if vector_id not in current_ids]
+        return plan
+
+    def record(self, s3_key: str, etag: Optional[str], chunk_hashes: List[Optional[str]], vector_ids: List[str]):
+        """Persist the outcome of a run. Pass ``None`` hashes for chunks that were not stored."""
+        self._store.save(s3_key, {
+            'etag': etag,
+            'model': self._model,
+            'chunking': self._chunking,
+            'chunk_hashes': chunk_hashes,
+            'vector_ids': vector_ids,
+        })
+
+    def forget(self, s3_key: str):
+        """Drop the entry of a document that no longer exists."""
+        self._store.delete(s3_key)
@@ -0,0 +1,141 @@
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Marks the end of the stream on a stage's input queue
+_END = object()
+
+
+@dataclass
+class Stage:
+    """A pipeline step. ``fn`` maps one item to the next stage's item, or ``None`` to drop it."""
+    name: str
+    fn: Callable[[Any], Optional[Any]]
+    workers: int = 1
+    queue_size: int = 4
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    idle_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "idle_seconds": round(self.idle_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+        }
+
+
+class StagedPipeline:
+    """Runs items through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker threads. When a downstream stage falls
+    behind, its full input queue blocks the upstream workers (backpressure),
+    so at most ``queue_size`` items wait between any two stages. Per-stage
+    counters record busy time, time spent waiting for input (idle) and time
+    spent waiting on a full downstream queue (blocked). ``on_error`` is called
+    with the stage name, the item and the exception whenever a stage fails.
+    """
+
+    def __init__(self, stages: List[Stage], on_error: Optional[Callable[[str, Any, Exception], None]] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.on_error = on_error
+        self.stats: Dict[str, StageStats] = {stage.name: StageStats() for stage in stages}
+        self.source_blocked_seconds = 0.0
+
+    def run(self, items: Iterable[Any]) -> Dict[str, Dict[str, float]]:
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        threads = []
+        for position, stage in enumerate(self.stages):
+            outbox = queues[position + 1] if position + 1 < len(queues) else None
+            next_workers = self.stages[position + 1].workers if outbox is not None else 0
+            remaining = [stage.workers]
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[position], outbox, next_workers, remaining),
+                    name=f"{stage.name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        started = time.perf_counter()
+        for item in items:
+            put_started = time.perf_counter()
+            queues[0].put(item)
+            self.source_blocked_seconds += time.perf_counter() - put_started
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_END)
+        for thread in threads:
+            thread.join()
+
+        report = {name: stats.as_dict() for name, stats in self.stats.items()}
+        logging.info(f"Pipeline finished in {time.perf_counter() - started:.1f}s")
+        for name, stage_report in report.items():
+            logging.info(f"  {name}: {stage_report}")
+        return report
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox: Optional[queue.Queue], next_workers: int, remaining: List[int]):
+        stats = self.stats[stage.name]
+        while True:
+            wait_started = time.perf_counter()
+            item = inbox.get()
+            idle = time.perf_counter() - wait_started
+            if item is _END:
+                with stats.lock:
+                    stats.idle_seconds += idle
+                    remaining[0] -= 1
+                    last_worker = remaining[0] == 0
+                # The last worker to finish tells every worker of the next stage to stop
+                if last_worker and outbox is not None:
+                    for _ in range(next_workers):
+                        outbox.put(_END)
+                return
+
+            busy_started = time.perf_counter()
+            try:
+                result = stage.fn(item)
+                error = None
+            except Exception as e:
+                result, error = None, e
+            busy = time.perf_counter() - busy_started
+
+            blocked = 0.0
+            if error is None and result is not None and outbox is not None:
+                put_started = time.perf_counter()
+                outbox.put(result)
+                blocked = time.perf_counter() - put_started
+
+            with stats.lock:
+                stats.idle_seconds += idle
+                stats.busy_seconds += busy
+                stats.blocked_seconds += blocked
+                if error is not None:
+                    stats.failed += 1
+                elif result is None:
+                    stats.dropped += 1
+                else:
+                    stats.processed += 1
+            if error is not None:
+                logging.error(f"Stage {stage.name} failed for {repr(item)[:200]}: {error}")
+                if self.on_error is not None:
+                    try:
+                        self.on_error(stage.name, item, error)
+                    except Exception as e:
+                        logging.error(f"Error handler failed for stage {stage.name}: {e}")
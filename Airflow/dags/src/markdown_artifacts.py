@@ -0,0 +1,168 @@
+import os
+import json
+import bisect
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Bump when the artifact layout or the way markdown is assembled changes
+ARTIFACT_VERSION = 1
+PAGE_SEPARATOR = "\n\n"
+
+
+def join_pages(pages) -> Tuple[str, List[Tuple[int, int, int]]]:
+    """Join extracted pages into one markdown string.
+
+    Returns the markdown and ``(page_no, start, end)`` character offsets for
+    every page; empty pages get an empty span at the position they would occupy.
+    """
+    parts = []
+    spans = []
+    offset = 0
+    for page in pages:
+        if page.text and parts:
+            offset += len(PAGE_SEPARATOR)
+        start = offset
+        if page.text:
+            parts.append(page.text)
+            offset += len(page.text)
+        spans.append((page.page_no, start, offset))
+    return PAGE_SEPARATOR.join(parts), spans
+
+
+@dataclass
+class MarkdownArtifact:
+    """Markdown converted from one version of a PDF, with the character range of every page."""
+    s3_key: str
+    etag: Optional[str]
+    extractor: str
+    markdown: str
+    pages: List[Tuple[int, int, int]] = field(default_factory=list)
+    version: int = ARTIFACT_VERSION
+
+    @classmethod
+    def from_pages(cls, s3_key: str, etag: Optional[str], extractor: str, pages) -> "MarkdownArtifact":
+        markdown, spans = join_pages(pages)
+        return cls(s3_key, etag, extractor, markdown, spans)
+
+    def page_at(self, offset: int) -> Optional[int]:
+        """Page number containing the character at ``offset``."""
+        starts = [start for _, start, end in self.pages if end > start]
+        pages = [page_no for page_no, start, end in self.pages if end > start]
+        position = bisect.bisect_right(starts, offset) - 1
+        return pages[position] if position >= 0 else None
+
+    def to_json(self) -> bytes:
+        return json.dumps({
+            'version': self.version,
+            's3_key': self.s3_key,
+            'etag': self.etag,
+            'extractor': self.extractor,
+            'pages': self.pages,
+            'markdown': self.markdown,
+        }).encode('utf-8')
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "MarkdownArtifact":
+        entry = json.loads(data)
+        return cls(
+            entry['s3_key'], entry.get('etag'), entry['extractor'], entry['markdown'],
+            [tuple(span) for span in entry['pages']], entry['version'],
+        )
+
+
+def artifact_key(s3_key: str, extractor: str) -> str:
+    """Relative key of an artifact; the version and extractor are part of the path."""
+    return f"v{ARTIFACT_VERSION}/{extractor}/{s3_key}.md.json"
+
+
+class LocalArtifactStore:
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def load(self, key: str) -> Optional[bytes]:
+        path = os.path.join(self._directory, key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def save(self, key: str, data: bytes, content_type: str = 'application/json'):
+        path = os.path.join(self._directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str):
+        path = os.path.join(self._directory, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def keys(self) -> List[str]:
+        keys = []
+        for root, _, files in os.walk(self._directory):
+            for name in files:
+                if not name.endswith('.tmp'):
+                    keys.append(os.path.relpath(os.path.join(root, name), self._directory).replace(os.sep, '/'))
+        return keys
+
+
+class S3ArtifactStore:
+    def __init__(self, s3_client, bucket: str, prefix: str):
+        self._s3 = s3_client
+        self._bucket = bucket
+        self._prefix = prefix.rstrip('/') + '/'
+
+    def load(self, key: str) -> Optional[bytes]:
+        try:
+            response = self._s3.get_object(Bucket=self._bucket, Key=self._prefix + key)
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        return response['Body'].read()
+
+    def save(self, key: str, data: bytes, content_type: str = 'application/json'):
+        self._s3.put_object(Bucket=self._bucket, Key=self._prefix + key, Body=data, ContentType=content_type)
+
+    def delete(self, key: str):
+        self._s3.delete_object(Bucket=self._bucket, Key=self._prefix + key)
+
+    def keys(self) -> List[str]:
+        paginator = self._s3.get_paginator('list_objects_v2')
+        return [
+            obj['Key'][len(self._prefix):]
+            for page in paginator.paginate(Bucket=self._bucket, Prefix=self._prefix)
+            for obj in page.get('Contents', [])
+        ]
+
+
+class MarkdownArtifacts:
+    """Converted markdown per S3 object, reused for as long as the object's ETag does not change."""
+
+    def __init__(self, store, extractor: str):
+        self._store = store
+        self.extractor = extractor
+
+    def get(self, s3_key: str, etag: Optional[str]) -> Optional[MarkdownArtifact]:
+        if not etag:
+            return None
+        try:
+            data = self._store.load(artifact_key(s3_key, self.extractor))
+        except Exception as e:
+            logging.warning(f"Could not read markdown artifact for {s3_key}: {e}")
+            return None
+        if data is None:
+            return None
+        artifact = MarkdownArtifact.from_json(data)
+        if artifact.etag != etag or artifact.version != ARTIFACT_VERSION:
+            return None
+        return artifact
+
+    def put(self, artifact: MarkdownArtifact):
+        if not artifact.etag:
+            return
+        try:
+            self._store.save(artifact_key(artifact.s3_key, artifact.extractor), artifact.to_json())
+        except Exception as e:
+            logging.warning(f"Could not store markdown artifact for {artifact.s3_key}: {e}")
@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Pinecone rejects upsert requests above 2MB and recommends batches of ~100 vectors
+DEFAULT_BATCH_VECTORS = 100
+DEFAULT_BATCH_BYTES = 2 * 1024 * 1024 - 64 * 1024
+# Serialized floats take ~20 bytes each in the JSON request body
+BYTES_PER_FLOAT = 20
+
+
+@dataclass
+class BatchFailure:
+    index_name: str
+    vector_ids: List[str]
+    error: str
+
+
+def estimate_vector_bytes(vector_id: str, embedding: List[float], metadata: dict) -> int:
+    return len(vector_id) + len(embedding) * BYTES_PER_FLOAT + len(json.dumps(metadata or {}))
+
+
+class PineconeUpsertWriter:
+    """Buffers vectors per index and upserts them in bounded batches from a worker pool.
+
+    Index handles are created once per index name and shared by all batches.
+    Call ``close()`` (or use the writer as a context manager) to flush the
+    remaining vectors and collect the failed batches. ``on_upserted`` is called
+    from the worker thread with the index name and vector ids of every batch
+    that succeeded, so progress can be recorded before the final flush.
+    """
+
+    def __init__(
+        self,
+        pinecone_client,
+        max_batch_vectors: int = DEFAULT_BATCH_VECTORS,
+        max_batch_bytes: int = DEFAULT_BATCH_BYTES,
+        max_workers: int = 4,
+        on_upserted: Optional[Callable[[str, List[str]], None]] = None,
+    ):
+        self._client = pinecone_client
+        self._max_vectors = max_batch_vectors
+        self._max_bytes = max_batch_bytes
+        self._max_workers = max_workers
+        self._on_upserted = on_upserted
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pinecone-upsert")
+        self._indexes: Dict[str, object] = {}
+        self._buffers: Dict[str, List[Tuple[str, List[float], dict]]] = {}
+        self._buffer_bytes: Dict[str, int] = {}
+        self._pending: List[Future] = []
+        self._lock = threading.Lock()
+        self.failures: List[BatchFailure] = []
+        self.vectors_written = 0
+        self.batches_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def index(self, index_name: str):
+        with self._lock:
+            if index_name not in self._indexes:
+                self._indexes[index_name] = self._client.Index(index_name)
+            return self._indexes[index_name]
+
+    def add(self, index_name: str, vector_id: str, embedding: List[float], metadata: dict):
+        size = estimate_vector_bytes(vector_id, embedding, metadata)
+        buffer = self._buffers.setdefault(index_name, [])
+        if buffer and self._buffer_bytes[index_name] + size > self._max_bytes:
+            self._submit(index_name)
+            buffer = self._buffers.setdefault(index_name, [])
+        buffer.append((vector_id, embedding, metadata))
+        self._buffer_bytes[index_name] = self._buffer_bytes.get(index_name, 0) + size
+        if len(buffer) >= self._max_vectors:
+            self._submit(index_name)
+
+    def delete(self, index_name: str, vector_ids: List[str]):
+        """Delete vectors by id, in batches of the configured size."""
+        for start in range(0, len(vector_ids), self._max_vectors):
+            batch = vector_ids[start:start + self._max_vectors]
+            try:
+                self.index(index_name).delete(ids=batch)
+                logging.info(f"Deleted {len(batch)} vectors from Pinecone index {index_name}.")
+            except Exception as e:
+                logging.error(f"Error deleting vectors from Pinecone index {index_name}: {e}")
+                self._record_failure(index_name, batch, e)
+
+    def failed_vector_ids(self) -> set:
+        with self._lock:
+            return {vector_id for failure in self.failures for vector_id in failure.vector_ids}
+
+    def flush(self):
+        """Submit every buffered batch and wait until all in-flight batches finish."""
+        for index_name in list(self._buffers):
+            if self._buffers[index_name]:
+                self._submit(index_name)
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self) -> List[BatchFailure]:
+        self.flush()
+        self._executor.shutdown(wait=True)
+        if self.failures:
+            logging.error(f"{len(self.failures)} Pinecone upsert batch(es) failed.")
+        logging.info(f"Upserted {self.vectors_written} vectors in {self.batches_written} batch(es).")
+        return self.failures
+
+    def _submit(self, index_name: str):
+        batch = self._buffers.pop(index_name)
+        self._buffer_bytes[index_name] = 0
+        # Keep at most two batches queued per worker so buffered vectors stay bounded
+        self._pending = [future for future in self._pending if not future.done()]
+        if len(self._pending) >= 2 * self._max_workers:
+            self._pending.pop(0).result()
+        self._pending.append(self._executor.submit(self._upsert, index_name, batch))
+
+    def _upsert(self, index_name: str, batch: List[Tuple[str, List[float], dict]]):
+        try:
+            self.index(index_name).upsert(vectors=batch)
+            with self._lock:
+                self.vectors_written += len(batch)
+                self.batches_written += 1
+            logging.info(f"Upserted batch of {len(batch)} vectors to Pinecone index {index_name}.")
+        except Exception as e:
+            logging.error(f"Error upserting batch of {len(batch)} vectors to Pinecone index {index_name}: {e}")
+            self._record_failure(index_name, [vector_id for vector_id, _, _ in batch], e)
+            return
+        if self._on_upserted is not None:
+            try:
+                self._on_upserted(index_name, [vector_id for vector_id, _, _ in batch])
+            except Exception as e:
+                # The vectors are in the index; at worst a resume upserts them again
+                logging.warning(f"Could not record the upserted batch for Pinecone index {index_name}: {e}")
+
+    def _record_failure(self, index_name: str, vector_ids: List[str], error: Exception):
+        with self._lock:
+            self.failures.append(BatchFailure(index_name, vector_ids, str(error)))
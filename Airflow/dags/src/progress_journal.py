@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import base64
+import struct
+import logging
+import sqlite3
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_JOURNAL_PATH = os.path.join(tempfile.gettempdir(), "f1_ingestion_journal.sqlite3")
+JOURNAL_TABLES = ('chunks', 'embedded', 'dead_letters', 'documents')
+
+
+def pack_embedding(vector: List[float]) -> bytes:
+    return struct.pack(f"<{len(vector)}f", *vector)
+
+
+def unpack_embedding(blob: bytes) -> List[float]:
+    return list(struct.unpack(f"<{len(blob) // 4}f", blob))
+
+
+@dataclass
+class DeadLetter:
+    """A chunk that could not be embedded or upserted, with everything needed to retry it."""
+    vector_id: str
+    s3_key: str
+    index_name: str
+    chunk_hash: str
+    text: str
+    metadata: dict
+    error: str
+    attempts: int
+
+
+class ProgressJournal:
+    """SQLite journal of which chunks reached the index, which failed and how each document ended.
+
+    Chunks are marked as embedded, with their vector, as soon as their
+    embedding arrives, and move to upserted when the Pinecone batch holding
+    them succeeds. A run that dies part way through a document therefore
+    neither re-embeds nor re-upserts what it already did. Chunks that fail go
+    to a dead-letter table holding their text and metadata so they can be
+    replayed without reconverting the document.
+
+    The SQLite file is local to one worker. With a ``remote`` store (the
+    ``load``/``save`` interface of the ingestion manifest stores), ``persist``
+    copies a document's rows there and ``restore`` brings them back, so a
+    retry that lands on another worker resumes instead of starting over.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH, model: str = "", remote=None):
+        self._model = model
+        self._remote = remote
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " vector_id TEXT NOT NULL, model TEXT NOT NULL, s3_key TEXT NOT NULL, chunk_hash TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (vector_id, model))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_s3_key ON chunks (s3_key, model)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedded ("
+            " vector_id TEXT NOT NULL, model TEXT NOT NULL, s3_key TEXT NOT NULL, chunk_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (vector_id, model))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embedded_s3_key ON embedded (s3_key, model)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            " vector_id TEXT NOT NULL, model TEXT NOT NULL, s3_key TEXT NOT NULL, index_name TEXT NOT NULL,"
+            " chunk_hash TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL, error TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (vector_id, model))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " s3_key TEXT NOT NULL, model TEXT NOT NULL, status TEXT NOT NULL, error TEXT,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (s3_key, model))"
+        )
+        self._conn.commit()
+
+    def upserted(self, s3_key: str) -> Dict[str, str]:
+        """Vector id -> chunk hash of every chunk of ``s3_key`` known to be in the index."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector_id, chunk_hash FROM chunks WHERE s3_key = ? AND model = ?", (s3_key, self._model)
+            ).fetchall()
+        return dict(rows)
+
+    def mark_upserted(self, s3_key: str, chunks: List[Tuple[str, str]]):
+        """Record ``(vector_id, chunk_hash)`` pairs as stored and clear any dead letters for them."""
+        if not chunks:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                [(vector_id, self._model, s3_key, digest, now) for vector_id, digest in chunks],
+            )
+            self._clear_pending([vector_id for vector_id, _ in chunks])
+            self._conn.commit()
+
+    def embedded(self, s3_key: str) -> Dict[str, Tuple[str, List[float]]]:
+        """Vector id -> (chunk hash, embedding) of every chunk of ``s3_key`` embedded but not yet upserted."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector_id, chunk_hash, vector FROM embedded WHERE s3_key = ? AND model = ?", (s3_key, self._model)
+            ).fetchall()
+        return {vector_id: (digest, unpack_embedding(blob)) for vector_id, digest, blob in rows}
+
+    def mark_embedded(self, s3_key: str, chunks: List[Tuple[str, str, List[float]]]):
+        """Record ``(vector_id, chunk_hash, embedding)`` triples that still have to be upserted."""
+        now = time.time()
+        rows = [(vector_id, self._model, s3_key, digest, pack_embedding(vector), now) for vector_id, digest, vector in chunks if vector]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embedded VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def mark_vectors_upserted(self, index_name: str, vector_ids: Iterable[str]):
+        """Move embedded chunks to upserted once the batch holding them succeeded.
+
+        Meant as the ``on_upserted`` callback of the upsert writer; ids that were
+        never marked as embedded (reduced vectors, replays) are ignored.
+        """
+        now = time.time()
+        with self._lock:
+            known = [
+                vector_id for vector_id in vector_ids
+                if self._conn.execute("SELECT 1 FROM embedded WHERE vector_id = ? AND model = ?", (vector_id, self._model)).fetchone()
+            ]
+            if not known:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks"
+                " SELECT vector_id, model, s3_key, chunk_hash, ? FROM embedded WHERE vector_id = ? AND model = ?",
+                [(now, vector_id, self._model) for vector_id in known],
+            )
+            self._clear_pending(known)
+            self._conn.commit()
+
+    def _clear_pending(self, vector_ids: List[str]):
+        for table in ('embedded', 'dead_letters'):
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE vector_id = ? AND model = ?", [(vector_id, self._model) for vector_id in vector_ids]
+            )
+
+    def forget_removed(self, s3_key: str, vector_ids: List[str]):
+        """Drop journal rows for vectors of ``s3_key`` that are no longer part of the document."""
+        current = set(vector_ids)
+        stale = [(vector_id, self._model) for vector_id in self.upserted(s3_key) if vector_id not in current]
+        stale += [(vector_id, self._model) for vector_id in self.embedded(s3_key) if vector_id not in current]
+        with self._lock:
+            for table in ('chunks', 'embedded'):
+                self._conn.executemany(f"DELETE FROM {table} WHERE vector_id = ? AND model = ?", stale)
+            self._conn.commit()
+
+    def add_dead_letters(self, letters: List[DeadLetter]):
+        if not letters:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dead_letters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (letter.vector_id, self._model, letter.s3_key, letter.index_name, letter.chunk_hash,
+                     letter.text, json.dumps(letter.metadata), letter.error, letter.attempts, now)
+                    for letter in letters
+                ],
+            )
+            self._conn.commit()
+
+    def dead_letters(self, s3_key: Optional[str] = None, max_attempts: Optional[int] = None) -> List[DeadLetter]:
+        query = ("SELECT vector_id, s3_key, index_name, chunk_hash, text, metadata, error, attempts"
+                 " FROM dead_letters WHERE model = ?")
+        params: list = [self._model]
+        if s3_key is not None:
+            query += " AND s3_key = ?"
+            params.append(s3_key)
+        if max_attempts is not None:
+            query += " AND attempts < ?"
+            params.append(max_attempts)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY s3_key, vector_id", params).fetchall()
+        return [
+            DeadLetter(vector_id, key, index_name, digest, text, json.loads(metadata), error, attempts)
+            for vector_id, key, index_name, digest, text, metadata, error, attempts in rows
+        ]
+
+    def mark_document(self, s3_key: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (s3_key, self._model, status, error, time.time()),
+            )
+            self._conn.commit()
+
+    def documents(self, status: str) -> List[Tuple[str, Optional[str]]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT s3_key, error FROM documents WHERE model = ? AND status = ? ORDER BY s3_key", (self._model, status)
+            ).fetchall()
+
+    def export_document(self, s3_key: str) -> dict:
+        """Every row this journal holds for ``s3_key``, as JSON-serialisable data."""
+        with self._lock:
+            chunks = self._conn.execute(
+                "SELECT vector_id, chunk_hash, updated_at FROM chunks WHERE s3_key = ? AND model = ?", (s3_key, self._model)
+            ).fetchall()
+            embedded = self._conn.execute(
+                "SELECT vector_id, chunk_hash, vector, updated_at FROM embedded WHERE s3_key = ? AND model = ?", (s3_key, self._model)
+            ).fetchall()
+            letters = self._conn.execute(
+                "SELECT vector_id, index_name, chunk_hash, text, metadata, error, attempts, updated_at"
+                " FROM dead_letters WHERE s3_key = ? AND model = ?", (s3_key, self._model)
+            ).fetchall()
+            document = self._conn.execute(
+                "SELECT status, error, updated_at FROM documents WHERE s3_key = ? AND model = ?", (s3_key, self._model)
+            ).fetchone()
+        return {
+            'model': self._model,
+            'updated_at': time.time(),
+            'chunks': [list(row) for row in chunks],
+            'embedded': [
+                [vector_id, digest, base64.b64encode(blob).decode('ascii'), updated_at]
+                for vector_id, digest, blob, updated_at in embedded
+            ],
+            'dead_letters': [list(row) for row in letters],
+            'document': list(document) if document else None,
+        }
+
+    def import_document(self, s3_key: str, entry: dict) -> bool:
+        """Replace the rows for ``s3_key`` with ``entry`` if it is newer than anything recorded here."""
+        if entry.get('model') != self._model:
+            return False
+        with self._lock:
+            latest = max(
+                self._conn.execute(f"SELECT MAX(updated_at) FROM {table} WHERE s3_key = ? AND model = ?",
+                                   (s3_key, self._model)).fetchone()[0] or 0.0
+                for table in JOURNAL_TABLES
+            )
+            if entry.get('updated_at', 0.0) <= latest:
+                return False
+            for table in JOURNAL_TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE s3_key = ? AND model = ?", (s3_key, self._model))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                [(vector_id, self._model, s3_key, digest, updated_at) for vector_id, digest, updated_at in entry['chunks']],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedded VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (vector_id, self._model, s3_key, digest, base64.b64decode(vector), updated_at)
+                    for vector_id, digest, vector, updated_at in entry.get('embedded', [])
+                ],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dead_letters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (vector_id, self._model, s3_key, index_name, digest, text, metadata, error, attempts, updated_at)
+                    for vector_id, index_name, digest, text, metadata, error, attempts, updated_at in entry['dead_letters']
+                ],
+            )
+            if entry.get('document'):
+                status, error, updated_at = entry['document']
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", (s3_key, self._model, status, error, updated_at)
+                )
+            self._conn.commit()
+        return True
+
+    def restore(self, s3_key: str):
+        """Pick up the progress another worker persisted for ``s3_key``."""
+        if self._remote is None:
+            return
+        try:
+            entry = self._remote.load(s3_key)
+        except Exception as e:
+            logging.warning(f"Could not read the remote journal for {s3_key}: {e}")
+            return
+        if entry and self.import_document(s3_key, entry):
+            logging.info(
+                f"Restored journal of {s3_key}: {len(entry['chunks'])} upserted chunk(s), "
+                f"{len(entry.get('embedded', []))} embedded chunk(s), {len(entry['dead_letters'])} dead letter(s)."
+            )
+
+    def persist(self, s3_key: str):
+        """Copy the rows for ``s3_key`` to the remote store; the local journal stays authoritative on failure."""
+        if self._remote is None:
+            return
+        try:
+            self._remote.save(s3_key, self.export_document(s3_key))
+        except Exception as e:
+            logging.warning(f"Could not persist the journal of {s3_key}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,220 @@
+import re
+from dataclasses import dataclass, replace
+from typing import Callable, List, Optional
+
+from embedding_batcher import build_token_counter
+
+# Bump when a change to the chunking would give an unchanged document different chunks or metadata
+CHUNKER_VERSION = 3
+
+# "ARTICLE 3: BODYWORK", "## Article C3 - Bodywork", "ARTICLE B1 – GENERAL UNDERTAKING"
+ARTICLE_RE = re.compile(r'^(?:#+\s*)?article\s+([A-Z]?\d+)\b[\s:.\-–—]*(.*)$', re.IGNORECASE)
+# "3.1 Bodywork", "## C3.1.2. General", "B1.4 text of the sub-article"
+SECTION_RE = re.compile(r'^(?:#+\s*)?([A-Z]?\d+(?:\.\d+)+)\.?\s+(.*)$')
+HEADING_RE = re.compile(r'^#+\s+(.*)$')
+SENTENCE_END_RE = re.compile(r'(?<=[.;:!?])\s+')
+
+
+@dataclass
+class Block:
+    """A unit of regulation text that should not be split unless it is too long on its own."""
+    article: Optional[str]
+    article_title: str
+    section: Optional[str]
+    text: str
+    is_table: bool = False
+    # Character offset of the block's first line in the markdown
+    offset: int = 0
+
+
+@dataclass
+class RegulationChunk:
+    text: str
+    article: Optional[str]
+    article_title: str
+    section: Optional[str]
+    tokens: int
+    offset: int = 0
+    page: Optional[int] = None
+
+    @property
+    def metadata(self) -> dict:
+        # Pinecone rejects null metadata values
+        metadata = {"article": self.article or "", "article_title": self.article_title, "tokens": self.tokens}
+        if self.section:
+            metadata["section"] = self.section
+        if self.page is not None:
+            metadata["page"] = self.page
+        return metadata
+
+
+def _is_section_of(section: str, article: Optional[str], line: str) -> bool:
+    # Numbered headings are trusted even across articles, which recovers a missed article heading;
+    # a plain line such as "3.5 kg of fuel" only counts inside its own article
+    return line.startswith('#') or article is None or section.split('.')[0].upper() == article
+
+
+def parse_blocks(markdown: str) -> List[Block]:
+    """Split markdown into blocks at article, sub-article and heading boundaries; tables stay whole."""
+    blocks: List[Block] = []
+    article, article_title, section = None, "", None
+    lines: List[str] = []
+    in_table = False
+    start, position = 0, 0
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            blocks.append(Block(article, article_title, section, text, in_table, start))
+        lines.clear()
+
+    for line in markdown.splitlines(keepends=True):
+        line_start, position = position, position + len(line)
+        stripped = line.strip()
+        is_table_row = stripped.startswith('|')
+        if is_table_row != in_table:
+            flush()
+            in_table = is_table_row
+        if in_table:
+            if not lines:
+                start = line_start
+            lines.append(stripped)
+            continue
+
+        article_match = ARTICLE_RE.match(stripped)
+        section_match = None if article_match else SECTION_RE.match(stripped)
+        if article_match:
+            flush()
+            article, article_title, section = article_match.group(1).upper(), article_match.group(2).strip(), None
+        elif section_match and _is_section_of(section_match.group(1), article, stripped):
+            flush()
+            section = section_match.group(1)
+            if section.split('.')[0].upper() != article:
+                article, article_title = section.split('.')[0].upper(), ""
+        elif HEADING_RE.match(stripped):
+            flush()
+        elif not stripped:
+            # Paragraph breaks end a block so long sub-articles can be split between paragraphs
+            flush()
+            continue
+        if not lines:
+            start = line_start
+        lines.append(stripped)
+    flush()
+    return blocks
+
+
+def _is_heading_only(block: Block) -> bool:
+    return not block.is_table and "\n" not in block.text and bool(ARTICLE_RE.match(block.text) or HEADING_RE.match(block.text))
+
+
+def _split_table(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[str]:
+    rows = text.split("\n")
+    # Repeat the header row and its separator in every piece so each one reads as a table
+    header = rows[:2] if len(rows) > 2 and set(rows[1].replace('|', '').strip()) <= set('-: ') else []
+    body = rows[len(header):]
+    pieces, current = [], list(header)
+    for row in body:
+        if len(current) > len(header) and count_tokens("\n".join(current + [row])) > max_tokens:
+            pieces.append("\n".join(current))
+            current = list(header)
+        current.append(row)
+    if len(current) > len(header):
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def _split_text(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[str]:
+    pieces, current = [], ""
+    for sentence in SENTENCE_END_RE.split(text):
+        candidate = f"{current} {sentence}".strip()
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            candidate = sentence
+        # A single sentence longer than the limit is cut between words
+        while count_tokens(candidate) > max_tokens:
+            words = candidate.split(" ")
+            cut = max(1, len(words) * max_tokens // count_tokens(candidate))
+            pieces.append(" ".join(words[:cut]))
+            candidate = " ".join(words[cut:])
+        current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class RegulationChunker:
+    """Chunks FIA regulation markdown along its Article / sub-article structure.
+
+    Consecutive blocks of the same article are packed into chunks of at most
+    ``max_tokens`` tokens; chunks never span two articles and never overlap.
+    A heading on its own is kept with the text that follows it in its article.
+    Blocks longer than the limit are split between sentences, tables between
+    rows. Every chunk records the article it belongs to, its first sub-article
+    and, when ``split`` is given a ``page_at`` lookup, the page it starts on.
+    """
+
+    def __init__(self, max_tokens: int = 256, model: str = "text-embedding-ada-002", token_counter: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self._count_tokens = token_counter or build_token_counter(model)
+
+    def split(self, markdown: str, page_at: Optional[Callable[[int], Optional[int]]] = None) -> List[RegulationChunk]:
+        chunks: List[RegulationChunk] = []
+        current: List[str] = []
+        current_tokens = 0
+        owner: Optional[Block] = None
+        owner_offset = 0
+        # Heading-only blocks wait here for the first piece of text that follows them in the same article
+        pending: Optional[Block] = None
+
+        def flush():
+            nonlocal current, current_tokens
+            if current:
+                text = "\n\n".join(current)
+                page = page_at(owner_offset) if page_at else None
+                chunks.append(RegulationChunk(text, owner.article, owner.article_title, owner.section,
+                                              self._count_tokens(text), owner_offset, page))
+            current, current_tokens = [], 0
+
+        def add(block: Block, piece: str, piece_tokens: int, offset: int):
+            nonlocal current_tokens, owner, owner_offset
+            # The blank line joining two pieces costs about one token
+            if current and (block.article != owner.article or current_tokens + 1 + piece_tokens > self.max_tokens):
+                flush()
+            if not current:
+                owner, owner_offset = block, offset
+            current_tokens += piece_tokens + (1 if current else 0)
+            current.append(piece)
+
+        for block in parse_blocks(markdown):
+            if pending is not None and block.article != pending.article:
+                # An article with nothing but its heading still gets a chunk of its own
+                add(pending, pending.text, self._count_tokens(pending.text), pending.offset)
+                pending = None
+            if _is_heading_only(block):
+                pending = block if pending is None else replace(pending, text=f"{pending.text}\n\n{block.text}")
+                continue
+
+            heading_tokens = self._count_tokens(pending.text) + 1 if pending is not None else 0
+            budget = max(1, self.max_tokens - heading_tokens)
+            tokens = self._count_tokens(block.text)
+            if tokens > budget:
+                splitter = _split_table if block.is_table else _split_text
+                pieces = splitter(block.text, budget, self._count_tokens)
+            else:
+                pieces = [block.text]
+
+            # Pieces of a split block are located by their length; the separators they lost are close enough
+            piece_offset = block.offset
+            for piece in pieces:
+                piece_tokens = self._count_tokens(piece) if len(pieces) > 1 else tokens
+                if pending is not None:
+                    add(block, f"{pending.text}\n\n{piece}", heading_tokens + piece_tokens, pending.offset)
+                    pending = None
+                else:
+                    add(block, piece, piece_tokens, piece_offset)
+                piece_offset = min(piece_offset + len(piece) + 1, block.offset + len(block.text))
+        if pending is not None:
+            add(pending, pending.text, self._count_tokens(pending.text), pending.offset)
+        flush()
+        return chunks
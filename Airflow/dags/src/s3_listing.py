@@ -0,0 +1,70 @@
+import queue
+import logging
+import threading
+from typing import Callable, Iterator, List, Optional
+
+# Marks that one prefix has been listed completely
+_DONE = object()
+
+
+def iter_s3_objects(
+    s3_client,
+    bucket: str,
+    prefixes: List[str],
+    key_filter: Optional[Callable[[str], bool]] = None,
+    page_size: int = 1000,
+    buffer_size: int = 1000,
+) -> Iterator[dict]:
+    """Yield every object under ``prefixes``, listing all prefixes concurrently.
+
+    Each prefix is paginated to the end on its own thread. Objects are filtered
+    as pages arrive and yielded immediately, annotated with the ``Prefix`` they
+    were found under, so consumers can start work before listing has finished.
+    Works with any S3-compatible endpoint (e.g. MinIO or moto) the client points at.
+    """
+    results = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def list_prefix(prefix: str):
+        found = 0
+        try:
+            paginator = s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={'PageSize': page_size}):
+                for obj in page.get('Contents', []):
+                    if key_filter and not key_filter(obj['Key']):
+                        continue
+                    found += 1
+                    if not put(dict(obj, Prefix=prefix)):
+                        return
+            if found:
+                logging.info(f"Found {found} matching objects under {prefix}.")
+            else:
+                logging.warning(f"No matching objects found under {prefix}")
+        except Exception as e:
+            logging.error(f"Error listing objects under {prefix}: {e}")
+        finally:
+            put(_DONE)
+
+    threads = [threading.Thread(target=list_prefix, args=(prefix,), name=f"s3-list-{prefix}", daemon=True) for prefix in prefixes]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = results.get()
+            if item is _DONE:
+                remaining -= 1
+            else:
+                yield item
+    finally:
+        # Unblock the listing threads if the consumer stopped early
+        stop.set()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import logging
+import tempfile
+from io import BytesIO
+
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class S3PDFSource:
+    """Streams an S3 object into memory, spilling to a private temp file above a size threshold.
+
+    ``open()`` returns something Docling's converter accepts: a ``DocumentStream``
+    over an in-memory buffer for objects up to ``max_memory_bytes``, or the path
+    of a temp file in a directory owned by this source for larger ones. ``close()``
+    removes that directory; use the source as a context manager to make cleanup
+    deterministic. Every source gets its own directory, so keys that share a
+    basename across categories never collide.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES):
+        self.bucket = bucket
+        self.key = key
+        self._s3 = s3_client
+        self._max_memory = max_memory_bytes
+        self._temp_dir = None
+        self.source = None
+        self.size = 0
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        from docling.datamodel.base_models import DocumentStream
+
+        name = os.path.basename(self.key)
+        body = self._s3.get_object(Bucket=self.bucket, Key=self.key)['Body']
+        buffer = BytesIO()
+        spill = None
+        try:
+            for chunk in iter(lambda: body.read(READ_CHUNK_BYTES), b''):
+                self.size += len(chunk)
+                if spill is None and self.size > self._max_memory:
+                    # Too large to keep in memory: move what we have to a temp file
+                    self._temp_dir = tempfile.mkdtemp(prefix="s3-pdf-")
+                    spill = open(os.path.join(self._temp_dir, name), 'wb')
+                    spill.write(buffer.getvalue())
+                    buffer = None
+                    spill.write(chunk)
+                elif spill is not None:
+                    spill.write(chunk)
+                else:
+                    buffer.write(chunk)
+        except Exception:
+            self.close()
+            raise
+        finally:
+            body.close()
+            if spill is not None:
+                spill.close()
+
+        if spill is not None:
+            self.source = spill.name
+            logging.info(f"Spooled {self.key} ({self.size} bytes) to {self.source}")
+        else:
+            buffer.seek(0)
+            self.source = DocumentStream(name=name, stream=buffer)
+            logging.info(f"Streamed {self.key} ({self.size} bytes) into memory")
+        return self.source
+
+    def close(self):
+        self.source = None
+        if self._temp_dir:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
@@ -1,15 +1,16 @@
-import requests
-from bs4 import BeautifulSoup
 import boto3
 import os
 from dotenv import load_dotenv
-from io import BytesIO
 import time
+import asyncio
 import logging
 from botocore.exceptions import ClientError
-from requests.exceptions import RequestException, Timeout
-from ratelimit import limits, sleep_and_retry
-from tenacity import retry, stop_after_attempt, wait_exponential
+
+from async_crawler import AsyncCrawler
+from http_cache import HttpCache
+from image_derivatives import upload_derivatives
+from section_manifest import ManifestImage, ManifestItem, SectionManifest, content_hash, load_manifest, save_manifest, summarize
+from wiki_parser import parse_wiki_page
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -92,76 +93,46 @@ drivers = {
     "Carlos Reutemann": "https://en.wikipedia.org/wiki/Carlos_Reutemann"
 }
 
-@sleep_and_retry
-@limits(calls=1, period=3)  # Increased delay between calls
-def rate_limited_request(url, headers):
-    return requests.get(url, headers=headers, timeout=15)  # Increased timeout
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Crawl settings; rates are per host, so page and image hosts are throttled separately
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '8'))
+CRAWL_RATE_PER_HOST = float(os.getenv('CRAWL_RATE_PER_HOST', '2'))
+CRAWL_BURST = int(os.getenv('CRAWL_BURST', '4'))
 
-def extract_content(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    content = soup.find('div', {'class': 'mw-parser-output'})
-    if not content:
+def format_driver_content(page):
+    if not page.found:
         return None
 
     wiki_content = []
-    for element in content.find_all(['p', 'h2', 'h3', 'ul', 'table']):
-        if element.name in ['h2', 'h3']:
-            section_title = element.get_text().strip()
+    for block in page.blocks:
+        if block.tag in ['h2', 'h3']:
+            section_title = block.text.strip()
             if any(x in section_title.lower() for x in ["references", "external links", "see also", "notes"]):
                 continue
-            wiki_content.append(f"\n{'#' * (2 if element.name == 'h2' else 3)} {section_title}\n")
-        elif element.name == 'p':
-            text = element.get_text().strip()
+            wiki_content.append(f"\n{'#' * (2 if block.tag == 'h2' else 3)} {section_title}\n")
+        elif block.tag == 'p':
+            text = block.text.strip()
             if text and len(text) > 20:  # Reduced minimum length for paragraphs
                 wiki_content.append(text + "\n")
-        elif element.name == 'ul':
-            for li in element.find_all('li'):
-                wiki_content.append(f"- {li.get_text().strip()}\n")
-        elif element.name == 'table':
+        elif block.tag == 'ul':
+            for item in block.items:
+                wiki_content.append(f"- {item.strip()}\n")
+        elif block.tag == 'table':
             # Extract basic table information
-            table_text = element.get_text().strip()
+            table_text = block.text.strip()
             if table_text:
                 wiki_content.append(f"Table: {table_text[:100]}...\n")  # Truncate long tables
 
     content = "\n".join(wiki_content)
     return content if len(content) > 500 else None  # Ensure substantial content
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_wikipedia_content(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    try:
-        response = rate_limited_request(url, headers)
-        response.raise_for_status()
-        content = extract_content(response.content)
-        if not content:
-            raise ValueError("No substantial content extracted")
-        return content
-    except (Timeout, RequestException, ValueError) as e:
-        logger.error(f"Error getting content from {url}: {e}")
-        raise
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def get_driver_image(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    try:
-        response = rate_limited_request(url, headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        infobox = soup.find('table', {'class': 'infobox'})
-        if infobox:
-            image = infobox.find('img')
-            if image and 'src' in image.attrs:
-                return f"https:{image['src']}"
-        raise ValueError("No image found")
-    except (RequestException, ValueError) as e:
-        logger.error(f"Error getting image from {url}: {e}")
-        raise
+def parse_driver_page(html, page_url):
+    """Article text and infobox image URL of a driver page, from a single parse."""
+    page = parse_wiki_page(html, page_url)
+    return format_driver_content(page), page.infobox_image
 
 def upload_to_s3(content, filename, content_type='text/plain'):
     try:
@@ -172,44 +143,98 @@ def upload_to_s3(content, filename, content_type='text/plain'):
             ContentType=content_type
         )
         logger.info(f"Successfully uploaded {filename} to S3")
+        return True
     except ClientError as e:
         logger.error(f"S3 upload error for {filename}: {e}")
     except Exception as e:
         logger.error(f"Unexpected error uploading {filename} to S3: {e}")
+    return False
+
+def upload_profile_image(image_data, clean_name):
+    """Upload the original and its resized copies; returns the manifest entry, or None if the upload failed."""
+    filename = f"{clean_name}/profile.jpg"
+    if not upload_to_s3(image_data, filename, 'image/jpeg'):
+        return None
+    # Resized copies for the UI; the original stays the source of truth
+    key = f"{S3_FOLDER_NAME}/{filename}"
+    return ManifestImage(key, upload_derivatives(s3_client, S3_BUCKET_NAME, key, image_data))
+
+def driver_manifest_item(clean_name, content, images):
+    data = content.encode('utf-8')
+    return ManifestItem(clean_name, f"{S3_FOLDER_NAME}/{clean_name}/wiki_content.txt", len(data),
+                        content_hash(data), summarize(content), images)
 
-def process_driver(name, wiki_url):
-    logger.info(f"Processing {name}...")
-    
+def clean_driver_name(name):
+    return name.lower().replace(' ', '_')
+
+async def crawl_driver(crawler, name, wiki_url, manifest):
+    """Fetch, parse and upload one driver; the text upload runs while the image downloads."""
+    clean_name = clean_driver_name(name)
     try:
-        wiki_content = get_wikipedia_content(wiki_url)
-        if wiki_content:
-            clean_name = name.lower().replace(' ', '_')
-            upload_to_s3(wiki_content.encode('utf-8'), f"{clean_name}/wiki_content.txt")
-            
-            try:
-                image_url = get_driver_image(wiki_url)
-                if image_url:
-                    image_response = rate_limited_request(image_url, headers={'User-Agent': 'Mozilla/5.0'})
-                    image_response.raise_for_status()
-                    image_content = BytesIO(image_response.content)
-                    s3_client.upload_fileobj(
-                        image_content,
-                        S3_BUCKET_NAME,
-                        f"{S3_FOLDER_NAME}/{clean_name}/profile.jpg",
-                        ExtraArgs={'ContentType': 'image/jpeg'}
-                    )
-                    logger.info(f"Successfully uploaded image for {name}")
-            except Exception as img_error:
-                logger.error(f"Error processing image for {name}: {img_error}")
-        else:
+        page = await crawler.fetch(wiki_url)
+        if page.not_modified and clean_name in manifest:
+            # The stored copy in S3 came from this exact revision, so there is nothing to parse or upload
+            logger.info(f"{name} is unchanged since the last run, skipping")
+            return True
+        # A 304 for a driver missing from the manifest still carries the cached body, which is re-uploaded below
+        if not page.ok:
+            logger.error(f"Error getting content from {wiki_url}: HTTP {page.status}")
+            return False
+        # Parsing is CPU-bound, so run it off the event loop to keep other downloads moving
+        wiki_content, image_url = await asyncio.to_thread(parse_driver_page, page.body, wiki_url)
+        if not wiki_content:
             logger.warning(f"No substantial content extracted for {name}")
+            return False
+
+        text_upload = asyncio.create_task(asyncio.to_thread(
+            upload_to_s3, wiki_content.encode('utf-8'), f"{clean_name}/wiki_content.txt"))
+
+        images, image_uploaded = [], True
+        previous = manifest.items.get(clean_name)
+        if image_url:
+            image = await crawler.fetch(image_url)
+            if image.not_modified and previous and previous.images:
+                logger.info(f"Image for {name} is unchanged, skipping")
+                images = previous.images
+            elif image.ok:
+                uploaded_image = await asyncio.to_thread(upload_profile_image, image.body, clean_name)
+                image_uploaded = uploaded_image is not None
+                if image_uploaded:
+                    images.append(uploaded_image)
+                    crawler.cache.store(image_url, image.headers, image.body)
+            else:
+                image_uploaded = False
+                logger.error(f"Error processing image for {name}: HTTP {image.status}")
+        else:
+            logger.warning(f"No infobox image found for {name}")
+
+        text_uploaded = await text_upload
+        if text_uploaded:
+            manifest.upsert(driver_manifest_item(clean_name, wiki_content, images))
+        # Only remember the page once everything derived from it is in S3, so a failure is retried next run
+        if text_uploaded and image_uploaded:
+            crawler.cache.store(wiki_url, page.headers, page.body)
+        return text_uploaded
     except Exception as e:
         logger.error(f"Error processing {name}: {e}")
+        return False
+
+async def crawl_drivers(driver_urls=None, cache=None):
+    driver_urls = driver_urls or drivers
+    cache = cache or HttpCache()
+    # Drivers skipped as unchanged keep their entries from the previous run
+    manifest = load_manifest(s3_client, S3_BUCKET_NAME, S3_FOLDER_NAME) or SectionManifest(S3_FOLDER_NAME)
+    started = time.perf_counter()
+    async with AsyncCrawler(CRAWL_CONCURRENCY, CRAWL_RATE_PER_HOST, CRAWL_BURST, headers=HEADERS, cache=cache) as crawler:
+        results = await asyncio.gather(*(crawl_driver(crawler, name, url, manifest) for name, url in driver_urls.items()))
+    save_manifest(s3_client, S3_BUCKET_NAME, manifest)
+    succeeded = sum(1 for ok in results if ok)
+    logger.info(f"Crawled {succeeded}/{len(results)} drivers in {time.perf_counter() - started:.1f}s")
+    return succeeded
 
 def main():
-    for driver_name, wiki_url in drivers.items():
-        process_driver(driver_name, wiki_url)
+    asyncio.run(crawl_drivers())
     logger.info("Scraping and uploading completed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,11 @@
-import requests
-from bs4 import BeautifulSoup
 import boto3
 import os
 from dotenv import load_dotenv
-from urllib.parse import urljoin
+
+from http_cache import HttpCache, cached_get
+from image_pipeline import ImageIngester, report_timings
+from section_manifest import ManifestImage, ManifestItem, SectionManifest, content_hash, load_manifest, save_manifest, summarize
+from wiki_parser import parse_wiki_page
 
 # Load environment variables
 load_dotenv()
@@ -25,40 +27,38 @@ s3_client = boto3.client(
 
 # Wikipedia URL for the history of F1
 WIKI_URL = "https://en.wikipedia.org/wiki/History_of_Formula_One"
+HISTORY_FILE_NAME = "f1_history.txt"
+HISTORY_ITEM = "f1_history"
 
 # Step 1: Scrape the History Content from Wikipedia
+def fetch_history_page(cache=None):
+    response = cached_get(WIKI_URL, cache)
+    if not response.ok:
+        raise Exception(f"Failed to retrieve Wikipedia page. Status code: {response.status}")
+    return response
+
 def scrape_f1_history():
-    response = requests.get(WIKI_URL)
-    if response.status_code != 200:
-        raise Exception(f"Failed to retrieve Wikipedia page. Status code: {response.status_code}")
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    content_div = soup.find('div', {'class': 'mw-parser-output'})
+    return parse_f1_history(fetch_history_page().body)
+
+def parse_f1_history(html):
+    page = parse_wiki_page(html, WIKI_URL)
     
-    if content_div is None:
+    if not page.found:
         raise Exception("Failed to find the content on the Wikipedia page.")
     
     # Extract text content from the div
-    paragraphs = content_div.find_all('p')
     history_text = ""
-    for para in paragraphs:
-        history_text += para.get_text() + "\n"
+    for text in page.texts('p'):
+        history_text += text + "\n"
     
-    return history_text, soup
+    return history_text, page
 
 # Step 2: Scrape Images from the Wikipedia Page
-def scrape_images(soup):
+def scrape_images(page):
     images = []
-    content_div = soup.find('div', {'class': 'mw-parser-output'})
 
-    # Find all images inside the content div
-    image_tags = content_div.find_all('img')
-    base_url = "https://en.wikipedia.org"
-    
-    for img in image_tags:
-        # Construct full image URL
-        img_url = urljoin(base_url, img.get('src'))
-        
+    # Image URLs come from the same parse as the text, already resolved against the page URL
+    for img_url in page.images:
         # Avoid icons or irrelevant images
         if 'thumb' in img_url or 'upload.wikimedia.org' in img_url:
             images.append(img_url)
@@ -66,7 +66,7 @@ def scrape_images(soup):
     return images
 
 # Step 3: Upload Text and Images to Amazon S3
-def upload_to_s3(content, images, bucket_name, folder_name, text_file_name):
+def upload_to_s3(content, images, bucket_name, folder_name, text_file_name, cache=None):
     try:
         # Upload text content
         text_s3_key = f"{folder_name}/{text_file_name}"
@@ -78,38 +78,60 @@ def upload_to_s3(content, images, bucket_name, folder_name, text_file_name):
         )
         print(f"Successfully uploaded text to S3 at: s3://{bucket_name}/{text_s3_key}")
 
-        # Upload images
-        for img_url in images:
-            img_response = requests.get(img_url, stream=True)
-            if img_response.status_code == 200:
-                img_name = img_url.split("/")[-1]
-                img_s3_key = f"{folder_name}/images/{img_name}"
-                
-                s3_client.put_object(
-                    Bucket=bucket_name,
-                    Key=img_s3_key,
-                    Body=img_response.content,
-                    ContentType='image/jpeg'  # Assuming images are JPEG (could also be PNG)
-                )
-                print(f"Successfully uploaded image to S3 at: s3://{bucket_name}/{img_s3_key}")
+        # Upload images: one copy per distinct picture, several downloads at a time
+        ingester = ImageIngester(s3_client, bucket_name, f"{folder_name}/images", cache)
+        results = ingester.ingest(images)
+        report_timings(results)
+        return results
     
     except Exception as e:
         print(f"Error uploading files to S3: {e}")
         raise
 
+def history_manifest_item(content, image_results, previous=None):
+    """Manifest entry for the history article: the text plus every distinct image now in S3."""
+    previous_images = {image.key: image for image in previous.images} if previous else {}
+    images, keys = [], set()
+    for result in image_results:
+        if result.key is None or result.key in keys or result.status not in ("uploaded", "unchanged"):
+            continue
+        keys.add(result.key)
+        if result.status == "uploaded":
+            images.append(ManifestImage(result.key, result.derivatives))
+        else:
+            images.append(previous_images.get(result.key, ManifestImage(result.key)))
+    data = content.encode('utf-8')
+    return ManifestItem(HISTORY_ITEM, f"{S3_FOLDER_NAME}/{HISTORY_FILE_NAME}", len(data),
+                        content_hash(data), summarize(content), images)
+
 # Main function
 if __name__ == "__main__":
     try:
+        cache = HttpCache()
+        manifest = load_manifest(s3_client, S3_BUCKET_NAME, S3_FOLDER_NAME) or SectionManifest(S3_FOLDER_NAME)
+        page = fetch_history_page(cache)
+        # Without a manifest entry the cached body is processed again so the manifest can be written
+        if page.not_modified and HISTORY_ITEM in manifest:
+            print("The history page is unchanged since the last run, nothing to upload.")
+            raise SystemExit(0)
+
         # Step 1: Scrape the Wikipedia content and images
-        f1_history_text, soup = scrape_f1_history()
+        f1_history_text, wiki_page = parse_f1_history(page.body)
         print("Successfully scraped the history of F1 from Wikipedia.")
         
         # Step 2: Scrape images
-        images = scrape_images(soup)
+        images = scrape_images(wiki_page)
         print(f"Successfully scraped {len(images)} images from Wikipedia.")
 
         # Step 3: Upload text and images to Amazon S3
-        upload_to_s3(f1_history_text, images, S3_BUCKET_NAME, S3_FOLDER_NAME, "f1_history.txt")
+        image_results = upload_to_s3(f1_history_text, images, S3_BUCKET_NAME, S3_FOLDER_NAME, HISTORY_FILE_NAME, cache)
+
+        manifest.upsert(history_manifest_item(f1_history_text, image_results, manifest.items.get(HISTORY_ITEM)))
+        save_manifest(s3_client, S3_BUCKET_NAME, manifest)
+
+        # Only remember the page once it is fully mirrored, so failed images are retried next run
+        if all(result.status != "failed" for result in image_results):
+            cache.store(WIKI_URL, page.headers, page.body)
 
     except Exception as e:
         print(f"Error during scraping or uploading: {e}")
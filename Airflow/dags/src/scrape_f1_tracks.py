@@ -1,12 +1,15 @@
 import requests
-from bs4 import BeautifulSoup
 import boto3
 import os
 from dotenv import load_dotenv
-from urllib.parse import urljoin, quote
-from io import BytesIO
+from urllib.parse import quote
 import time
 
+from http_cache import HttpCache, cached_get
+from image_derivatives import upload_derivatives
+from section_manifest import ManifestImage, ManifestItem, SectionManifest, content_hash, load_manifest, save_manifest, summarize
+from wiki_parser import first_search_result, parse_wiki_page
+
 # Load environment variables
 load_dotenv()
 
@@ -55,68 +58,38 @@ tracks = [
 
 def get_wikipedia_url(track_name):
     search_url = f"https://en.wikipedia.org/w/index.php?search={quote(track_name)}&title=Special:Search&profile=advanced&fulltext=1&ns0=1"
-    response = requests.get(search_url)
+    response = requests.get(search_url, timeout=15)
     if response.status_code != 200:
         print(f"Failed to search Wikipedia for {track_name}, status code: {response.status_code}")
         return None
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    search_result = soup.find('div', class_='mw-search-result-heading')
-    if search_result:
-        return "https://en.wikipedia.org" + search_result.find('a')['href']
-    return None
-
-def scrape_track_info(url):
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Failed to retrieve Wikipedia page at {url}, status code: {response.status_code}")
-        return {}, None
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    response.encoding = 'utf-8'
-
-    track_info = {}
-
-    # Extract track information from the infobox
-    info_box = soup.find('table', class_='infobox')
-    if info_box:
-        rows = info_box.find_all('tr')
-        for row in rows:
-            header = row.find('th')
-            data = row.find('td')
-            if header and data:
-                track_info[header.get_text(strip=True)] = data.get_text(strip=True)
+
+    return first_search_result(response.content, search_url)
+
+def parse_track_page(html, url):
+    # One pass over the page yields the infobox, the body blocks and the infobox image
+    page = parse_wiki_page(html, url)
+    track_info = dict(page.infobox)
 
     # Extract content from the main body
-    content_div = soup.find('div', {'class': 'mw-parser-output'})
-    if content_div:
+    if page.found:
         # Extract all paragraphs
-        paragraphs = content_div.find_all('p')
-        track_info['Description'] = "\n\n".join([p.get_text() for p in paragraphs if len(p.get_text().strip()) > 0])
+        track_info['Description'] = "\n\n".join([text for text in page.texts('p') if len(text.strip()) > 0])
 
-        # Extract section headings and their content
-        sections = content_div.find_all(['h2', 'h3', 'h4', 'p', 'ul', 'ol'])
+        # Group paragraphs and lists under the heading they follow
         current_section = "Main"
-        for section in sections:
-            if section.name in ['h2', 'h3', 'h4']:
-                current_section = section.get_text().strip()
+        for block in page.blocks:
+            if block.tag in ['h2', 'h3', 'h4']:
+                current_section = block.text.strip()
                 track_info[current_section] = ""
-            elif section.name in ['p', 'ul', 'ol']:
-                content = section.get_text().strip()
+            elif block.tag in ['p', 'ul', 'ol']:
+                content = block.text.strip()
                 if content:
                     if current_section in track_info:
                         track_info[current_section] += "\n" + content
                     else:
                         track_info[current_section] = content
 
-    # Extract the main image from the infobox or the page content
-    image_url = None
-    if info_box:
-        img_tag = info_box.find('img')
-        if img_tag:
-            image_url = urljoin(url, img_tag.get('src'))
-
-    return track_info, image_url
+    return track_info, page.infobox_image
 
 def upload_to_s3(content, filename, content_type='text/plain'):
     try:
@@ -127,41 +100,87 @@ def upload_to_s3(content, filename, content_type='text/plain'):
             ContentType=content_type
         )
         print(f"Successfully uploaded {filename} to S3.")
+        return True
     except Exception as e:
         print(f"Error uploading {filename} to S3: {e}")
+        return False
 
-def process_track(track_name):
+def process_track(track_name, cache=None, manifest=None):
     print(f"Processing {track_name}...")
-    wiki_url = get_wikipedia_url(track_name)
-    
-    if wiki_url:
-        track_info, image_url = scrape_track_info(wiki_url)
-
-        # Upload track info to S3
-        if track_info:
-            formatted_info = "\n\n".join([f"{key}:\n{value}" for key, value in track_info.items()])
-            upload_to_s3(formatted_info.encode('utf-8'), f"{track_name.replace(' ', '_')}_info.txt")
-
-        # Upload track image to S3 if available
-        if image_url:
-            try:
-                image_response = requests.get(image_url)
-                if image_response.status_code == 200:
-                    image_content = BytesIO(image_response.content)
-                    image_filename = f"{track_name.replace(' ', '_')}_image.jpg"
-                    s3_client.upload_fileobj(image_content, S3_BUCKET_NAME, f"{S3_FOLDER_NAME}/{image_filename}")
-                    print(f"Successfully uploaded image for {track_name} to S3.")
+    item_name = track_name.replace(' ', '_')
+    previous = manifest.items.get(item_name) if manifest is not None else None
+
+    # The article found by an earlier run is fetched directly; search only when it is unknown or gone
+    wiki_url = previous.source_url if previous and previous.source_url else None
+    page = cached_get(wiki_url, cache) if wiki_url else None
+    if page is None or not page.ok:
+        wiki_url = get_wikipedia_url(track_name)
+        if not wiki_url:
+            print(f"Could not find Wikipedia page for {track_name}")
+            return
+        page = cached_get(wiki_url, cache)
+
+    # A 304 for a track missing from the manifest still carries the cached body, which is re-uploaded below
+    if page.not_modified and (manifest is None or previous):
+        if previous:
+            previous.source_url = wiki_url
+        print(f"{track_name} is unchanged since the last run, skipping.")
+        return
+    if not page.ok:
+        print(f"Failed to retrieve Wikipedia page at {wiki_url}, status code: {page.status}")
+        return
+
+    track_info, image_url = parse_track_page(page.body, wiki_url)
+    uploaded = True
+    images = []
+
+    # Upload track info to S3
+    formatted_info, text_uploaded = None, False
+    if track_info:
+        formatted_info = "\n\n".join([f"{key}:\n{value}" for key, value in track_info.items()])
+        uploaded = text_uploaded = upload_to_s3(formatted_info.encode('utf-8'), f"{item_name}_info.txt")
+
+    # Upload track image to S3 if available
+    if image_url:
+        try:
+            image_response = cached_get(image_url, cache)
+            if image_response.not_modified and previous and previous.images:
+                print(f"Image for {track_name} is unchanged, skipping.")
+                images = previous.images
+            elif image_response.ok:
+                image_filename = f"{item_name}_image.jpg"
+                if not upload_to_s3(image_response.body, image_filename, 'image/jpeg'):
+                    uploaded = False
                 else:
-                    print(f"Failed to retrieve image for {track_name}, status code: {image_response.status_code}")
-            except Exception as e:
-                print(f"Error uploading image for {track_name}: {e}")
-    else:
-        print(f"Could not find Wikipedia page for {track_name}")
+                    image_key = f"{S3_FOLDER_NAME}/{image_filename}"
+                    derivatives = upload_derivatives(s3_client, S3_BUCKET_NAME, image_key, image_response.body)
+                    images.append(ManifestImage(image_key, derivatives))
+                    if cache is not None:
+                        cache.store(image_url, image_response.headers, image_response.body)
+            else:
+                uploaded = False
+                print(f"Failed to retrieve image for {track_name}, status code: {image_response.status}")
+        except Exception as e:
+            uploaded = False
+            print(f"Error uploading image for {track_name}: {e}")
+
+    if manifest is not None and text_uploaded:
+        data = formatted_info.encode('utf-8')
+        manifest.upsert(ManifestItem(item_name, f"{S3_FOLDER_NAME}/{item_name}_info.txt", len(data),
+                                     content_hash(data), summarize(track_info.get('Description', '')), images, wiki_url))
+
+    # Remember the page only once everything from it is in S3, so failures are retried next run
+    if uploaded and cache is not None:
+        cache.store(wiki_url, page.headers, page.body)
 
 # Main process
 if __name__ == "__main__":
+    cache = HttpCache()
+    # Tracks skipped as unchanged keep their entries from the previous run
+    manifest = load_manifest(s3_client, S3_BUCKET_NAME, S3_FOLDER_NAME) or SectionManifest(S3_FOLDER_NAME)
     for track in tracks:
-        process_track(track)
+        process_track(track, cache, manifest)
         time.sleep(1)  # Adding a delay to prevent getting blocked by Wikipedia
 
-    print("Scraping and uploading completed.")
\ No newline at end of file
+    save_manifest(s3_client, S3_BUCKET_NAME, manifest)
+    print("Scraping and uploading completed.")
@@ -1,15 +1,24 @@
 import os
+import time
 import logging
-from typing import List
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator, List, Optional
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 from pinecone import Pinecone, ServerlessSpec
 from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document as LCDocument
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from botocore.config import Config
 import boto3
-from docling.document_converter import DocumentConverter
+from pinecone_writer import PineconeUpsertWriter
+from s3_listing import iter_s3_objects
+from s3_source import S3PDFSource
+from docling_pool import DoclingProcessPool, create_extractor
+from ingestion_pipeline import Stage, StagedPipeline
+from embedding_cache import EmbeddingCache, DEFAULT_CACHE_PATH
+from regulation_chunker import RegulationChunker
+from markdown_artifacts import MarkdownArtifact, MarkdownArtifacts, LocalArtifactStore, S3ArtifactStore, join_pages
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,24 +26,56 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables
 load_dotenv()
 
-# Initialize Pinecone
-pinecone_client = Pinecone(api_key=os.getenv('PINECONE_API_KEY_f1'))
+# Clients and the model are created on first use so importing this module stays cheap for the DAG parser
+@lru_cache(maxsize=None)
+def get_pinecone_client() -> Pinecone:
+    return Pinecone(api_key=os.getenv('PINECONE_API_KEY_f1'))
 
-# Initialize S3 Client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-    config=Config(retries={'max_attempts': 10, 'mode': 'standard'}, max_pool_connections=50)
-)
+@lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+        endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+        config=Config(retries={'max_attempts': 10, 'mode': 'standard'}, max_pool_connections=50)
+    )
 
-# Initialize Sentence Transformer
-sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Sentence Transformer model
+SENTENCE_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+@lru_cache(maxsize=None)
+def get_sentence_model() -> SentenceTransformer:
+    return SentenceTransformer(SENTENCE_MODEL_NAME)
 
 # Configuration
 AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+# Chunks follow the regulation's articles and are capped in tokens rather than characters
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '256'))
+PINECONE_UPSERT_WORKERS = int(os.getenv('PINECONE_UPSERT_WORKERS', '4'))
+DOCLING_WORKERS = int(os.getenv('DOCLING_WORKERS', str(os.cpu_count() or 1)))
+DOCLING_WORKER_MAX_MEMORY_MB = int(os.getenv('DOCLING_WORKER_MAX_MEMORY_MB', '0')) or None
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))
+PDF_SPOOL_MAX_MB = int(os.getenv('PDF_SPOOL_MAX_MB', '64'))
+# "hybrid" reads plain pages from the PDF text layer, "docling" converts every page with Docling
+PDF_EXTRACTOR = os.getenv('PDF_EXTRACTOR', 'hybrid')
+MARKDOWN_ARTIFACT_DIR = os.getenv('MARKDOWN_ARTIFACT_DIR')
+MARKDOWN_ARTIFACT_PREFIX = os.getenv('MARKDOWN_ARTIFACT_PREFIX', 'artifacts/markdown/')
+ENCODE_BATCH_SIZE = int(os.getenv('ENCODE_BATCH_SIZE', '64'))
+ENCODE_PROCESSES = int(os.getenv('ENCODE_PROCESSES', '0'))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', DEFAULT_CACHE_PATH)
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', '512'))
+EMBEDDING_CACHE_DTYPE = os.getenv('EMBEDDING_CACHE_DTYPE', 'float32')
+
+# Multi-process encoding pool, started by multi_process_encoding()
+_encode_pool = None
+_encode_stats = {'chunks': 0, 'seconds': 0.0}
+
+# Embedding cache shared with the OpenAI pipeline and the Streamlit app
+@lru_cache(maxsize=None)
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024, dtype=EMBEDDING_CACHE_DTYPE)
 
 # Define Pinecone index map
 INDEX_MAP = {
@@ -45,8 +86,8 @@ INDEX_MAP = {
 
 # Ensure Pinecone indexes exist
 def ensure_index_exists(index_name: str, dimension: int = 384):
-    if index_name not in pinecone_client.list_indexes().names():
-        pinecone_client.create_index(
+    if index_name not in get_pinecone_client().list_indexes().names():
+        get_pinecone_client().create_index(
             name=index_name,
             dimension=dimension,
             metric="cosine",
@@ -65,123 +106,246 @@ def initialize_indexes():
 class DoclingPDFLoader(BaseLoader):
     def __init__(self, file_path: str | List[str]):
         self._file_paths = file_path if isinstance(file_path, list) else [file_path]
-        self._converter = DocumentConverter()
+        self._extract = create_extractor(PDF_EXTRACTOR)
 
     def lazy_load(self) -> LCDocument:
         for source in self._file_paths:
-            dl_doc = self._converter.convert(source).document
-            text = dl_doc.export_to_markdown()
+            text = join_pages(self._extract(source))[0]
             yield LCDocument(page_content=text)
 
+# Token counts use the sentence model's own tokenizer, whose inputs are truncated at 256 tokens
+@lru_cache(maxsize=None)
+def get_chunker() -> RegulationChunker:
+    return RegulationChunker(max_tokens=CHUNK_MAX_TOKENS, token_counter=lambda text: len(get_sentence_model().tokenizer.tokenize(text)))
+
+# Split converted markdown into non-overlapping, article-aligned chunks
+def split_markdown(text: str, page_at=None) -> List[LCDocument]:
+    return [LCDocument(page_content=chunk.text, metadata=chunk.metadata) for chunk in get_chunker().split(text, page_at)]
+
 # Extract text from PDF
 def extract_text_from_pdf(file_path: str) -> List[LCDocument]:
     loader = DoclingPDFLoader(file_path=file_path)
     docs = loader.load()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    return splitter.split_documents(docs)
+    return [chunk for doc in docs for chunk in split_markdown(doc.page_content)]
 
-# Fetch documents from S3
+# Stream documents from specific folders in S3 while they are being listed
+def iter_documents(folders: List[str], years: List[str]) -> Iterator[dict]:
+    def is_wanted(key: str) -> bool:
+        return key.endswith('.pdf') and any(year in key for year in years)
+
+    for obj in iter_s3_objects(get_s3_client(), AWS_BUCKET_NAME, folders, key_filter=is_wanted):
+        yield {'id': obj['Key'], 's3_key': obj['Key'], 'category': obj['Prefix'].rstrip('/'), 'etag': obj.get('ETag')}
+
+# Fetch documents from specific folders in S3
 def fetch_documents(folders: List[str], years: List[str]) -> List[dict]:
-    documents = []
-    for folder in folders:
-        logging.info(f"Fetching documents from folder: {folder}")
-        try:
-            response = s3_client.list_objects_v2(Bucket=AWS_BUCKET_NAME, Prefix=folder)
-            if 'Contents' in response:
-                filtered_documents = [
-                    {'id': obj['Key'], 's3_key': obj['Key'], 'category': folder.rstrip('/')}
-                    for obj in response['Contents']
-                    if any(year in obj['Key'] for year in years) and obj['Key'].endswith('.pdf')
-                ]
-                documents.extend(filtered_documents)
-                logging.info(f"Found {len(filtered_documents)} documents in {folder}.")
-            else:
-                logging.warning(f"No documents found in folder: {folder}")
-        except Exception as e:
-            logging.error(f"Error fetching documents from folder {folder}: {e}")
-    return documents
-
-# Download file from S3 to local temporary directory
-def download_file_from_s3(s3_key: str, local_file_path: str):
+    return list(iter_documents(folders, years))
+
+# Stream a PDF from S3; it only touches disk above PDF_SPOOL_MAX_MB
+def open_s3_pdf(s3_key: str) -> Optional[S3PDFSource]:
+    source = S3PDFSource(get_s3_client(), AWS_BUCKET_NAME, s3_key, max_memory_bytes=PDF_SPOOL_MAX_MB * 1024 * 1024)
     try:
         logging.info(f"Downloading {s3_key} from S3 bucket {AWS_BUCKET_NAME}...")
-        s3_client.download_file(AWS_BUCKET_NAME, s3_key, local_file_path)
-        logging.info(f"File downloaded successfully: {local_file_path}")
+        source.open()
+        return source
     except Exception as e:
         logging.error(f"Error downloading file from S3: {e}")
+        return None
 
 # Generate embeddings using Sentence Transformers
 def generate_embedding(text: str) -> List[float]:
     try:
         logging.info("Generating embedding for text using Sentence Transformer...")
-        embedding = sentence_model.encode(text).tolist()
+        embedding = get_embedding_cache().get(SENTENCE_MODEL_NAME, text)
+        if embedding is None:
+            embedding = get_sentence_model().encode(text).tolist()
+            get_embedding_cache().put(SENTENCE_MODEL_NAME, text, embedding)
         logging.info("Embedding generated successfully.")
         return embedding
     except Exception as e:
         logging.error(f"Error generating embedding: {e}")
         return []
 
-# Upsert embedding into Pinecone
-def upsert_to_pinecone(index_name: str, vector_id: str, embedding: List[float], metadata: dict):
+# Encode texts in length-sorted batches so each batch needs as little padding as possible
+def encode_texts(texts: List[str], batch_size: int = ENCODE_BATCH_SIZE) -> List[List[float]]:
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    sorted_texts = [texts[i] for i in order]
+    started = time.perf_counter()
+    if _encode_pool is not None:
+        vectors = get_sentence_model().encode_multi_process(sorted_texts, _encode_pool, batch_size=batch_size)
+    else:
+        vectors = get_sentence_model().encode(sorted_texts, batch_size=batch_size, convert_to_numpy=True)
+    elapsed = time.perf_counter() - started
+
+    _encode_stats['chunks'] += len(texts)
+    _encode_stats['seconds'] += elapsed
+    if texts:
+        logging.info(f"Encoded {len(texts)} chunks in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} chunks/sec).")
+
+    embeddings: List[List[float]] = [[] for _ in texts]
+    for position, i in enumerate(order):
+        embeddings[i] = vectors[position].tolist()
+    return embeddings
+
+# Generate embeddings for many texts at once, reusing cached vectors
+def generate_embeddings(texts: List[str], batch_size: int = ENCODE_BATCH_SIZE) -> List[List[float]]:
     try:
-        logging.info(f"Upserting embedding to Pinecone index {index_name}...")
-        index = pinecone_client.Index(index_name)
-        index.upsert(vectors=[(vector_id, embedding, metadata)])
-        logging.info("Embedding upserted successfully.")
+        return get_embedding_cache().get_or_compute(SENTENCE_MODEL_NAME, texts, lambda misses: encode_texts(misses, batch_size))
     except Exception as e:
-        logging.error(f"Error upserting to Pinecone: {e}")
+        logging.error(f"Error generating embeddings: {e}")
+        return [[] for _ in texts]
 
-# Process a single document
-def process_document(document: dict):
+# Spread encoding over several worker processes for the duration of the block
+@contextmanager
+def multi_process_encoding(processes: int = ENCODE_PROCESSES):
+    global _encode_pool
+    if processes <= 1:
+        yield
+        return
+    _encode_pool = get_sentence_model().start_multi_process_pool(target_devices=['cpu'] * processes)
+    logging.info(f"Started {processes} sentence transformer encoding processes.")
     try:
-        regulation_id = document.get('id')
-        s3_key = document.get('s3_key')
-        category = document.get('category')
+        yield
+    finally:
+        SentenceTransformer.stop_multi_process_pool(_encode_pool)
+        _encode_pool = None
+
+# Markdown converted by either ingestion pipeline, stored next to the PDFs
+def create_markdown_artifacts() -> MarkdownArtifacts:
+    if MARKDOWN_ARTIFACT_DIR:
+        store = LocalArtifactStore(MARKDOWN_ARTIFACT_DIR)
+    else:
+        store = S3ArtifactStore(get_s3_client(), AWS_BUCKET_NAME, MARKDOWN_ARTIFACT_PREFIX)
+    return MarkdownArtifacts(store, extractor=PDF_EXTRACTOR)
 
-        if not regulation_id or not s3_key or not category:
-            logging.error(f"Invalid document structure: {document}")
+# Upsert writer that batches vectors and reuses one index handle per category
+def create_upsert_writer() -> PineconeUpsertWriter:
+    return PineconeUpsertWriter(get_pinecone_client(), max_workers=PINECONE_UPSERT_WORKERS)
+
+# Embed every chunk of a document
+def embed_chunks(work: dict) -> dict:
+    work['embeddings'] = generate_embeddings([chunk.page_content for chunk in work['chunks']])
+    return work
+
+# Upsert the embedded chunks of a document; nothing reads a chunk store for these indexes, so the text stays in metadata
+def upsert_chunks(work: dict, writer: PineconeUpsertWriter) -> dict:
+    regulation_id = work['document']['id']
+    category = work['document']['category']
+    for i, (chunk, embedding) in enumerate(zip(work['chunks'], work['embeddings'])):
+        vector_id = f"{regulation_id}_chunk_{i+1}"
+        if not embedding:
+            logging.warning(f"Embedding generation failed for chunk {i} of {regulation_id}. Skipping...")
+            continue
+
+        metadata = {
+            "s3_key": work['document']['s3_key'],
+            "chunk": i + 1,
+            "category": category,
+            "text": chunk.page_content,
+            **chunk.metadata
+        }
+        writer.add(INDEX_MAP[category], vector_id, embedding, metadata)
+    return work
+
+# Check that a document has everything needed to process it
+def is_valid_document(document: dict) -> bool:
+    if not document.get('id') or not document.get('s3_key') or not document.get('category'):
+        logging.error(f"Invalid document structure: {document}")
+        return False
+    return True
+
+# Process a single document
+def process_document(document: dict, writer: PineconeUpsertWriter = None):
+    owns_writer = writer is None
+    writer = writer or create_upsert_writer()
+    try:
+        if not is_valid_document(document):
             return
 
-        local_file_path = f"/tmp/{os.path.basename(s3_key)}"
-        download_file_from_s3(s3_key, local_file_path)
+        source = open_s3_pdf(document['s3_key'])
+        if source is None:
+            return
 
         # Extract text chunks from the document
-        chunks = extract_text_from_pdf(local_file_path)
+        try:
+            chunks = extract_text_from_pdf(source.source)
+        finally:
+            source.close()
         if not chunks:
-            logging.warning(f"No text chunks extracted for {regulation_id}. Skipping...")
+            logging.warning(f"No text chunks extracted for {document['id']}. Skipping...")
             return
 
-        for i, chunk in enumerate(chunks):
-            vector_id = f"{regulation_id}_chunk_{i+1}"
-            embedding = generate_embedding(chunk.page_content)
-            if not embedding:
-                logging.warning(f"Embedding generation failed for chunk {i} of {regulation_id}. Skipping...")
-                continue
-
-            # Add the full text of the chunk to the metadata
-            metadata = {
-                "chunk": i + 1,
-                "category": category,
-                "text": chunk.page_content
-            }
-            upsert_to_pinecone(INDEX_MAP[category], vector_id, embedding, metadata)
+        upsert_chunks(embed_chunks({'document': document, 'chunks': chunks}), writer)
 
     except Exception as e:
         logging.error(f"Error processing document {document}: {e}")
+    finally:
+        if owns_writer:
+            writer.close()
 
-# Process documents from folders with specific year filters
-def process_documents():
+# Build the download -> convert -> split -> embed -> upsert pipeline
+def build_pipeline(pool: DoclingProcessPool, writer: PineconeUpsertWriter, artifacts: MarkdownArtifacts) -> StagedPipeline:
+    def download(document: dict) -> Optional[dict]:
+        if not is_valid_document(document):
+            return None
+        artifact = artifacts.get(document['s3_key'], document.get('etag'))
+        if artifact is not None:
+            return {'document': document, 'artifact': artifact}
+        source = open_s3_pdf(document['s3_key'])
+        if source is None:
+            return None
+        return {'document': document, 'source': source}
+
+    def convert(work: dict) -> dict:
+        if 'artifact' in work:
+            return work
+        source = work.pop('source')
+        try:
+            pages = pool.convert_pages(source.source)
+        finally:
+            source.close()
+        document = work['document']
+        artifact = MarkdownArtifact.from_pages(document['s3_key'], document.get('etag'), PDF_EXTRACTOR, pages)
+        artifacts.put(artifact)
+        work['artifact'] = artifact
+        return work
+
+    def split(work: dict) -> Optional[dict]:
+        artifact = work.pop('artifact')
+        work['chunks'] = split_markdown(artifact.markdown, artifact.page_at)
+        if not work['chunks']:
+            logging.warning(f"No text chunks extracted for {work['document']['id']}. Skipping...")
+            return None
+        return work
+
+    return StagedPipeline([
+        Stage("download", download, workers=DOWNLOAD_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("convert", convert, workers=pool.max_workers, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("split", split, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("embed", embed_chunks, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("upsert", lambda work: upsert_chunks(work, writer), queue_size=PIPELINE_QUEUE_SIZE),
+    ])
+
+# Process documents from folders with specific year filters and return the per-stage report
+def process_documents() -> dict:
     folders = ['sporting/', 'financial/', 'technical/']
     years = ['2024', '2026']
     initialize_indexes()
-    documents = fetch_documents(folders, years)
+    # Documents flow into the pipeline as soon as they are listed
+    documents = iter_documents(folders, years)
+
+    with multi_process_encoding(), DoclingProcessPool(DOCLING_WORKERS, DOCLING_WORKER_MAX_MEMORY_MB, extractor=PDF_EXTRACTOR) as pool, create_upsert_writer() as writer:
+        report = build_pipeline(pool, writer, create_markdown_artifacts()).run(documents)
 
-    if not documents:
+    if not sum(report['download'][count] for count in ('processed', 'dropped', 'failed')):
         logging.warning("No documents found containing specified years.")
-        return
 
-    for document in documents:
-        process_document(document)
+    if _encode_stats['seconds']:
+        logging.info(f"Sentence transformer throughput: {_encode_stats['chunks'] / _encode_stats['seconds']:.1f} chunks/sec "
+                     f"({_encode_stats['chunks']} chunks, batch size {ENCODE_BATCH_SIZE}, {max(ENCODE_PROCESSES, 1)} process(es)).")
+
+    for failure in writer.failures:
+        logging.error(f"Failed to upsert {len(failure.vector_ids)} vectors to {failure.index_name}: {failure.error}")
+    return report
 
 if __name__ == "__main__":
     logging.info("Starting document processing...")
@@ -3,8 +3,11 @@ import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
-from io import BytesIO
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path='/Users/aniketpatole/Documents/GitHub/New/Projects/BigData/Final-Project/.env')
@@ -14,62 +17,126 @@ AWS_SECRET_ACCESS_KEY_RAG = os.getenv('AWS_SECRET_ACCESS_KEY_RAG')
 AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
 URL = os.getenv('url')  # The base URL to scrape
 
-# Initialize S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID_RAG,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY_RAG
-)
+# Mirroring: documents transferred at once, and the part size of the multipart uploads they stream into
+MIRROR_WORKERS = int(os.getenv('MIRROR_WORKERS', '4'))
+MULTIPART_CHUNK_SIZE = int(os.getenv('MULTIPART_CHUNK_SIZE', str(8 * 1024 * 1024)))
 
-def upload_to_s3(file_name, file_content):
-    s3_client.upload_fileobj(file_content, AWS_BUCKET_NAME, file_name)
+# S3 client, created on first use so importing this module stays cheap for the DAG parser
+@lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=AWS_ACCESS_KEY_ID_RAG,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY_RAG
+    )
+
+def upload_to_s3(file_name, file_content, extra_args=None):
+    # upload_fileobj reads the stream one part at a time and switches to a multipart upload
+    # once it passes the threshold, so a PDF never has to fit in memory
+    config = TransferConfig(multipart_threshold=MULTIPART_CHUNK_SIZE, multipart_chunksize=MULTIPART_CHUNK_SIZE, max_concurrency=2)
+    get_s3_client().upload_fileobj(file_content, AWS_BUCKET_NAME, file_name, ExtraArgs=extra_args, Config=config)
+
+def remote_fingerprint(headers):
+    return {
+        'size': headers.get('Content-Length'),
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+    }
+
+def stored_fingerprint(key):
+    try:
+        head = get_s3_client().head_object(Bucket=AWS_BUCKET_NAME, Key=key)
+    except ClientError:
+        return None
+    metadata = head.get('Metadata', {})
+    # The object holds the decoded body, so compare against the Content-Length the source sent;
+    # copies mirrored before that was recorded fall back to their own size
+    return {
+        'size': metadata.get('source-content-length', str(head['ContentLength'])),
+        'etag': metadata.get('source-etag'),
+        'last_modified': metadata.get('source-last-modified'),
+    }
+
+def is_unchanged(remote, stored):
+    # Equal sizes alone are not proof; at least one validator recorded at upload time must match too
+    if stored is None or remote['size'] is None or remote['size'] != stored['size']:
+        return False
+    return any(remote[field] and remote[field] == stored[field] for field in ('etag', 'last_modified'))
 
 def download_and_upload_pdf(pdf_url, category):
-    print(f"Downloading PDF from {pdf_url}")  # Debug print
-    response = requests.get(pdf_url)
-    if response.status_code == 200:
-        pdf_name = pdf_url.split("/")[-1]
-        upload_to_s3(f"{category}/{pdf_name}", BytesIO(response.content))
+    """Stream one PDF into S3 unless the stored copy matches the remote size and validators."""
+    pdf_name = pdf_url.split("/")[-1]
+    key = f"{category}/{pdf_name}"
+    try:
+        head = requests.head(pdf_url, allow_redirects=True, timeout=30)
+        if head.status_code == 200 and is_unchanged(remote_fingerprint(head.headers), stored_fingerprint(key)):
+            print(f"Skipping {pdf_name}, unchanged since the last mirror.")
+            return "unchanged"
+
+        print(f"Downloading PDF from {pdf_url}")  # Debug print
+        with requests.get(pdf_url, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                print(f"Failed to download {pdf_url}, status code: {response.status_code}")
+                return "failed"
+            remote = remote_fingerprint(response.headers)
+            metadata = {'source-url': pdf_url}
+            if remote['size']:
+                metadata['source-content-length'] = remote['size']
+            if remote['etag']:
+                metadata['source-etag'] = remote['etag']
+            if remote['last_modified']:
+                metadata['source-last-modified'] = remote['last_modified']
+            response.raw.decode_content = True
+            upload_to_s3(key, response.raw, {'ContentType': 'application/pdf', 'Metadata': metadata})
         print(f"Uploaded {pdf_name} to category {category} in S3.")
-    else:
-        print(f"Failed to download {pdf_url}, status code: {response.status_code}")
+        return "uploaded"
+    except Exception as e:
+        print(f"Failed to mirror {pdf_url}: {e}")
+        return "failed"
 
-def scrape_documents(URL):
+def categorize(title):
+    if "Sporting" in title:
+        return "sporting"
+    elif "Technical" in title:
+        return "technical"
+    elif "Financial" in title:
+        return "financial"
+    return "related_regulations"
+
+def list_documents(URL):
     # Sending GET request to fetch the page content
     response = requests.get(URL)
     print(f"Fetched page with status code {response.status_code}")  # Debug print
 
     # Check if the page request was successful
-    if response.status_code == 200:
-        # Parse the HTML content of the page
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Find all the document links inside the 'list-item' divs
-        document_elements = soup.select(".list-item a")
-        print(f"Found {len(document_elements)} document(s)")  # Debug print
-
-        for document in document_elements:
-            title = document.get_text().strip()
-            pdf_url = document.get('href')
-
-            # Construct the full URL (if the link is relative)
-            full_pdf_url = urljoin(URL, pdf_url)
-            print(f"Full PDF URL: {full_pdf_url}")  # Debug print
-
-            # Categorize the document based on its title
-            if "Sporting" in title:
-                category = "sporting"
-            elif "Technical" in title:
-                category = "technical"
-            elif "Financial" in title:
-                category = "financial"
-            else:
-                category = "related_regulations"
-
-            # Download and upload the PDF to S3
-            download_and_upload_pdf(full_pdf_url, category)
-    else:
+    if response.status_code != 200:
         print(f"Failed to retrieve the page. Status code: {response.status_code}")
+        return []
+
+    # Parse the HTML content of the page
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    # Find all the document links inside the 'list-item' divs
+    document_elements = soup.select(".list-item a")
+    print(f"Found {len(document_elements)} document(s)")  # Debug print
+
+    documents = []
+    for document in document_elements:
+        title = document.get_text().strip()
+        # Construct the full URL (if the link is relative)
+        full_pdf_url = urljoin(URL, document.get('href'))
+        print(f"Full PDF URL: {full_pdf_url}")  # Debug print
+        documents.append((full_pdf_url, categorize(title)))
+    return documents
+
+def scrape_documents(URL):
+    """Mirror every regulation PDF linked from the page, several at a time."""
+    documents = list_documents(URL)
+    with ThreadPoolExecutor(max_workers=MIRROR_WORKERS) as executor:
+        outcomes = list(executor.map(lambda document: download_and_upload_pdf(*document), documents))
+    counts = {outcome: outcomes.count(outcome) for outcome in ("uploaded", "unchanged", "failed")}
+    print(f"Mirrored {len(documents)} document(s): {counts}")
+    return counts
 
 if __name__ == "__main__":
     print("Starting document processing...")
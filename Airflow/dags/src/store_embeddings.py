@@ -1,15 +1,31 @@
 import os
+import json
+import hashlib
 import logging
+import tempfile
+import numpy as np
+from functools import lru_cache
 import openai
 import boto3
 from pinecone import Pinecone, ServerlessSpec
 from dotenv import load_dotenv
-from typing import List
+from typing import Iterator, List, Optional
 from botocore.config import Config
 from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document as LCDocument
-from docling.document_converter import DocumentConverter
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from docling_pool import DoclingProcessPool, convert_pdfs, create_extractor
+from ingestion_pipeline import Stage, StagedPipeline
+from embedding_batcher import EmbeddingBatcher
+from pinecone_writer import PineconeUpsertWriter
+from s3_listing import iter_s3_objects
+from s3_source import S3PDFSource
+from embedding_cache import EmbeddingCache, DEFAULT_CACHE_PATH
+from regulation_chunker import CHUNKER_VERSION, RegulationChunker
+from chunk_store import ChunkStore, ChunkStoreWriter, merge_chunk_stores
+from progress_journal import DeadLetter, ProgressJournal, DEFAULT_JOURNAL_PATH
+from vector_reduction import fit_pca, recall_at_k
+from markdown_artifacts import MarkdownArtifact, MarkdownArtifacts, LocalArtifactStore, S3ArtifactStore, join_pages
+from ingestion_manifest import IngestionManifest, LocalManifestStore, S3ManifestStore, chunk_hash
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,24 +34,74 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 load_dotenv()
 boto_config = Config(retries={'max_attempts': 10, 'mode': 'standard'}, max_pool_connections=50)
 
-# Initialize API keys and clients
+# Initialize API keys
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
-# Initialize Pinecone
-pinecone_client = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
+# Clients are created on first use so importing this module stays cheap for the scheduler
+@lru_cache(maxsize=None)
+def get_pinecone_client() -> Pinecone:
+    return Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
 
-# Configure S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id_rag=os.getenv('AWS_ACCESS_KEY_ID_RAG'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY_RAG'),
-    config=boto_config
-)
+@lru_cache(maxsize=None)
+def get_s3_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID_RAG'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY_RAG'),
+        endpoint_url=os.getenv('S3_ENDPOINT_URL'),
+        config=boto_config
+    )
 
 # Configuration
 AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+# Chunks follow the regulation's articles and are capped in tokens rather than characters
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '256'))
+PINECONE_UPSERT_WORKERS = int(os.getenv('PINECONE_UPSERT_WORKERS', '4'))
+PINECONE_FETCH_BATCH_SIZE = int(os.getenv('PINECONE_FETCH_BATCH_SIZE', '200'))
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_TOKENS_PER_REQUEST = int(os.getenv('EMBEDDING_TOKENS_PER_REQUEST', '100000'))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', DEFAULT_CACHE_PATH)
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', '512'))
+EMBEDDING_CACHE_DTYPE = os.getenv('EMBEDDING_CACHE_DTYPE', 'float32')
+DOCLING_WORKERS = int(os.getenv('DOCLING_WORKERS', str(os.cpu_count() or 1)))
+DOCLING_WORKER_MAX_MEMORY_MB = int(os.getenv('DOCLING_WORKER_MAX_MEMORY_MB', '0')) or None
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', '2'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))
+PDF_SPOOL_MAX_MB = int(os.getenv('PDF_SPOOL_MAX_MB', '64'))
+# "hybrid" reads plain pages from the PDF text layer, "docling" converts every page with Docling
+PDF_EXTRACTOR = os.getenv('PDF_EXTRACTOR', 'hybrid')
+MARKDOWN_ARTIFACT_DIR = os.getenv('MARKDOWN_ARTIFACT_DIR')
+MARKDOWN_ARTIFACT_PREFIX = os.getenv('MARKDOWN_ARTIFACT_PREFIX', 'artifacts/markdown/')
+# Chunk text lives in a local chunk store rather than in Pinecone metadata
+CHUNK_STORE_DIR = os.getenv('CHUNK_STORE_DIR')
+CHUNK_STORE_PREFIX = os.getenv('CHUNK_STORE_PREFIX', 'chunk-store/')
+CHUNK_STORE_PATH = os.getenv('CHUNK_STORE_PATH', os.path.join(tempfile.gettempdir(), 'f1_chunks.bin'))
+PROGRESS_JOURNAL_PATH = os.getenv('PROGRESS_JOURNAL_PATH', DEFAULT_JOURNAL_PATH)
+DEAD_LETTER_BATCH_SIZE = int(os.getenv('DEAD_LETTER_BATCH_SIZE', '100'))
+DEAD_LETTER_MAX_ATTEMPTS = int(os.getenv('DEAD_LETTER_MAX_ATTEMPTS', '5'))
+# "pca" additionally serves reduced vectors from <index>-pca<dim> indexes; the Streamlit app must use the same setting
+EMBEDDING_REDUCTION = os.getenv('EMBEDDING_REDUCTION', '')
+EMBEDDING_REDUCED_DIM = int(os.getenv('EMBEDDING_REDUCED_DIM', '256'))
+REDUCTION_MIN_RECALL = float(os.getenv('REDUCTION_MIN_RECALL', '0.9'))
+PROJECTION_PREFIX = os.getenv('PROJECTION_PREFIX', 'artifacts/projection/')
+INGESTION_MANIFEST_DIR = os.getenv('INGESTION_MANIFEST_DIR')
+INGESTION_MANIFEST_PREFIX = os.getenv('INGESTION_MANIFEST_PREFIX', 'manifests/ingestion/')
+PROGRESS_JOURNAL_PREFIX = os.getenv('PROGRESS_JOURNAL_PREFIX', 'manifests/journal/')
+
+# Embedding cache shared with the sentence transformer pipeline and the Streamlit app
+@lru_cache(maxsize=None)
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_MB * 1024 * 1024, dtype=EMBEDDING_CACHE_DTYPE)
+
+# Per-chunk progress, used to resume interrupted runs and replay failed chunks; mirrored next to the manifest
+@lru_cache(maxsize=None)
+def get_progress_journal() -> ProgressJournal:
+    return ProgressJournal(PROGRESS_JOURNAL_PATH, model=EMBEDDING_MODEL, remote=create_journal_store())
+
+# Regulation folders and the years whose documents are ingested
+DOCUMENT_FOLDERS = ['sporting/', 'financial/', 'technical/']
+DOCUMENT_YEARS = ['2024', '2026']
 
 # Define Pinecone index map
 INDEX_MAP = {
@@ -45,12 +111,12 @@ INDEX_MAP = {
 }
 
 # Ensure Pinecone indexes exist
-def ensure_index_exists(index_name: str, dimension: int = 1536):
-    if index_name not in pinecone_client.list_indexes().names():
-        pinecone_client.create_index(
+def ensure_index_exists(index_name: str, dimension: int = 1536, metric: str = "euclidean"):
+    if index_name not in get_pinecone_client().list_indexes().names():
+        get_pinecone_client().create_index(
             name=index_name,
             dimension=dimension,
-            metric="euclidean",
+            metric=metric,
             spec=ServerlessSpec(cloud="aws", region=os.getenv('PINECONE_REGION'))
         )
         logging.info(f"Created Pinecone index: {index_name}")
@@ -64,46 +130,52 @@ def initialize_indexes():
 
 # PDF Loader using Docling
 class DoclingPDFLoader(BaseLoader):
-    def __init__(self, file_path: str | List[str]):
+    def __init__(self, file_path: str | List[str], max_workers: int = 1):
         self._file_paths = file_path if isinstance(file_path, list) else [file_path]
-        self._converter = DocumentConverter()
+        self._max_workers = max_workers
 
     def lazy_load(self) -> LCDocument:
+        if self._max_workers > 1 and len(self._file_paths) > 1:
+            # Documents are yielded in completion order, tagged with their source path
+            sources = ((source, source) for source in self._file_paths)
+            for source, text, error in convert_pdfs(sources, self._max_workers, DOCLING_WORKER_MAX_MEMORY_MB, extractor=PDF_EXTRACTOR):
+                if error is None:
+                    yield LCDocument(page_content=text, metadata={"source": source})
+            return
+        extract = create_extractor(PDF_EXTRACTOR)
         for source in self._file_paths:
-            dl_doc = self._converter.convert(source).document
-            text = dl_doc.export_to_markdown()
-            yield LCDocument(page_content=text)
+            text = join_pages(extract(source))[0]
+            yield LCDocument(page_content=text, metadata={"source": source})
+
+# Token counts use the embedding model's tokenizer
+@lru_cache(maxsize=None)
+def get_chunker() -> RegulationChunker:
+    return RegulationChunker(max_tokens=CHUNK_MAX_TOKENS, model=EMBEDDING_MODEL)
+
+# Split converted markdown into non-overlapping, article-aligned chunks
+def split_markdown(text: str, page_at=None) -> List[LCDocument]:
+    return [LCDocument(page_content=chunk.text, metadata=chunk.metadata) for chunk in get_chunker().split(text, page_at)]
 
 # Extract text from PDF
 def extract_text_from_pdf(file_path: str) -> List[LCDocument]:
     loader = DoclingPDFLoader(file_path=file_path)
     docs = loader.load()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    return splitter.split_documents(docs)
+    return [chunk for doc in docs for chunk in split_markdown(doc.page_content)]
+
+# Stream documents from specific folders in S3 while they are being listed
+def iter_documents(folders: List[str], years: List[str]) -> Iterator[dict]:
+    def is_wanted(key: str) -> bool:
+        return key.endswith('.pdf') and any(year in key for year in years)
+
+    for obj in iter_s3_objects(get_s3_client(), AWS_BUCKET_NAME, folders, key_filter=is_wanted):
+        yield {'id': obj['Key'], 's3_key': obj['Key'], 'category': obj['Prefix'].rstrip('/'), 'etag': obj.get('ETag')}
 
 # Fetch documents from specific folders in S3
 def fetch_documents(folders: List[str], years: List[str]) -> List[dict]:
-    documents = []
-    for folder in folders:
-        logging.info(f"Fetching documents from folder: {folder}")
-        try:
-            response = s3_client.list_objects_v2(Bucket=AWS_BUCKET_NAME, Prefix=folder)
-            if 'Contents' in response:
-                filtered_documents = [
-                    {'id': obj['Key'], 's3_key': obj['Key'], 'category': folder.rstrip('/')}
-                    for obj in response['Contents']
-                    if any(year in obj['Key'] for year in years) and obj['Key'].endswith('.pdf')
-                ]
-                documents.extend(filtered_documents)
-                logging.info(f"Found {len(filtered_documents)} documents in {folder}.")
-            else:
-                logging.warning(f"No documents found in folder: {folder}")
-        except Exception as e:
-            logging.error(f"Error fetching documents from folder {folder}: {e}")
-    return documents
+    return list(iter_documents(folders, years))
 
 # Generate embeddings using OpenAI
-def generate_embedding(text: str, model: str = "text-embedding-ada-002") -> List[float]:
+def generate_embedding(text: str, model: str = EMBEDDING_MODEL) -> List[float]:
     try:
         logging.info("Generating embedding for text...")
         response = openai.Embedding.create(input=text, model=model)
@@ -114,69 +186,522 @@ def generate_embedding(text: str, model: str = "text-embedding-ada-002") -> List
         logging.error(f"Error generating embedding: {e}")
         return []
 
-# Upsert embedding into Pinecone
-def upsert_to_pinecone(index_name: str, vector_id: str, embedding: List[float], metadata: dict):
-    try:
-        logging.info(f"Upserting embedding to Pinecone index {index_name}...")
-        index = pinecone_client.Index(index_name)
-        index.upsert(vectors=[(vector_id, embedding, metadata)])
-        logging.info("Embedding upserted successfully.")
-    except Exception as e:
-        logging.error(f"Error upserting to Pinecone: {e}")
+# Generate embeddings for many texts in as few OpenAI requests as possible
+def generate_embeddings(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    def embed_batch(batch: List[str]) -> List[List[float]]:
+        response = openai.Embedding.create(input=batch, model=model)
+        data = sorted(response['data'], key=lambda item: item['index'])
+        return [item['embedding'] for item in data]
 
-# Process a single document
-def process_document(document: dict):
-    try:
-        regulation_id = document.get('id')
-        s3_key = document.get('s3_key')
-        category = document.get('category')
+    batcher = EmbeddingBatcher(embed_batch, model=model, max_tokens_per_request=EMBEDDING_TOKENS_PER_REQUEST)
+    embeddings = get_embedding_cache().get_or_compute(model, texts, batcher.embed)
+    logging.info(f"Generated {sum(1 for e in embeddings if e)}/{len(texts)} embeddings in {batcher.requests_made} request(s).")
+    return embeddings
 
-        if not regulation_id or not s3_key or not category:
-            logging.error(f"Invalid document structure: {document}")
-            return
+# Upsert writer that batches vectors and reuses one index handle per category
+def create_upsert_writer() -> PineconeUpsertWriter:
+    return PineconeUpsertWriter(get_pinecone_client(), max_workers=PINECONE_UPSERT_WORKERS)
 
-        local_file_path = f"/tmp/{os.path.basename(s3_key)}"
-        s3_client.download_file(AWS_BUCKET_NAME, s3_key, local_file_path)
+# Writer for document ingestion; every successful batch is journaled as soon as it lands
+def create_ingestion_writer() -> PineconeUpsertWriter:
+    return PineconeUpsertWriter(
+        get_pinecone_client(), max_workers=PINECONE_UPSERT_WORKERS, on_upserted=get_progress_journal().mark_vectors_upserted
+    )
 
-        # Extract text chunks from the document
-        chunks = extract_text_from_pdf(local_file_path)
-        if not chunks:
-            logging.warning(f"No text chunks extracted for {regulation_id}. Skipping...")
-            return
+# Manifest of what has already been ingested, kept in S3 unless a local directory is configured
+def create_manifest() -> IngestionManifest:
+    if INGESTION_MANIFEST_DIR:
+        store = LocalManifestStore(INGESTION_MANIFEST_DIR)
+    else:
+        store = S3ManifestStore(get_s3_client(), AWS_BUCKET_NAME, INGESTION_MANIFEST_PREFIX)
+    return IngestionManifest(store, model=EMBEDDING_MODEL, chunking=f"regulation-v{CHUNKER_VERSION}-{CHUNK_MAX_TOKENS}")
+
+# Per-document journal snapshots, so a retry on another worker resumes where the last attempt stopped
+def create_journal_store():
+    if INGESTION_MANIFEST_DIR:
+        return LocalManifestStore(os.path.join(INGESTION_MANIFEST_DIR, 'journal'))
+    return S3ManifestStore(get_s3_client(), AWS_BUCKET_NAME, PROGRESS_JOURNAL_PREFIX)
 
-        for i, chunk in enumerate(chunks):
-            vector_id = f"{regulation_id}_chunk_{i+1}"
-            embedding = generate_embedding(chunk.page_content)
-            if not embedding:
-                logging.warning(f"Embedding generation failed for chunk {i} of {regulation_id}. Skipping...")
+# Record how a document ended and publish its journal for other workers
+def finish_document(s3_key: str, status: str, error: Optional[str] = None):
+    journal = get_progress_journal()
+    journal.mark_document(s3_key, status, error)
+    if s3_key:
+        journal.persist(s3_key)
+
+# Converted markdown kept next to the PDFs so re-chunking does not need Docling again
+def create_markdown_artifacts() -> MarkdownArtifacts:
+    if MARKDOWN_ARTIFACT_DIR:
+        store = LocalArtifactStore(MARKDOWN_ARTIFACT_DIR)
+    else:
+        store = S3ArtifactStore(get_s3_client(), AWS_BUCKET_NAME, MARKDOWN_ARTIFACT_PREFIX)
+    return MarkdownArtifacts(store, extractor=PDF_EXTRACTOR)
+
+# Check the document structure and whether it changed since the last run
+def needs_processing(document: dict, manifest: IngestionManifest) -> bool:
+    if not document.get('id') or not document.get('s3_key') or not document.get('category'):
+        logging.error(f"Invalid document structure: {document}")
+        return False
+    if manifest.is_unchanged(document['s3_key'], document.get('etag')):
+        logging.info(f"{document['s3_key']} is unchanged since the last run. Skipping...")
+        return False
+    return True
+
+# Stream the document's PDF from S3; it only touches disk above PDF_SPOOL_MAX_MB
+def open_document(document: dict) -> S3PDFSource:
+    return S3PDFSource(get_s3_client(), AWS_BUCKET_NAME, document['s3_key'], max_memory_bytes=PDF_SPOOL_MAX_MB * 1024 * 1024)
+
+# Per-document chunk store parts, merged into one file by build_chunk_store()
+def create_chunk_part_store():
+    if CHUNK_STORE_DIR:
+        return LocalArtifactStore(os.path.join(CHUNK_STORE_DIR, 'parts'))
+    return S3ArtifactStore(get_s3_client(), AWS_BUCKET_NAME, CHUNK_STORE_PREFIX + 'parts/')
+
+# Replace the document's part of the chunk store with its current chunks
+def write_chunk_store_part(document: dict, chunks: List[LCDocument], vector_ids: List[str]):
+    with tempfile.TemporaryDirectory(prefix="chunk-part-") as directory:
+        path = os.path.join(directory, 'part.bin')
+        with ChunkStoreWriter(path) as part:
+            for i, (chunk, vector_id) in enumerate(zip(chunks, vector_ids)):
+                part.add(vector_id, chunk.page_content, **chunk_metadata(document, i, chunk))
+        with open(path, 'rb') as f:
+            create_chunk_part_store().save(f"{document['s3_key']}.chunks", f.read(), content_type='application/octet-stream')
+
+# Drop the parts, vectors and manifest entries of documents that were deleted or renamed in S3
+def prune_chunk_store_parts(parts, manifest: IngestionManifest) -> List[str]:
+    current = {document['s3_key'] for document in iter_documents(DOCUMENT_FOLDERS, DOCUMENT_YEARS)}
+    kept = []
+    with create_upsert_writer() as writer:
+        for key in sorted(parts.keys()):
+            if not key.endswith('.chunks'):
                 continue
+            s3_key = key[:-len('.chunks')]
+            entry = manifest.get(s3_key)
+            if s3_key in current and entry:
+                kept.append(key)
+                continue
+            if entry and s3_key not in current:
+                index_name = INDEX_MAP.get(s3_key.split('/', 1)[0])
+                if index_name and entry.get('vector_ids'):
+                    writer.delete(index_name, entry['vector_ids'])
+                if writer.failed_vector_ids().intersection(entry.get('vector_ids', [])):
+                    # Keep everything so the next build retries the delete
+                    kept.append(key)
+                    continue
+                manifest.forget(s3_key)
+                get_progress_journal().forget_removed(s3_key, [])
+            parts.delete(key)
+            logging.info(f"Dropped the stale chunk store part of {s3_key}.")
+    return kept
+
+# Merge every document's part into the chunk store the Streamlit app memory-maps
+def build_chunk_store() -> str:
+    parts = create_chunk_part_store()
+    stores = [ChunkStore.from_bytes(parts.load(key)) for key in prune_chunk_store_parts(parts, create_manifest())]
+    count = merge_chunk_stores(stores, CHUNK_STORE_PATH)
+    logging.info(f"Wrote {count} chunks from {len(stores)} document(s) to {CHUNK_STORE_PATH}")
+    if not CHUNK_STORE_DIR:
+        get_s3_client().upload_file(CHUNK_STORE_PATH, AWS_BUCKET_NAME, CHUNK_STORE_PREFIX + 'chunks.bin')
+        logging.info(f"Uploaded chunk store to s3://{AWS_BUCKET_NAME}/{CHUNK_STORE_PREFIX}chunks.bin")
+    return CHUNK_STORE_PATH
+
+# Open the merged chunk store, fetching it from S3 when another worker built it
+def open_chunk_store() -> ChunkStore:
+    if not os.path.exists(CHUNK_STORE_PATH) and not CHUNK_STORE_DIR:
+        get_s3_client().download_file(AWS_BUCKET_NAME, CHUNK_STORE_PREFIX + 'chunks.bin', CHUNK_STORE_PATH)
+    return ChunkStore.open(CHUNK_STORE_PATH)
+
+# Name of the index holding the reduced vectors of a category
+def reduced_index_name(index_name: str) -> str:
+    return f"{index_name}-pca{EMBEDDING_REDUCED_DIM}"
+
+# Projection artifacts live next to the markdown artifacts, one per model and dimension
+def projection_key() -> str:
+    return f"{EMBEDDING_MODEL}-pca{EMBEDDING_REDUCED_DIM}.npz"
+
+def create_projection_store():
+    if MARKDOWN_ARTIFACT_DIR:
+        return LocalArtifactStore(os.path.join(MARKDOWN_ARTIFACT_DIR, 'projection'))
+    return S3ArtifactStore(get_s3_client(), AWS_BUCKET_NAME, PROJECTION_PREFIX)
+
+# Records which chunk store the published projection and reduced indexes were built from
+def projection_state_key() -> str:
+    return f"{EMBEDDING_MODEL}-pca{EMBEDDING_REDUCED_DIM}.state.json"
+
+def chunk_store_fingerprint(records: dict) -> str:
+    digest = hashlib.sha256()
+    for vector_id in sorted(records):
+        digest.update(json.dumps([vector_id, records[vector_id]], sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+# Full-precision vectors of the given ids, read back from their Pinecone index in batches
+def fetch_vectors(index_name: str, vector_ids: List[str]) -> dict:
+    index = get_pinecone_client().Index(index_name)
+    vectors = {}
+    for start in range(0, len(vector_ids), PINECONE_FETCH_BATCH_SIZE):
+        response = index.fetch(ids=vector_ids[start:start + PINECONE_FETCH_BATCH_SIZE])
+        vectors.update((vector_id, vector.values) for vector_id, vector in response.vectors.items())
+    return vectors
+
+# Fit a PCA projection on the whole corpus and upsert the reduced vectors into their own indexes
+def build_reduced_indexes():
+    if EMBEDDING_REDUCTION != 'pca':
+        logging.info("Embedding reduction is disabled.")
+        return
+    store = open_chunk_store()
+    try:
+        records = store.get_many(list(store.ids()))
+    finally:
+        store.close()
+
+    fingerprint = chunk_store_fingerprint(records)
+    projections = create_projection_store()
+    state = projections.load(projection_state_key())
+    if state and json.loads(state).get('chunk_store') == fingerprint:
+        logging.info("Chunk store is unchanged since the last projection; keeping the reduced indexes as they are.")
+        return
+
+    # Every chunk is already in its full-precision index, so read the vectors back instead of re-embedding
+    ids_by_index = {}
+    for vector_id, record in records.items():
+        ids_by_index.setdefault(INDEX_MAP[record['category']], []).append(vector_id)
+    vectors = {}
+    for index_name, vector_ids in ids_by_index.items():
+        vectors.update(fetch_vectors(index_name, vector_ids))
+    if len(vectors) < len(records):
+        logging.warning(f"{len(records) - len(vectors)} chunk(s) have no vector in Pinecone and are left out of the projection")
+    kept = [(vector_id, record, vectors[vector_id]) for vector_id, record in records.items() if vector_id in vectors]
+    full = np.array([embedding for _, _, embedding in kept], dtype=np.float32)
 
-            # Add the full text of the chunk to the metadata
-            metadata = {
-                "s3_key": s3_key,
-                "chunk": i + 1,
-                "category": category,
-                "text": chunk.page_content
-            }
-            upsert_to_pinecone(INDEX_MAP[category], vector_id, embedding, metadata)
+    projection = fit_pca(full, EMBEDDING_REDUCED_DIM, EMBEDDING_MODEL)
+    reduced = projection.transform(full)
+    projection.recall = {f"recall@{k}": recall_at_k(full, reduced, k=k) for k in (5, 10)}
+    logging.info(f"PCA {full.shape[1]} -> {EMBEDDING_REDUCED_DIM} dims over {len(kept)} chunks: "
+                 f"{projection.explained_variance:.1%} variance explained, {projection.recall}")
+    if projection.recall["recall@5"] < REDUCTION_MIN_RECALL:
+        raise RuntimeError(f"recall@5 {projection.recall['recall@5']:.3f} is below {REDUCTION_MIN_RECALL}; keeping the previous projection")
+
+    with create_upsert_writer() as writer:
+        for index_name in INDEX_MAP.values():
+            ensure_index_exists(reduced_index_name(index_name), dimension=EMBEDDING_REDUCED_DIM, metric="cosine")
+        for (vector_id, record, _), vector in zip(kept, reduced):
+            metadata = {key: value for key, value in record.items() if key != 'text'}
+            writer.add(reduced_index_name(INDEX_MAP[record['category']]), vector_id, vector.tolist(), metadata)
+        writer.flush()
+        # Chunks that left the chunk store would otherwise stay searchable, projected with the old version
+        kept_ids = {vector_id for vector_id, _, _ in kept}
+        for index_name in INDEX_MAP.values():
+            stale_ids = [vector_id for vector_id in list_vector_ids(reduced_index_name(index_name)) if vector_id not in kept_ids]
+            if stale_ids:
+                logging.info(f"Removing {len(stale_ids)} stale vectors from {reduced_index_name(index_name)}")
+                writer.delete(reduced_index_name(index_name), stale_ids)
+    if writer.failures:
+        raise RuntimeError(f"{len(writer.failures)} Pinecone batch(es) failed while updating the reduced indexes")
+    # Publish the projection only once the indexes match it, so queries never mix versions for long
+    projections.save(projection_key(), projection.to_bytes(), content_type='application/octet-stream')
+    projections.save(projection_state_key(), json.dumps({'chunk_store': fingerprint, 'projection': projection.version}).encode('utf-8'))
+    logging.info(f"Saved projection {projection.version} as {projection_key()}")
+
+# Reuse the stored markdown of an unchanged PDF, converting and storing it otherwise
+def load_markdown(document: dict, artifacts: MarkdownArtifacts, convert_pages=None) -> MarkdownArtifact:
+    artifact = artifacts.get(document['s3_key'], document.get('etag'))
+    if artifact is not None:
+        logging.info(f"Reusing converted markdown for {document['s3_key']}")
+        return artifact
+    convert_pages = convert_pages or create_extractor(PDF_EXTRACTOR)
+    with open_document(document) as source:
+        pages = convert_pages(source)
+    artifact = MarkdownArtifact.from_pages(document['s3_key'], document.get('etag'), PDF_EXTRACTOR, pages)
+    artifacts.put(artifact)
+    return artifact
+
+# Chunks used to be stored as "<document id>_chunk_<position>"
+def legacy_id_prefix(document: dict) -> str:
+    return f"{document['id']}_chunk_"
+
+# Ids of every vector in an index, or of those starting with ``prefix`` (serverless indexes only)
+def list_vector_ids(index_name: str, prefix: Optional[str] = None) -> List[str]:
+    index = get_pinecone_client().Index(index_name)
+    pages = index.list(prefix=prefix) if prefix else index.list()
+    return [vector_id for page in pages for vector_id in page]
+
+# Work out which chunks of a document need embedding
+def plan_chunks(document: dict, chunks: List[LCDocument], manifest: IngestionManifest) -> Optional[dict]:
+    if not chunks:
+        logging.warning(f"No text chunks extracted for {document['id']}. Skipping...")
+        return None
+    chunk_hashes = [chunk_hash(chunk.page_content) for chunk in chunks]
+    plan = manifest.plan(document['s3_key'], chunk_hashes, document['id'])
+    vector_ids = plan.vector_ids
+    if plan.new_document:
+        # Vectors from before the manifest existed are not in it; they are found by their old id scheme
+        legacy_ids = list_vector_ids(INDEX_MAP[document['category']], legacy_id_prefix(document))
+        plan.orphaned_ids.extend(legacy_ids)
+        if legacy_ids:
+            logging.info(f"{document['id']}: removing {len(legacy_ids)} vectors stored under legacy ids.")
+
+    # Chunks an interrupted run already upserted do not need embedding again
+    upserted = get_progress_journal().upserted(document['s3_key'])
+    resumed = {i for i in plan.to_embed if upserted.get(vector_ids[i]) == chunk_hashes[i]}
+    if resumed:
+        plan.to_embed = [i for i in plan.to_embed if i not in resumed]
+        plan.unchanged = sorted(plan.unchanged + list(resumed))
+        logging.info(f"{document['id']}: resuming, {len(resumed)} chunks were upserted by an earlier run.")
+
+    logging.info(f"{document['id']}: {len(plan.to_embed)} new or changed chunks, {len(plan.unchanged)} unchanged, {len(plan.orphaned_ids)} orphaned vectors.")
+    return {'document': document, 'chunks': chunks, 'vector_ids': vector_ids, 'chunk_hashes': chunk_hashes, 'plan': plan}
+
+# Embed the chunks selected by the plan, reusing embeddings an interrupted run journaled but did not upsert
+def embed_planned_chunks(work: dict) -> dict:
+    s3_key, vector_ids, chunk_hashes = work['document']['s3_key'], work['vector_ids'], work['chunk_hashes']
+    journal = get_progress_journal()
+    embedded = journal.embedded(s3_key)
+    reused = {
+        i: embedded[vector_ids[i]][1] for i in work['plan'].to_embed
+        if vector_ids[i] in embedded and embedded[vector_ids[i]][0] == chunk_hashes[i]
+    }
+    missing = [i for i in work['plan'].to_embed if i not in reused]
+    computed = dict(zip(missing, generate_embeddings([work['chunks'][i].page_content for i in missing]) if missing else []))
+    if reused:
+        logging.info(f"{work['document']['id']}: resuming, {len(reused)} chunks were embedded by an earlier run.")
+    if missing:
+        journal.mark_embedded(s3_key, [(vector_ids[i], chunk_hashes[i], computed[i]) for i in missing])
+        journal.persist(s3_key)
+    work['embeddings'] = [reused[i] if i in reused else computed[i] for i in work['plan'].to_embed]
+    return work
+
+# Pinecone metadata of a chunk; the text itself goes to the chunk store, keeping query responses small
+def chunk_metadata(document: dict, i: int, chunk: LCDocument) -> dict:
+    return {
+        "s3_key": document['s3_key'],
+        "chunk": i + 1,
+        "category": document['category'],
+        **chunk.metadata
+    }
+
+# Upsert the embedded chunks, drop orphaned vectors and update the manifest
+def upsert_planned_chunks(work: dict, writer: PineconeUpsertWriter, manifest: IngestionManifest) -> dict:
+    document, chunks, vector_ids, plan = work['document'], work['chunks'], work['vector_ids'], work['plan']
+    regulation_id = document['id']
+    s3_key = document['s3_key']
+    index_name = INDEX_MAP[document['category']]
+
+    # Orphans never share an id with a current chunk, so they can go before the new vectors arrive
+    if plan.orphaned_ids:
+        writer.delete(index_name, plan.orphaned_ids)
+
+    stored_hashes = list(work['chunk_hashes'])
+    for i, embedding in zip(plan.to_embed, work['embeddings']):
+        if not embedding:
+            logging.warning(f"Embedding generation failed for chunk {i} of {regulation_id}. Skipping...")
+            stored_hashes[i] = None
+            continue
+        writer.add(index_name, vector_ids[i], embedding, chunk_metadata(document, i, chunks[i]))
+
+    # Only remember chunks whose vectors actually reached Pinecone
+    writer.flush()
+    failed_ids = writer.failed_vector_ids()
+    stored_hashes = [None if vector_ids[i] in failed_ids else digest for i, digest in enumerate(stored_hashes)]
+    journal_chunks(work, index_name, failed_ids)
+    write_chunk_store_part(document, chunks, vector_ids)
+    if not failed_ids.intersection(plan.orphaned_ids):
+        manifest.record(s3_key, document.get('etag'), stored_hashes, vector_ids)
+    return work
+
+# Dead-letter the chunks that did not reach Pinecone; the writer journaled the others batch by batch
+def journal_chunks(work: dict, index_name: str, failed_ids: set):
+    document, chunks, vector_ids, chunk_hashes = work['document'], work['chunks'], work['vector_ids'], work['chunk_hashes']
+    letters = []
+    for i, embedding in zip(work['plan'].to_embed, work['embeddings']):
+        if not embedding or vector_ids[i] in failed_ids:
+            error = "upsert failed" if embedding else "embedding failed"
+            letters.append(DeadLetter(
+                vector_ids[i], document['s3_key'], index_name, chunk_hashes[i],
+                chunks[i].page_content, chunk_metadata(document, i, chunks[i]), error, 1,
+            ))
+    journal = get_progress_journal()
+    journal.add_dead_letters(letters)
+    journal.forget_removed(document['s3_key'], vector_ids)
+    journal.persist(document['s3_key'])
+    if letters:
+        logging.warning(f"{document['id']}: {len(letters)} chunk(s) moved to the dead-letter list.")
+
+# Retry dead-lettered chunks in batches and return how many still fail
+def replay_dead_letters(s3_key: str = None) -> int:
+    journal = get_progress_journal()
+    letters = journal.dead_letters(s3_key, max_attempts=DEAD_LETTER_MAX_ATTEMPTS)
+    if not letters:
+        return 0
+    logging.info(f"Replaying {len(letters)} dead-lettered chunk(s) in batches of {DEAD_LETTER_BATCH_SIZE}...")
+    still_failing = 0
+    # A fresh writer so failures recorded by the main run do not mask successful retries
+    with create_upsert_writer() as writer:
+        for start in range(0, len(letters), DEAD_LETTER_BATCH_SIZE):
+            batch = letters[start:start + DEAD_LETTER_BATCH_SIZE]
+            embeddings = generate_embeddings([letter.text for letter in batch])
+            for letter, embedding in zip(batch, embeddings):
+                if embedding:
+                    writer.add(letter.index_name, letter.vector_id, embedding, letter.metadata)
+            writer.flush()
+            failed_ids = writer.failed_vector_ids()
+
+            retried = []
+            for letter, embedding in zip(batch, embeddings):
+                if embedding and letter.vector_id not in failed_ids:
+                    journal.mark_upserted(letter.s3_key, [(letter.vector_id, letter.chunk_hash)])
+                else:
+                    letter.attempts += 1
+                    letter.error = "upsert failed" if embedding else "embedding failed"
+                    retried.append(letter)
+            journal.add_dead_letters(retried)
+            still_failing += len(retried)
+    for key in sorted({letter.s3_key for letter in letters}):
+        journal.persist(key)
+    logging.info(f"Dead-letter replay: {len(letters) - still_failing} recovered, {still_failing} still failing.")
+    return still_failing
+
+# Embed and upsert the chunks of a single document
+def ingest_chunks(document: dict, chunks: List[LCDocument], writer: PineconeUpsertWriter, manifest: IngestionManifest):
+    work = plan_chunks(document, chunks, manifest)
+    if work:
+        upsert_planned_chunks(embed_planned_chunks(work), writer, manifest)
+
+# Process a single document
+def process_document(document: dict, writer: PineconeUpsertWriter = None, manifest: IngestionManifest = None):
+    owns_writer = writer is None
+    writer = writer or create_ingestion_writer()
+    manifest = manifest or create_manifest()
+    try:
+        if not needs_processing(document, manifest):
+            return
+        get_progress_journal().restore(document['s3_key'])
+        get_progress_journal().mark_document(document['s3_key'], 'started')
+        # Extract text chunks from the document
+        artifact = load_markdown(document, create_markdown_artifacts())
+        chunks = split_markdown(artifact.markdown, artifact.page_at)
+        ingest_chunks(document, chunks, writer, manifest)
+        finish_document(document['s3_key'], 'done')
 
     except Exception as e:
         logging.error(f"Error processing document {document}: {e}")
+        if document.get('s3_key'):
+            finish_document(document['s3_key'], 'failed', str(e))
+    finally:
+        if owns_writer:
+            writer.close()
 
-# Process documents from folders with specific year filters
-def process_documents():
-    folders = ['sporting/', 'financial/', 'technical/']
-    years = ['2024', '2026']
+# List the documents that changed since the last run, one entry per mapped task
+def list_documents_to_process() -> List[dict]:
     initialize_indexes()
-    documents = fetch_documents(folders, years)
+    manifest = create_manifest()
+    documents = [document for document in fetch_documents(DOCUMENT_FOLDERS, DOCUMENT_YEARS) if needs_processing(document, manifest)]
+    logging.info(f"{len(documents)} document(s) need processing.")
+    return documents
 
-    if not documents:
-        logging.warning("No documents found containing specified years.")
+# Ingest one document and raise on any failure so the calling task can retry it on its own
+def ingest_document(document: dict):
+    manifest = create_manifest()
+    if not needs_processing(document, manifest):
         return
+    journal = get_progress_journal()
+    journal.restore(document['s3_key'])
+    journal.mark_document(document['s3_key'], 'started')
+    try:
+        with create_ingestion_writer() as writer:
+            artifact = load_markdown(document, create_markdown_artifacts())
+            chunks = split_markdown(artifact.markdown, artifact.page_at)
+            work = plan_chunks(document, chunks, manifest)
+            if work:
+                upsert_planned_chunks(embed_planned_chunks(work), writer, manifest)
+        # A retry of this task resumes from the journal; failed chunks get one more chance first
+        failing = replay_dead_letters(document['s3_key'])
+        if failing:
+            raise RuntimeError(f"{failing} chunk(s) of {document['s3_key']} could not be embedded or upserted")
+        if work and writer.failed_vector_ids().intersection(work['plan'].orphaned_ids):
+            raise RuntimeError(f"Deleting orphaned vectors failed for {document['s3_key']}")
+    except Exception as e:
+        finish_document(document['s3_key'], 'failed', str(e))
+        raise
+    finish_document(document['s3_key'], 'done')
+
+# Build the download -> convert -> split -> embed -> upsert pipeline
+def build_pipeline(pool: DoclingProcessPool, writer: PineconeUpsertWriter, manifest: IngestionManifest, artifacts: MarkdownArtifacts) -> StagedPipeline:
+    journal = get_progress_journal()
+
+    def download(document: dict) -> Optional[dict]:
+        if not needs_processing(document, manifest):
+            return None
+        journal.restore(document['s3_key'])
+        journal.mark_document(document['s3_key'], 'started')
+        # Documents converted before skip the download and Docling entirely
+        artifact = artifacts.get(document['s3_key'], document.get('etag'))
+        if artifact is not None:
+            return {'document': document, 'artifact': artifact}
+        source = open_document(document)
+        source.open()
+        return {'document': document, 'source': source}
+
+    def convert(work: dict) -> dict:
+        if 'artifact' in work:
+            return work
+        source = work.pop('source')
+        try:
+            pages = pool.convert_pages(source.source)
+        finally:
+            source.close()
+        document = work['document']
+        artifact = MarkdownArtifact.from_pages(document['s3_key'], document.get('etag'), PDF_EXTRACTOR, pages)
+        artifacts.put(artifact)
+        work['artifact'] = artifact
+        return work
+
+    def split(work: dict) -> Optional[dict]:
+        artifact = work.pop('artifact')
+        planned = plan_chunks(work['document'], split_markdown(artifact.markdown, artifact.page_at), manifest)
+        if planned is None:
+            finish_document(work['document']['s3_key'], 'failed', "no text chunks extracted")
+        return planned
+
+    def upsert(work: dict) -> dict:
+        upsert_planned_chunks(work, writer, manifest)
+        finish_document(work['document']['s3_key'], 'done')
+        return work
+
+    def record_failure(stage: str, item, error: Exception):
+        document = item.get('document', item)
+        finish_document(document.get('s3_key', ''), 'failed', f"{stage}: {error}")
+
+    return StagedPipeline([
+        Stage("download", download, workers=DOWNLOAD_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("convert", convert, workers=pool.max_workers, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("split", split, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("embed", embed_planned_chunks, workers=EMBEDDING_WORKERS, queue_size=PIPELINE_QUEUE_SIZE),
+        Stage("upsert", upsert, queue_size=PIPELINE_QUEUE_SIZE),
+    ], on_error=record_failure)
+
+# Process documents from folders with specific year filters and return the per-stage report
+def process_documents() -> dict:
+    initialize_indexes()
+    # Documents flow into the pipeline as soon as they are listed
+    documents = iter_documents(DOCUMENT_FOLDERS, DOCUMENT_YEARS)
+
+    manifest = create_manifest()
+    with DoclingProcessPool(DOCLING_WORKERS, DOCLING_WORKER_MAX_MEMORY_MB, extractor=PDF_EXTRACTOR) as pool, create_ingestion_writer() as writer:
+        report = build_pipeline(pool, writer, manifest, create_markdown_artifacts()).run(documents)
+
+    if not sum(report['download'][count] for count in ('processed', 'dropped', 'failed')):
+        logging.warning("No documents found containing specified years.")
+
+    for failure in writer.failures:
+        logging.error(f"Failed to upsert {len(failure.vector_ids)} vectors to {failure.index_name}: {failure.error}")
+
+    replay_dead_letters()
+    for s3_key, error in get_progress_journal().documents('failed'):
+        logging.error(f"Document {s3_key} failed: {error}")
 
-    for document in documents:
-        process_document(document)
+    build_chunk_store()
+    return report
 
 if __name__ == "__main__":
     logging.info("Starting document processing...")
-    process_documents()
\ No newline at end of file
+    process_documents()
@@ -0,0 +1,178 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+# "lxml" walks a native libxml2 tree; "bs4-lxml" builds a BeautifulSoup tree with the lxml
+# parser; "html.parser" is the pure-Python BeautifulSoup parser the scrapers started with
+DEFAULT_BACKEND = os.getenv('HTML_PARSER_BACKEND', 'lxml')
+
+BLOCK_TAGS = {'p', 'h2', 'h3', 'h4', 'ul', 'ol', 'table'}
+LIST_TAGS = {'ul', 'ol'}
+# BeautifulSoup leaves script and style text out of get_text(), so the lxml backend does too
+SKIP_TEXT_TAGS = {'script', 'style', 'template'}
+
+
+@dataclass
+class Block:
+    """One p / heading / list / table element of the article body, in document order.
+
+    Nested block elements (a list inside a table, say) get their own entries as
+    well, matching what ``find_all`` over the article used to return.
+    """
+    tag: str
+    text: str
+    items: List[str] = field(default_factory=list)
+
+
+@dataclass
+class WikiPage:
+    found: bool
+    blocks: List[Block] = field(default_factory=list)
+    infobox: Dict[str, str] = field(default_factory=dict)
+    infobox_image: Optional[str] = None
+    images: List[str] = field(default_factory=list)
+
+    def texts(self, *tags: str) -> List[str]:
+        return [block.text for block in self.blocks if block.tag in tags]
+
+
+def _has_class(classes, name: str) -> bool:
+    if isinstance(classes, str):
+        classes = classes.split()
+    return name in (classes or ())
+
+
+class SoupBackend:
+    """BeautifulSoup with either the pure-Python or the lxml tree builder."""
+
+    def __init__(self, features: str):
+        self.features = features
+
+    def parse(self, html, url: str) -> WikiPage:
+        from bs4 import BeautifulSoup, Tag
+
+        soup = BeautifulSoup(html, self.features)
+        content = soup.find('div', {'class': 'mw-parser-output'})
+        if content is None:
+            page = WikiPage(False)
+            self._read_infobox(soup.find('table', class_='infobox'), page, url)
+            return page
+
+        page = WikiPage(True)
+        infobox = None
+        for element in content.descendants:
+            if not isinstance(element, Tag):
+                continue
+            if element.name in BLOCK_TAGS:
+                items = [li.get_text() for li in element.find_all('li')] if element.name in LIST_TAGS else []
+                page.blocks.append(Block(element.name, element.get_text(), items))
+                if infobox is None and element.name == 'table' and _has_class(element.get('class'), 'infobox'):
+                    infobox = element
+            elif element.name == 'img' and element.get('src'):
+                page.images.append(urljoin(url, element['src']))
+        self._read_infobox(infobox, page, url)
+        return page
+
+    @staticmethod
+    def _read_infobox(infobox, page: WikiPage, url: str):
+        if infobox is None:
+            return
+        for row in infobox.find_all('tr'):
+            header, data = row.find('th'), row.find('td')
+            if header and data:
+                page.infobox[header.get_text(strip=True)] = data.get_text(strip=True)
+        image = infobox.find('img')
+        if image and image.get('src'):
+            page.infobox_image = urljoin(url, image['src'])
+
+
+def _lxml_text(element, strip: bool = False) -> str:
+    parts: List[str] = []
+
+    def walk(node):
+        # Comments and processing instructions have a non-string tag; only their tail is text
+        if not isinstance(node.tag, str) or node.tag in SKIP_TEXT_TAGS:
+            return
+        if node.text:
+            parts.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+
+    walk(element)
+    if strip:
+        return "".join(part.strip() for part in parts)
+    return "".join(parts)
+
+
+class LxmlBackend:
+    """Native lxml.html tree, walked once with C-level iteration."""
+
+    def parse(self, html, url: str) -> WikiPage:
+        import lxml.html
+
+        root = lxml.html.fromstring(html)
+        matches = root.xpath("//div[contains(concat(' ', normalize-space(@class), ' '), ' mw-parser-output ')]")
+        if not matches:
+            page = WikiPage(False)
+            infoboxes = root.xpath("//table[contains(concat(' ', normalize-space(@class), ' '), ' infobox ')]")
+            self._read_infobox(infoboxes[0] if infoboxes else None, page, url)
+            return page
+
+        page = WikiPage(True)
+        infobox = None
+        for element in matches[0].iterdescendants():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+            if tag in BLOCK_TAGS:
+                items = [_lxml_text(li) for li in element.iterdescendants('li')] if tag in LIST_TAGS else []
+                page.blocks.append(Block(tag, _lxml_text(element), items))
+                if infobox is None and tag == 'table' and _has_class(element.get('class'), 'infobox'):
+                    infobox = element
+            elif tag == 'img' and element.get('src'):
+                page.images.append(urljoin(url, element.get('src')))
+        self._read_infobox(infobox, page, url)
+        return page
+
+    @staticmethod
+    def _read_infobox(infobox, page: WikiPage, url: str):
+        if infobox is None:
+            return
+        for row in infobox.iterdescendants('tr'):
+            header, data = next(row.iterdescendants('th'), None), next(row.iterdescendants('td'), None)
+            if header is not None and data is not None:
+                page.infobox[_lxml_text(header, strip=True)] = _lxml_text(data, strip=True)
+        image = next(infobox.iterdescendants('img'), None)
+        if image is not None and image.get('src'):
+            page.infobox_image = urljoin(url, image.get('src'))
+
+
+BACKENDS = {
+    'lxml': LxmlBackend,
+    'bs4-lxml': lambda: SoupBackend('lxml'),
+    'html.parser': lambda: SoupBackend('html.parser'),
+}
+
+
+def get_backend(name: Optional[str] = None):
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def first_search_result(html, url: str) -> Optional[str]:
+    """Absolute URL of the top hit on a Special:Search results page."""
+    import lxml.html
+
+    root = lxml.html.fromstring(html)
+    links = root.xpath("//div[contains(concat(' ', normalize-space(@class), ' '), ' mw-search-result-heading ')]//a/@href")
+    return urljoin(url, links[0]) if links else None
+
+
+def parse_wiki_page(html, url: str, backend: Optional[str] = None) -> WikiPage:
+    """Article blocks, infobox fields, infobox image and body images of a Wikipedia page, in one pass."""
+    return get_backend(backend).parse(html, url)
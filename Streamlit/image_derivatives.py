@@ -0,0 +1,85 @@
+import io
+import os
+import logging
+import posixpath
+from typing import Dict, Tuple
+
+# Longest edge in pixels of each derivative: "thumb" for narrow columns, "display" for full-width images
+DERIVATIVE_SIZES = {'thumb': 400, 'display': 1024}
+DERIVATIVE_FORMAT = os.getenv('IMAGE_DERIVATIVE_FORMAT', 'webp')
+DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', '80'))
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def derivative_key(key: str, size: str, image_format: str = DERIVATIVE_FORMAT) -> str:
+    """``Drivers/max_verstappen/profile.jpg`` -> ``Drivers/max_verstappen/profile.display.webp``."""
+    root, _ = posixpath.splitext(key)
+    return f"{root}.{size}.{'jpg' if image_format == 'jpeg' else image_format}"
+
+
+def is_derivative_key(key: str) -> bool:
+    stem = posixpath.splitext(key)[0]
+    return posixpath.splitext(stem)[1].lstrip('.') in DERIVATIVE_SIZES
+
+
+def load_derivative(s3_client, bucket: str, key: str, size: str):
+    """Bytes of the ``size`` derivative of ``key``, or of the original for images stored before derivatives existed."""
+    for candidate in (derivative_key(key, size), key):
+        try:
+            return s3_client.get_object(Bucket=bucket, Key=candidate)['Body'].read()
+        except Exception:
+            continue
+    return None
+
+
+def make_derivatives(data: bytes, image_format: str = DERIVATIVE_FORMAT,
+                     quality: int = DERIVATIVE_QUALITY) -> Dict[str, Tuple[bytes, str]]:
+    """Size name -> (encoded image, content type). Images are only ever shrunk, never enlarged."""
+    from PIL import Image, ImageOps
+
+    pil_format, content_type = FORMATS[image_format]
+    with Image.open(io.BytesIO(data)) as source:
+        # Animated GIFs keep their first frame; camera photos are turned upright before resizing
+        source.seek(0)
+        image = ImageOps.exif_transpose(source)
+        if pil_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        derivatives = {}
+        for size, edge in DERIVATIVE_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=quality, optimize=True)
+            derivatives[size] = (buffer.getvalue(), content_type)
+        return derivatives
+
+
+def upload_derivatives(s3_client, bucket: str, key: str, data: bytes) -> Dict[str, str]:
+    """Store every derivative of the image at ``key``; returns size name -> key of those written.
+
+    Failures are logged and skipped: the UI falls back to the original image.
+    """
+    try:
+        derivatives = make_derivatives(data)
+    except Exception as e:
+        logging.warning(f"Could not create derivatives of {key}: {e}")
+        return {}
+    written = {}
+    for size, (body, content_type) in derivatives.items():
+        target = derivative_key(key, size)
+        try:
+            s3_client.put_object(Bucket=bucket, Key=target, Body=body, ContentType=content_type)
+            written[size] = target
+        except Exception as e:
+            logging.warning(f"Could not upload {target}: {e}")
+    return written
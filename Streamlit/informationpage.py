@@ -4,6 +4,9 @@ import os
 from dotenv import load_dotenv
 from io import BytesIO
 
+from Streamlit.image_derivatives import is_derivative_key, load_derivative
+from Streamlit.section_manifest import load_manifest
+
 # Load environment variables
 load_dotenv()
 
@@ -18,10 +21,33 @@ def init_s3_client():
         region_name=os.getenv("AWS_REGION")
     )
 
-@st.cache_data
+def load_history_from_manifest(s3, bucket, item):
+    """The manifest already names every image and its derivatives, so there is no listing or fallback GET."""
+    try:
+        history_content = s3.get_object(Bucket=bucket, Key=item.content_key)['Body'].read().decode('utf-8')
+        images = []
+        for image in item.images:
+            if not image.best("thumb").endswith(('.jpg', '.png', '.jpeg', '.gif', '.webp')):
+                continue
+            try:
+                # Images sit in the narrow right-hand column, so the thumbnail is enough
+                image_data = s3.get_object(Bucket=bucket, Key=image.best("thumb"))['Body'].read()
+            except Exception:
+                continue
+            images.append({'key': image.key, 'data': BytesIO(image_data)})
+        return {'content': history_content, 'images': images}
+    except Exception as e:
+        st.error(f"Error loading history data: {str(e)}")
+        return None
+
+@st.cache_data(ttl=600)
 def load_history_content(bucket):
     """Load history content and images from S3."""
     s3 = init_s3_client()
+    manifest = load_manifest(s3, bucket, 'History')
+    item = manifest.items.get('f1_history') if manifest is not None else None
+    if item is not None:
+        return load_history_from_manifest(s3, bucket, item)
     try:
         history_text = s3.get_object(Bucket=bucket, Key='History/f1_history.txt')
         history_content = history_text['Body'].read().decode('utf-8')
@@ -30,12 +56,14 @@ def load_history_content(bucket):
         image_response = s3.list_objects_v2(Bucket=bucket, Prefix='History/images/')
         if 'Contents' in image_response:
             for obj in image_response['Contents']:
-                if obj['Key'].endswith(('.jpg', '.png', '.jpeg')):
-                    img_obj = s3.get_object(Bucket=bucket, Key=obj['Key'])
-                    images.append({
-                        'key': obj['Key'],
-                        'data': BytesIO(img_obj['Body'].read())
-                    })
+                if obj['Key'].endswith(('.jpg', '.png', '.jpeg', '.gif', '.webp')) and not is_derivative_key(obj['Key']):
+                    # Images sit in the narrow right-hand column, so the thumbnail is enough
+                    image_data = load_derivative(s3, bucket, obj['Key'], "thumb")
+                    if image_data:
+                        images.append({
+                            'key': obj['Key'],
+                            'data': BytesIO(image_data)
+                        })
 
         return {'content': history_content, 'images': images}
     except Exception as e:
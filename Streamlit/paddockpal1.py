@@ -1,4 +1,6 @@
 import os
+import tempfile
+import boto3
 import openai
 from pinecone import Pinecone, ServerlessSpec
 import streamlit as st
@@ -10,6 +12,9 @@ from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_community.chat_models import ChatOpenAI
 from langchain.callbacks.tracers.langchain import LangChainTracer
 from langchain.callbacks import tracing_enabled
+from Streamlit.embedding_cache import EmbeddingCache, DEFAULT_CACHE_PATH
+from Streamlit.chunk_store import ChunkStore
+from Streamlit.vector_reduction import PCAProjection
 
 # Load environment variables
 load_dotenv()
@@ -62,14 +67,29 @@ def get_pinecone_index(index_name):
 
 # OpenAI setup
 openai.api_key = OPENAI_API_KEY
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+@st.cache_resource
+def get_embedding_cache():
+    """Open the on-disk embedding cache shared with the ingestion pipeline."""
+    return EmbeddingCache(
+        os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    )
 
 def generate_embeddings_openai(text):
     try:
+        cache = get_embedding_cache()
+        embedding = cache.get(EMBEDDING_MODEL, text)
+        if embedding is not None:
+            return embedding
         response = openai.Embedding.create(
             input=text,
-            model="text-embedding-ada-002"
+            model=EMBEDDING_MODEL
         )
-        return response["data"][0]["embedding"]
+        embedding = response["data"][0]["embedding"]
+        cache.put(EMBEDDING_MODEL, text, embedding)
+        return embedding
     except Exception as e:
         print(f"Error generating embeddings with OpenAI: {e}")
         return None
@@ -234,17 +254,92 @@ def display_news_section():
     else:
         st.info("No news articles available at the moment.")
 
+CHUNK_STORE_KEY = os.getenv("CHUNK_STORE_KEY", "chunk-store/chunks.bin")
+# Must match the ingestion settings: "pca" queries the <index>-pca<dim> indexes with projected vectors
+EMBEDDING_REDUCTION = os.getenv("EMBEDDING_REDUCTION", "")
+EMBEDDING_REDUCED_DIM = int(os.getenv("EMBEDDING_REDUCED_DIM", "256"))
+PROJECTION_PREFIX = os.getenv("PROJECTION_PREFIX", "artifacts/projection/")
+
+@st.cache_resource
+def get_rag_s3_client():
+    """S3 client for the bucket holding the regulation PDFs and ingestion artifacts."""
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID_RAG", os.getenv("AWS_ACCESS_KEY_ID")),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY_RAG", os.getenv("AWS_SECRET_ACCESS_KEY")),
+    )
+
+@st.cache_resource(ttl=3600)
+def get_projection():
+    """Load the PCA projection the reduced indexes were built with, or None when reduction is off."""
+    if EMBEDDING_REDUCTION != "pca":
+        return None
+    key = f"{PROJECTION_PREFIX}{EMBEDDING_MODEL}-pca{EMBEDDING_REDUCED_DIM}.npz"
+    response = get_rag_s3_client().get_object(Bucket=os.getenv("AWS_BUCKET_NAME"), Key=key)
+    return PCAProjection.from_bytes(response["Body"].read())
+
+@st.cache_data(ttl=3600)
+def get_chunk_store_etag():
+    """ETag of the current chunk store in S3, re-checked at most once an hour."""
+    bucket = os.getenv("AWS_BUCKET_NAME")
+    if not bucket:
+        return None
+    try:
+        return get_rag_s3_client().head_object(Bucket=bucket, Key=CHUNK_STORE_KEY)["ETag"].strip('"')
+    except Exception as e:
+        print(f"Chunk store unavailable, falling back to Pinecone metadata: {e}")
+        return None
+
+# One mapping per store version; a replaced version is evicted and unmapped once no session still reads it
+@st.cache_resource(max_entries=1)
+def open_chunk_store(etag: str):
+    """Memory-map one version of the chunk text store built at ingestion time, downloading it once."""
+    path = os.path.join(tempfile.gettempdir(), f"f1_chunks-{etag}.bin")
+    if not os.path.exists(path):
+        get_rag_s3_client().download_file(os.getenv("AWS_BUCKET_NAME"), CHUNK_STORE_KEY, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        # Older versions are no longer served; open mappings of them stay valid after the unlink
+        for name in os.listdir(tempfile.gettempdir()):
+            if name.startswith("f1_chunks-") and name.endswith(".bin") and name != os.path.basename(path):
+                os.remove(os.path.join(tempfile.gettempdir(), name))
+    return ChunkStore.open(path)
+
+def get_chunk_store():
+    etag = get_chunk_store_etag()
+    if etag is None:
+        return None
+    try:
+        return open_chunk_store(etag)
+    except Exception as e:
+        print(f"Chunk store unavailable, falling back to Pinecone metadata: {e}")
+        return None
+
+def get_chunk_metadata(match: dict) -> dict:
+    """Look up a match's text in the chunk store, or fetch its Pinecone metadata if the store lacks it."""
+    store = get_chunk_store()
+    record = store.get(match["id"]) if store is not None else None
+    if record is not None:
+        return record
+    vector = get_pinecone_index(match["index"]).fetch(ids=[match["id"]]).vectors.get(match["id"])
+    return dict(vector.metadata or {}) if vector else {}
+
 def fetch_relevant_documents(query: str):
-    """Fetch relevant documents from Pinecone."""
+    """Fetch the ids and scores of relevant documents from Pinecone."""
     embedding = generate_embeddings_openai(query)
     if not embedding:
         raise ValueError("Failed to generate embedding for query.")
 
+    index_names = INDEX_NAMES
+    projection = get_projection()
+    if projection is not None:
+        embedding = projection.transform([embedding])[0].tolist()
+        index_names = [f"{index_name}-pca{projection.dimension}" for index_name in INDEX_NAMES]
+
     all_results = []
-    for index_name in INDEX_NAMES:
+    for index_name in index_names:
         index = get_pinecone_index(index_name)
-        results = index.query(vector=embedding, top_k=5, include_metadata=True)
-        all_results.extend(results["matches"])
+        results = index.query(vector=embedding, top_k=5, include_metadata=False)
+        all_results.extend({"id": match["id"], "score": match["score"], "index": index_name} for match in results["matches"])
 
     # Sort results by relevance score
     sorted_results = sorted(all_results, key=lambda x: x["score"], reverse=True)
@@ -252,16 +347,35 @@ def fetch_relevant_documents(query: str):
 
 
 
-def get_combined_context(matches: List[dict]) -> str:
-    """Combine contexts from document matches."""
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "768"))
+CONTEXT_MAX_CHUNKS = 3
+
+def get_combined_context(matches: List[dict], max_tokens: int = CONTEXT_MAX_TOKENS) -> str:
+    """Combine the best distinct chunks, labelled with their article, within a prompt token budget."""
     seen_texts = set()
     contexts = []
+    used_tokens = 0
     for match in matches:
-        text = match["metadata"].get("text", "")
-        if text and text not in seen_texts:
-            seen_texts.add(text)
-            contexts.append(text)
-    return "\n\n".join(contexts[:3])
+        # Text is only looked up for matches that are considered for the prompt
+        metadata = match.get("metadata") or get_chunk_metadata(match)
+        text = metadata.get("text", "")
+        if not text or text in seen_texts:
+            continue
+        # Chunks indexed before article-aware chunking carry no token count
+        tokens = int(metadata.get("tokens") or len(text) // 4 + 1)
+        if contexts and used_tokens + tokens > max_tokens:
+            continue
+        seen_texts.add(text)
+        used_tokens += tokens
+        if metadata.get("article"):
+            label = f"Article {metadata.get('section') or metadata['article']} {metadata.get('article_title', '')}".strip()
+            if metadata.get("page"):
+                label += f", page {int(metadata['page'])}"
+            text = f"[{label}]\n{text}"
+        contexts.append(text)
+        if len(contexts) >= CONTEXT_MAX_CHUNKS:
+            break
+    return "\n\n".join(contexts)
 
 def generate_answer_with_openai(context, query):
     """
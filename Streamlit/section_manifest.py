@@ -0,0 +1,122 @@
+import json
+import time
+import hashlib
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+MANIFEST_VERSION = 1
+SUMMARY_CHARS = 280
+
+
+def manifest_key(section: str) -> str:
+    return f"{section}/manifest.json"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def summarize(text: str, limit: int = SUMMARY_CHARS) -> str:
+    """First real paragraph of a scraped article, cut at a word boundary."""
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if len(paragraph) > 40 and not paragraph.startswith(('#', '-', 'Table:')) and not paragraph.endswith(':'):
+            if len(paragraph) <= limit:
+                return paragraph
+            return paragraph[:limit].rsplit(' ', 1)[0] + "…"
+    return ""
+
+
+@dataclass
+class ManifestImage:
+    key: str
+    # Size name -> key of each derivative that was actually written
+    derivatives: Dict[str, str] = field(default_factory=dict)
+
+    def best(self, size: str) -> str:
+        return self.derivatives.get(size, self.key)
+
+
+@dataclass
+class ManifestItem:
+    name: str
+    content_key: str
+    content_size: int
+    content_hash: str
+    summary: str = ""
+    images: List[ManifestImage] = field(default_factory=list)
+    # Page the item was scraped from, so later runs can fetch it without looking it up again
+    source_url: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ManifestItem":
+        images = [ManifestImage(**image) for image in data.get('images', [])]
+        return cls(**dict(data, images=images))
+
+
+class SectionManifest:
+    """Everything the UI needs to list a section (Drivers, Tracks, History) in a single object.
+
+    Items carry the keys and sizes of their bodies plus a short summary, so the
+    bodies themselves are only fetched when an item is shown. ``version`` is a
+    hash over all items and changes whenever any content or image key does.
+    """
+
+    def __init__(self, section: str, items: Optional[Dict[str, ManifestItem]] = None, updated_at: float = 0.0):
+        self.section = section
+        self.items: Dict[str, ManifestItem] = items or {}
+        self.updated_at = updated_at
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.items
+
+    def upsert(self, item: ManifestItem):
+        self.items[item.name] = item
+
+    @property
+    def version(self) -> str:
+        digest = hashlib.sha1()
+        for name in sorted(self.items):
+            item = self.items[name]
+            digest.update(json.dumps([name, item.content_hash, [asdict(image) for image in item.images]]).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def to_json(self) -> bytes:
+        return json.dumps({
+            'format': MANIFEST_VERSION,
+            'section': self.section,
+            'version': self.version,
+            'updated_at': self.updated_at,
+            'items': [asdict(self.items[name]) for name in sorted(self.items)],
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "SectionManifest":
+        payload = json.loads(data)
+        if payload.get('format') != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest format {payload.get('format')!r}")
+        items = {item['name']: ManifestItem.from_dict(item) for item in payload['items']}
+        return cls(payload['section'], items, payload.get('updated_at', 0.0))
+
+
+def load_manifest(s3_client, bucket: str, section: str) -> Optional[SectionManifest]:
+    try:
+        body = s3_client.get_object(Bucket=bucket, Key=manifest_key(section))['Body'].read()
+        return SectionManifest.from_json(body)
+    except Exception as e:
+        logging.info(f"No usable manifest for {section}: {e}")
+        return None
+
+
+def save_manifest(s3_client, bucket: str, manifest: SectionManifest):
+    manifest.updated_at = time.time()
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=manifest_key(manifest.section),
+        Body=manifest.to_json(),
+        ContentType='application/json',
+        # The UI re-reads it on every cache refresh, so it must never be served stale from a CDN
+        CacheControl='no-cache',
+    )
+    logging.info(f"Wrote {manifest_key(manifest.section)} with {len(manifest.items)} items (version {manifest.version})")
@@ -4,6 +4,9 @@ import os
 from dotenv import load_dotenv
 from io import BytesIO
 
+from Streamlit.image_derivatives import load_derivative
+from Streamlit.section_manifest import load_manifest
+
 # Load environment variables
 load_dotenv()
 
@@ -17,10 +20,32 @@ def init_s3_client():
         region_name=os.getenv("AWS_REGION")
     )
 
-@st.cache_data
+@st.cache_data(ttl=600)
 def load_section_data(bucket, section):
-    """Load content and images for a specific section (Drivers/Tracks) from S3."""
+    """Load the items of a section (Drivers/Tracks) from S3.
+
+    With a manifest this is a single GET and bodies are fetched per item when
+    shown; without one, every item's text and image is downloaded up front.
+    """
     s3 = init_s3_client()
+    manifest = load_manifest(s3, bucket, section)
+    if manifest is not None:
+        return {
+            "items": sorted(manifest.items),
+            "version": manifest.version,
+            "details": {
+                name: {
+                    "content": None,
+                    "image": None,
+                    "content_key": item.content_key,
+                    "content_hash": item.content_hash,
+                    # The page renders images at container width, so point at the display-size derivative
+                    "image_key": item.images[0].best("display") if item.images else None,
+                    "summary": item.summary,
+                }
+                for name, item in manifest.items.items()
+            },
+        }
     try:
         data = {"items": []}
         response = s3.list_objects_v2(Bucket=bucket, Prefix=f"{section}/", Delimiter='/')
@@ -37,13 +62,9 @@ def load_section_data(bucket, section):
                     data["details"][item_name]["content"] = content
                 except Exception:
                     data["details"][item_name]["content"] = "No content available."
-                try:
-                    image_key = f"{section}/{item_name}/profile.jpg"
-                    img_obj = s3.get_object(Bucket=bucket, Key=image_key)
-                    image_data = BytesIO(img_obj['Body'].read())
-                    data["details"][item_name]["image"] = image_data
-                except Exception:
-                    data["details"][item_name]["image"] = None
+                # The page renders images at container width, so fetch the display-size derivative
+                image_data = load_derivative(s3, bucket, f"{section}/{item_name}/profile.jpg", "display")
+                data["details"][item_name]["image"] = BytesIO(image_data) if image_data else None
         elif 'Contents' in response:
             for obj in response['Contents']:
                 key = obj['Key']
@@ -58,18 +79,30 @@ def load_section_data(bucket, section):
                         data["details"][item_name]["content"] = content
                     except Exception:
                         data["details"][item_name]["content"] = "No content available."
-                    try:
-                        image_key = f"{section}/{item_name}_image.jpg"
-                        img_obj = s3.get_object(Bucket=bucket, Key=image_key)
-                        image_data = BytesIO(img_obj['Body'].read())
-                        data["details"][item_name]["image"] = image_data
-                    except Exception:
-                        data["details"][item_name]["image"] = None
+                    image_data = load_derivative(s3, bucket, f"{section}/{item_name}_image.jpg", "display")
+                    data["details"][item_name]["image"] = BytesIO(image_data) if image_data else None
         return data
     except Exception as e:
         st.error(f"Error loading {section} data: {str(e)}")
         return None
 
+@st.cache_data(max_entries=64)
+def load_item_content(bucket, key, content_hash):
+    """Text of one item; ``content_hash`` is only part of the cache key so a rescrape is picked up."""
+    s3 = init_s3_client()
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
+    except Exception:
+        return "No content available."
+
+@st.cache_data(max_entries=64)
+def load_item_image(bucket, key, version):
+    s3 = init_s3_client()
+    try:
+        return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except Exception:
+        return None
+
 def show_drivers_tracks():
     """Display Drivers and Tracks information with Load More functionality."""
     # Dropdown to choose between Drivers and Tracks
@@ -82,8 +115,15 @@ def show_drivers_tracks():
     if data and 'items' in data:
         selection = st.selectbox(f"Select a {category[:-1]}", data['items'])
         if selection:
+            details = data['details'][selection]
+            # Manifest-backed sections fetch the selected item's body only now
+            if details.get('content_key'):
+                details = dict(details, content=load_item_content(bucket, details['content_key'], details['content_hash']))
+                image_data = load_item_image(bucket, details['image_key'], data['version']) if details['image_key'] else None
+                details['image'] = BytesIO(image_data) if image_data else None
+
             # Load initial 1% of the content
-            content = data['details'][selection].get('content', 'No content available.')
+            content = details.get('content') or 'No content available.'
             content_paragraphs = content.split("\n\n")
             total_paragraphs = len(content_paragraphs)
 
@@ -92,7 +132,7 @@ def show_drivers_tracks():
                 st.session_state[f"{selection}_loaded_paragraphs"] = max(1, int(total_paragraphs * 0.01))
 
             # Display the currently loaded content
-            image = data['details'][selection].get('image', None)
+            image = details.get('image', None)
             with st.container():
                 if image:
                     st.image(image, caption=f"{selection} Profile", use_container_width=True)
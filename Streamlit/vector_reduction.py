@@ -0,0 +1,85 @@
+import io
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict
+
+import numpy as np
+
+
+@dataclass
+class PCAProjection:
+    """A PCA projection of full-precision embeddings onto their top principal components.
+
+    Projected vectors are L2-normalised, so cosine similarity in the reduced
+    space approximates the ranking of the full vectors. The same artifact must
+    be used for documents at ingestion time and for queries.
+    """
+    model: str
+    mean: np.ndarray
+    components: np.ndarray
+    explained_variance: float
+    recall: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def dimension(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def version(self) -> str:
+        return hashlib.sha1(self.components.tobytes()).hexdigest()[:12]
+
+    def transform(self, vectors) -> np.ndarray:
+        reduced = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.maximum(norms, 1e-12)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        info = {'model': self.model, 'explained_variance': self.explained_variance, 'recall': self.recall}
+        np.savez_compressed(buffer, mean=self.mean, components=self.components, info=np.array(json.dumps(info)))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PCAProjection":
+        arrays = np.load(io.BytesIO(data), allow_pickle=False)
+        info = json.loads(str(arrays['info']))
+        return cls(info['model'], arrays['mean'], arrays['components'], info['explained_variance'], info.get('recall', {}))
+
+
+def fit_pca(vectors, dimension: int, model: str, sample_size: int = 20000, seed: int = 0) -> PCAProjection:
+    """Fit a projection to ``dimension`` components on (a sample of) the corpus vectors."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < dimension:
+        raise ValueError(f"Need at least {dimension} vectors to fit {dimension} components, got {len(vectors)}")
+    if len(vectors) > sample_size:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), sample_size, replace=False)]
+    mean = vectors.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(vectors - mean, full_matrices=False)
+    variance = singular_values ** 2
+    explained = float(variance[:dimension].sum() / variance.sum())
+    return PCAProjection(model, mean.astype(np.float32), components[:dimension].astype(np.float32), explained)
+
+
+def _top_k(queries: np.ndarray, corpus: np.ndarray, query_ids: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    # A chunk is trivially its own nearest neighbour, so leave it out
+    scores[np.arange(len(query_ids)), query_ids] = -np.inf
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def recall_at_k(full, reduced, k: int = 5, queries: int = 200, seed: int = 0) -> float:
+    """Share of each chunk's exact top-``k`` cosine neighbours that the reduced vectors also return.
+
+    Corpus chunks are used as queries, which is a close stand-in for user
+    questions about the same regulations.
+    """
+    full = np.asarray(full, dtype=np.float32)
+    full = full / np.maximum(np.linalg.norm(full, axis=1, keepdims=True), 1e-12)
+    reduced = np.asarray(reduced, dtype=np.float32)
+    query_ids = np.random.default_rng(seed).choice(len(full), min(queries, len(full)), replace=False)
+    k = min(k, len(full) - 1)
+    expected = _top_k(full[query_ids], full, query_ids, k)
+    found = _top_k(reduced[query_ids], reduced, query_ids, k)
+    hits = sum(len(set(e).intersection(f)) for e, f in zip(expected, found))
+    return hits / (len(query_ids) * k)
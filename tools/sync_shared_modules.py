@@ -0,0 +1,55 @@
+"""Keep the Streamlit copies of the modules it shares with the Airflow pipeline identical.
+
+``Airflow/dags/src`` holds the originals. The Streamlit image is built from
+``./Streamlit`` alone, so it carries copies of the modules it needs to read
+what the pipeline writes (cache, chunk store, projection, images, manifests).
+
+Usage:
+    python tools/sync_shared_modules.py          # copy the originals over the Streamlit copies
+    python tools/sync_shared_modules.py --check  # exit 1 if any copy differs (run in CI)
+"""
+import os
+import sys
+import shutil
+import argparse
+import filecmp
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SOURCE_DIR = os.path.join(ROOT, 'Airflow', 'dags', 'src')
+COPY_DIR = os.path.join(ROOT, 'Streamlit')
+
+SHARED_MODULES = [
+    'embedding_cache.py',
+    'chunk_store.py',
+    'vector_reduction.py',
+    'image_derivatives.py',
+    'section_manifest.py',
+]
+
+
+def stale_copies():
+    return [
+        name for name in SHARED_MODULES
+        if not os.path.exists(os.path.join(COPY_DIR, name))
+        or not filecmp.cmp(os.path.join(SOURCE_DIR, name), os.path.join(COPY_DIR, name), shallow=False)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only report copies that differ from the originals")
+    args = parser.parse_args()
+
+    stale = stale_copies()
+    if args.check:
+        for name in stale:
+            print(f"Streamlit/{name} differs from Airflow/dags/src/{name}; run python tools/sync_shared_modules.py")
+        sys.exit(1 if stale else 0)
+    for name in stale:
+        shutil.copyfile(os.path.join(SOURCE_DIR, name), os.path.join(COPY_DIR, name))
+        print(f"Updated Streamlit/{name}")
+    print(f"{len(SHARED_MODULES) - len(stale)} of {len(SHARED_MODULES)} shared modules were already in sync")
+
+
+if __name__ == "__main__":
+    main()